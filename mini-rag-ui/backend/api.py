@@ -1,30 +1,57 @@
+import json
 import os
 import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, APIRouter, Query as FastQuery, UploadFile, File, Form
+from fastapi import Depends, FastAPI, HTTPException, APIRouter, Header, Query as FastQuery, Response, UploadFile, File, Form
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from .rag_engine import RAGEngine
 from .auth.security import get_current_user
+from .database import PoolTimeout, close_pool, open_pool
+from .metrics import render_metrics, start_metrics_writer, stop_metrics_writer
+from .tracing import trace_requests
 from .utils import save_conversation, get_history
 from .utils import (
     save_conversation, 
     get_history,
     create_thread,
     list_threads,
-    get_thread_messages,
+    get_thread_messages_page,
+    get_recent_user_questions,
     rename_thread,
     delete_thread,
     append_message_and_answer,
 )
 from .auth.routes import router as auth_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Les workers uvicorn (multiprocessing) ne passent pas par atexit
+    start_metrics_writer()
+    await run_in_threadpool(open_pool)
+    yield
+    close_pool()
+    stop_metrics_writer()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc):
+    # Base saturée : le client peut réessayer, inutile d'empiler les requêtes
+    return JSONResponse({"detail": "Base de données saturée, réessayez"}, status_code=503, headers={"Retry-After": "1"})
 rag = RAGEngine()
 BASE_DIR = Path(__file__).resolve().parents[1]
 
+# Si défini, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 class Query(BaseModel):
     question: str
 
@@ -39,6 +66,32 @@ class RenamePayload(BaseModel):
 class RenameFilePayload(BaseModel):
     new_name: str
 
+
+# Messages renvoyés par GET /conversations/{thread_id}/messages (page la plus récente par défaut)
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "100"))
+MESSAGES_PAGE_MAX = int(os.getenv("MESSAGES_PAGE_MAX", "500"))
+# Questions précédentes transmises au RAG (seule la dernière sert à recomposer la question)
+HISTORY_USER_TURNS = int(os.getenv("HISTORY_USER_TURNS", "3"))
+
+SEARCH_TOP_K_MAX = 100
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "256"))
+
+
+class SearchPayload(BaseModel):
+    query: str
+    top_k: int = 5
+    visibility: str = "private"
+    sources: Optional[List[str]] = None
+    types: Optional[List[str]] = None
+
+
+class SearchBatchPayload(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    visibility: str = "private"
+    sources: Optional[List[str]] = None
+    types: Optional[List[str]] = None
+
 # -------- PUBLIC ROUTES (VISITOR) --------
 @app.get("/public/company-info")
 def company_info():
@@ -98,7 +151,7 @@ async def upload_document(
     destination.write_bytes(content)
 
     try:
-        rag.refresh_data(normalized_visibility)
+        rag.index_file(normalized_visibility, filename)
     except Exception as exc:
         raise HTTPException(500, f"Fichier déposé mais indexation échouée: {exc}")
 
@@ -163,7 +216,7 @@ def delete_admin_file(visibility: str, filename: str, user=Depends(get_current_u
     file_path.unlink()
 
     try:
-        rag.refresh_data(normalized_visibility)
+        rag.remove_file(normalized_visibility, safe_name)
     except Exception as exc:
         raise HTTPException(500, f"Fichier supprimé mais réindexation échouée: {exc}")
 
@@ -206,7 +259,7 @@ def rename_admin_file(
     src.rename(dst)
 
     try:
-        rag.refresh_data(normalized_visibility)
+        rag.rename_file(normalized_visibility, old_name, new_name)
     except Exception as exc:
         raise HTTPException(500, f"Fichier renommé mais réindexation échouée: {exc}")
 
@@ -218,16 +271,130 @@ def rename_admin_file(
     }
 
 
+# -------- RECHERCHE (SANS LLM) --------
+def _search(user, queries, payload):
+    if user["role"] == "visitor":
+        raise HTTPException(403, "Connexion requise")
+
+    visibility = (payload.visibility or "private").strip().lower()
+    if visibility not in ["public", "private"]:
+        raise HTTPException(400, "visibility doit être 'public' ou 'private'")
+    if not 1 <= payload.top_k <= SEARCH_TOP_K_MAX:
+        raise HTTPException(400, f"top_k doit être entre 1 et {SEARCH_TOP_K_MAX}")
+    if len(queries) > SEARCH_BATCH_MAX:
+        raise HTTPException(400, f"{SEARCH_BATCH_MAX} requêtes maximum par lot")
+
+    return rag.search_many(
+        queries,
+        visibility=visibility,
+        top_k=payload.top_k,
+        sources=payload.sources,
+        types=payload.types,
+    )
+
+
+@app.post("/search")
+def search(payload: SearchPayload, user=Depends(get_current_user)):
+    return {"results": _search(user, [payload.query], payload)[0]}
+
+
+@app.post("/search/batch")
+def search_batch(payload: SearchBatchPayload, user=Depends(get_current_user)):
+    return {"results": _search(user, payload.queries, payload)}
+
+
+# -------- STREAMING (SSE) --------
+def _sse(data, event=None):
+    line = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{line}" if event else line
+
+
+def _sse_response(deltas, on_complete=None):
+    """
+    Un évènement par fragment ({"delta"}), puis "done" avec la réponse
+    complète. on_complete(answer) n'est appelé que si le flux va au bout :
+    un client déconnecté en cours de route n'enregistre rien.
+    """
+    async def events():
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse({"delta": delta})
+            answer = "".join(parts).strip()
+            if on_complete:
+                await on_complete(answer)
+        except Exception as exc:
+            yield _sse({"detail": str(exc)}, event="error")
+            return
+        yield _sse({"answer": answer}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _history_user_questions(user, thread_id):
+    return await run_in_threadpool(get_recent_user_questions, user["user_id"], thread_id, HISTORY_USER_TURNS)
+
+
+async def _save_answer(user, thread_id, question, answer):
+    await run_in_threadpool(
+        append_message_and_answer,
+        user_id=user["user_id"],
+        thread_id=thread_id,
+        question=question,
+        answer=answer,
+    )
+
+
+async def _answer_conversation(thread_id, payload, user, ask):
+    if user["role"] == "visitor":
+        raise HTTPException(403, "Connexion requise")
+
+    history_user_questions = await _history_user_questions(user, thread_id)
+    answer = await ask(
+        payload.question,
+        file_names=payload.file_names or [],
+        history_user_questions=history_user_questions,
+    )
+    await _save_answer(user, thread_id, payload.question, answer)
+    return {"answer": answer}
+
+
+async def _stream_conversation(thread_id, payload, user, stream):
+    if user["role"] == "visitor":
+        raise HTTPException(403, "Connexion requise")
+
+    history_user_questions = await _history_user_questions(user, thread_id)
+    deltas = stream(
+        payload.question,
+        file_names=payload.file_names or [],
+        history_user_questions=history_user_questions,
+    )
+    return _sse_response(
+        deltas,
+        on_complete=lambda answer: _save_answer(user, thread_id, payload.question, answer),
+    )
+
+
 # -------- VISTOR --------
 @app.post("/rag/visitor")
-def rag_visitor(payload: Query):
+async def rag_visitor(payload: Query):
     """
     RAG public – PAS D'AUTH
     """
-    answer = rag.ask_public(payload.question)
+    answer = await rag.aask_public(payload.question)
     return {"answer": answer}
 
 
+@app.post("/rag/visitor/stream")
+async def rag_visitor_stream(payload: Query):
+    return _sse_response(rag.astream_public(payload.question))
+
+
 @app.post("/conversations")
 def create_conversation(user=Depends(get_current_user)):
     if user["role"] == "visitor":
@@ -237,10 +404,24 @@ def create_conversation(user=Depends(get_current_user)):
 
 
 @app.get("/conversations/{thread_id}/messages")
-def get_messages(thread_id: int, user=Depends(get_current_user)):
+def get_messages(
+    thread_id: int,
+    response: Response,
+    limit: int = FastQuery(default=MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_PAGE_MAX),
+    before: Optional[str] = FastQuery(default=None),
+    user=Depends(get_current_user),
+):
+    """
+    Les messages les plus récents, du plus ancien au plus récent. S'il en
+    reste d'autres, X-Next-Cursor donne la valeur de ?before= pour la page
+    précédente.
+    """
     if user["role"] == "visitor":
         raise HTTPException(403, "Connexion requise")
-    return get_thread_messages(user["user_id"], thread_id)
+    messages, next_cursor = get_thread_messages_page(user["user_id"], thread_id, limit=limit, before=before)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 
 @app.patch("/conversations/{thread_id}")
@@ -258,78 +439,50 @@ def remove_conversation(thread_id: int, user=Depends(get_current_user)):
 
 
 @app.post("/conversations/{thread_id}/messages")
-def send_message(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
-    if user["role"] == "visitor":
-        raise HTTPException(403, "Connexion requise")
+async def send_message(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
+    return await _answer_conversation(thread_id, payload, user, rag.aask)
 
-    messages = get_thread_messages(user["user_id"], thread_id)
-    history_user_questions = [m["content"] for m in messages if m.get("role") == "user"]
 
-    answer = rag.ask(
-        payload.question,
-        file_names=payload.file_names or [],
-        history_user_questions=history_user_questions,
-    )
-    append_message_and_answer(
-        user_id=user["user_id"],
-        thread_id=thread_id,
-        question=payload.question,
-        answer=answer,
-    )
-    return {"answer": answer}
+@app.post("/conversations/{thread_id}/messages/rag")
+async def send_message_rag(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
+    return await _answer_conversation(thread_id, payload, user, rag.aask)
 
 
-@app.post("/conversations/{thread_id}/messages/rag")
-def send_message_rag(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
-    if user["role"] == "visitor":
-        raise HTTPException(403, "Connexion requise")
+@app.post("/conversations/{thread_id}/messages/chat")
+async def send_message_chat(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
+    return await _answer_conversation(thread_id, payload, user, rag.aask_chat)
 
-    messages = get_thread_messages(user["user_id"], thread_id)
-    history_user_questions = [m["content"] for m in messages if m.get("role") == "user"]
 
-    answer = rag.ask(
-        payload.question,
-        file_names=payload.file_names or [],
-        history_user_questions=history_user_questions,
-    )
-    append_message_and_answer(
-        user_id=user["user_id"],
-        thread_id=thread_id,
-        question=payload.question,
-        answer=answer,
-    )
-    return {"answer": answer}
+@app.post("/conversations/{thread_id}/messages/rag/stream")
+async def send_message_rag_stream(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
+    return await _stream_conversation(thread_id, payload, user, rag.astream_ask)
 
 
-@app.post("/conversations/{thread_id}/messages/chat")
-def send_message_chat(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
-    if user["role"] == "visitor":
-        raise HTTPException(403, "Connexion requise")
+@app.post("/conversations/{thread_id}/messages/chat/stream")
+async def send_message_chat_stream(thread_id: int, payload: AskPayload, user=Depends(get_current_user)):
+    return await _stream_conversation(thread_id, payload, user, rag.astream_chat)
 
-    messages = get_thread_messages(user["user_id"], thread_id)
-    history_user_questions = [m["content"] for m in messages if m.get("role") == "user"]
 
-    answer = rag.ask_chat(
-        payload.question,
-        file_names=payload.file_names or [],
-        history_user_questions=history_user_questions,
-    )
-    append_message_and_answer(
-        user_id=user["user_id"],
-        thread_id=thread_id,
-        question=payload.question,
-        answer=answer,
-    )
-    return {"answer": answer}
+# -------- MÉTRIQUES --------
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(authorization: Optional[str] = Header(None)):
+    """
+    Format texte Prometheus, agrégé sur tous les workers (voir backend/metrics.py).
+    """
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(401, "Token métriques invalide")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # -------- MIDDLEWARE --------
+app.middleware("http")(trace_requests)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(auth_router)
\ No newline at end of file
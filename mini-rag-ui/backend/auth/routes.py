@@ -61,15 +61,6 @@ class UserProfileUpdateModel(BaseModel):
     avatar_url: Optional[str] = None
 
 
-# --------- DB ----------
-def get_db():
-    return psycopg2.connect(
-        host="localhost",
-        database="rag-db",
-        user="postgres",
-        password="postgres123"
-    )
-
 # --------- UTILS ----------
 def normalize_password(password: str) -> str:
     return password.encode("utf-8")[:72].decode("utf-8", errors="ignore")
@@ -77,33 +68,32 @@ def normalize_password(password: str) -> str:
 # --------- REGISTER ----------
 @router.post("/register")
 def register(data: RegisterModel):
-    conn = get_db()
-    cur = conn.cursor()
+    # bcrypt avant d'emprunter la connexion : le hachage prend des centaines de ms
     hashed_password = pwd_context.hash(normalize_password(data.password))
 
-    try:
-        cur.execute(
-            "INSERT INTO users (email, password, role, is_active) VALUES (%s, %s, %s, %s)",
-            (data.email, hashed_password, "member", True)
-        )
-        conn.commit()
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        raise HTTPException(400, "Utilisateur déjà existant")
-    finally:
-        cur.close()
-        conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "INSERT INTO users (email, password, role, is_active) VALUES (%s, %s, %s, %s)",
+                (data.email, hashed_password, "member", True)
+            )
+            conn.commit()
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            raise HTTPException(400, "Utilisateur déjà existant")
+        finally:
+            cur.close()
     return {"message": "Compte créé avec succès"}
 
 # --------- LOGIN ----------
 @router.post("/login")
 def login(data: LoginModel):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, password, role, is_active, first_name, last_name, phone_number, address, avatar_url FROM users WHERE email = %s", (data.email,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, password, role, is_active, first_name, last_name, phone_number, address, avatar_url FROM users WHERE email = %s", (data.email,))
+        user = cur.fetchone()
+        cur.close()
 
     if not user:
         raise HTTPException(401, "Email ou mot de passe incorrect")
@@ -125,12 +115,11 @@ def list_users(user=Depends(get_current_user)):
     if user["role"] != "admin":
         raise HTTPException(403, "Accès admin requis")
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url FROM users ORDER BY id")
-    users = [{"id": u[0], "email": u[1], "role": u[2], "is_active": u[3], "first_name": u[4], "last_name": u[5], "phone_number": u[6], "address": u[7], "avatar_url": u[8]} for u in cur.fetchall()]
-    cur.close()
-    conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url FROM users ORDER BY id")
+        users = [{"id": u[0], "email": u[1], "role": u[2], "is_active": u[3], "first_name": u[4], "last_name": u[5], "phone_number": u[6], "address": u[7], "avatar_url": u[8]} for u in cur.fetchall()]
+        cur.close()
     return users
 
 @router.put("/admin/users/{user_id}/role")
@@ -139,24 +128,22 @@ def update_user_role(user_id: int, new_role: str, user=Depends(get_current_user)
         raise HTTPException(403, "Accès admin requis")
     if new_role not in ["visitor", "member", "admin"]:
         raise HTTPException(400, "Rôle invalide")
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET role=%s WHERE id=%s", (new_role, user_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE users SET role=%s WHERE id=%s", (new_role, user_id))
+        conn.commit()
+        cur.close()
     return {"message": "Rôle mis à jour"}
 
 @router.delete("/admin/users/{user_id}")
 def delete_user(user_id: int, user=Depends(get_current_user)):
     if user["role"] != "admin":
         raise HTTPException(403, "Accès admin requis")
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+        conn.commit()
+        cur.close()
     return {"message": "Utilisateur supprimé"}
 
 @router.get("/admin/conversations")
@@ -173,37 +160,36 @@ def create_user_by_admin(payload: AdminCreateUserModel, user=Depends(get_current
     if payload.role not in ["member", "admin"]:
         raise HTTPException(400, "Rôle invalide")
 
-    conn = get_db()
-    cur = conn.cursor()
     hashed_password = pwd_context.hash(normalize_password(payload.password))
 
-    try:
-        cur.execute(
-            """
-            INSERT INTO users (email, password, role, is_active, first_name, last_name, phone_number, address, avatar_url)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url
-            """,
-            (
-                payload.email,
-                hashed_password,
-                payload.role,
-                payload.is_active,
-                payload.first_name,
-                payload.last_name,
-                payload.phone_number,
-                payload.address,
-                payload.avatar_url,
+    with get_db() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO users (email, password, role, is_active, first_name, last_name, phone_number, address, avatar_url)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url
+                """,
+                (
+                    payload.email,
+                    hashed_password,
+                    payload.role,
+                    payload.is_active,
+                    payload.first_name,
+                    payload.last_name,
+                    payload.phone_number,
+                    payload.address,
+                    payload.avatar_url,
+                )
             )
-        )
-        row = cur.fetchone()
-        conn.commit()
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        raise HTTPException(400, "Utilisateur déjà existant")
-    finally:
-        cur.close()
-        conn.close()
+            row = cur.fetchone()
+            conn.commit()
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            raise HTTPException(400, "Utilisateur déjà existant")
+        finally:
+            cur.close()
 
     return {"id": row[0], "email": row[1], "role": row[2], "is_active": row[3], "first_name": row[4], "last_name": row[5], "phone_number": row[6], "address": row[7], "avatar_url": row[8]}
 
@@ -259,21 +245,20 @@ def update_user_by_admin(user_id: int, payload: AdminUpdateUserModel, user=Depen
 
     values.append(user_id)
 
-    conn = get_db()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            f"UPDATE users SET {', '.join(fields)} WHERE id=%s RETURNING id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url"
-            , tuple(values)
-        )
-        row = cur.fetchone()
-        conn.commit()
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        raise HTTPException(400, "Email déjà utilisé")
-    finally:
-        cur.close()
-        conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"UPDATE users SET {', '.join(fields)} WHERE id=%s RETURNING id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url"
+                , tuple(values)
+            )
+            row = cur.fetchone()
+            conn.commit()
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            raise HTTPException(400, "Email déjà utilisé")
+        finally:
+            cur.close()
 
     if not row:
         raise HTTPException(404, "Utilisateur introuvable")
@@ -286,19 +271,18 @@ def get_my_profile(user=Depends(get_current_user)):
     if not user.get("user_id"):
         raise HTTPException(401, "Authentification requise")
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url
-        FROM users
-        WHERE id=%s
-        """,
-        (user["user_id"],)
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url
+            FROM users
+            WHERE id=%s
+            """,
+            (user["user_id"],)
+        )
+        row = cur.fetchone()
+        cur.close()
 
     if not row:
         raise HTTPException(404, "Utilisateur introuvable")
@@ -349,16 +333,15 @@ def update_my_profile(payload: UserProfileUpdateModel, user=Depends(get_current_
 
     values.append(user["user_id"])
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        f"UPDATE users SET {', '.join(fields)} WHERE id=%s RETURNING id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url",
-        tuple(values),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"UPDATE users SET {', '.join(fields)} WHERE id=%s RETURNING id, email, role, is_active, first_name, last_name, phone_number, address, avatar_url",
+            tuple(values),
+        )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
 
     if not row:
         raise HTTPException(404, "Utilisateur introuvable")
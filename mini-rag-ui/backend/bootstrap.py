@@ -159,7 +159,9 @@ def create_tables(conn):
     );
 
     CREATE INDEX IF NOT EXISTS idx_threads_user ON chat_threads(user_id);
-    CREATE INDEX IF NOT EXISTS idx_messages_thread ON chat_messages(thread_id);
+    -- Historique paginé par (created_at, id) ; couvre aussi les recherches par thread_id seul
+    CREATE INDEX IF NOT EXISTS idx_messages_thread_created ON chat_messages(thread_id, created_at, id);
+    DROP INDEX IF EXISTS idx_messages_thread;
     CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations(user_id);
     """
     with conn.cursor() as cur:
@@ -1,23 +1,254 @@
 # backend/database.py
+"""
+Connexions PostgreSQL : un pool partagé par worker.
+
+Ouvrir une connexion (TCP, authentification, fork d'un backend Postgres)
+coûte plus cher que la plupart de nos requêtes : get_db() emprunte une
+connexion au pool et la rend à la sortie du bloc.
+
+- paramètres lus dans DATABASE_URL, sinon DB_HOST / DB_PORT / DB_NAME /
+  DB_USER / DB_PASSWORD (mêmes variables que bootstrap.py) ;
+- DB_POOL_MIN connexions ouvertes au démarrage, DB_POOL_MAX au plus ;
+- au-delà, on attend qu'une connexion se libère, au plus
+  DB_POOL_TIMEOUT_SECONDS (PoolTimeout, 503 côté API) ;
+- une connexion restée inactive plus de DB_POOL_CHECK_IDLE_SECONDS est
+  vérifiée (SELECT 1) avant d'être prêtée, une connexion cassée est
+  remplacée ;
+- attente et ouvertures alimentent /metrics (db_pool_wait_seconds...) et
+  l'étape db_pool_wait des traces.
+"""
 import os
+import threading
+import time
 from contextlib import contextmanager
 
 import psycopg2
 from dotenv import load_dotenv
 
+from .metrics import inc_db_connections_discarded, inc_db_connections_opened, inc_db_pool_timeouts, observe_db_pool_wait
+from .tracing import record
+
 load_dotenv()
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "5"))
+DB_POOL_CHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_CHECK_IDLE_SECONDS", "30"))
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+
+
+def db_config(**overrides):
+    """
+    Arguments de psycopg2.connect ; overrides remplace une valeur (ex. database).
+    """
+    db_url = os.getenv("DATABASE_URL")
+    if db_url:
+        cfg = {"dsn": db_url}
+    else:
+        cfg = {
+            "host": os.getenv("DB_HOST", "localhost"),
+            "port": int(os.getenv("DB_PORT", "5432")),
+            "database": os.getenv("DB_NAME", "rag-db"),
+            "user": os.getenv("DB_USER", "postgres"),
+            "password": os.getenv("DB_PASSWORD", "postgres123"),
+        }
+    cfg["options"] = "-c client_encoding=UTF8"
+    cfg["connect_timeout"] = DB_CONNECT_TIMEOUT_SECONDS
+    cfg.update(overrides)
+    return cfg
+
+
+def connect(**overrides):
+    """
+    Connexion hors pool (chargements ponctuels, scripts).
+    """
+    return psycopg2.connect(**db_config(**overrides))
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe : les routes sync tournent dans le threadpool de
+    Starlette, chacune emprunte une connexion le temps de son bloc get_db().
+    Les connexions libres sont réutilisées de la plus récente à la plus
+    ancienne (les anciennes finissent par être vérifiées ou fermées par le
+    serveur sans pénaliser le trafic).
+    """
+
+    def __init__(self, connect=connect, min_size=None, max_size=None, timeout=None,
+                 check_idle_seconds=None, clock=time.monotonic):
+        self._connect = connect
+        self.min_size = DB_POOL_MIN if min_size is None else min_size
+        self.max_size = max(1, DB_POOL_MAX if max_size is None else max_size)
+        self.timeout = DB_POOL_TIMEOUT_SECONDS if timeout is None else timeout
+        self.check_idle_seconds = DB_POOL_CHECK_IDLE_SECONDS if check_idle_seconds is None else check_idle_seconds
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._idle = []  # [(connexion, rendue à)]
+        self._size = 0  # ouvertes ou en cours d'ouverture, prêtées comprises
+        self._closed = False
+        self.pid = os.getpid()
+
+    def _open(self):
+        conn = self._connect()
+        inc_db_connections_opened()
+        return conn
+
+    def _discard(self, conn):
+        inc_db_connections_discarded()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if self._clock() - idle_since < self.check_idle_seconds:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        """
+        Ouvre les connexions manquantes jusqu'à min_size.
+        """
+        while True:
+            with self._cond:
+                if self._closed or self._size >= min(self.min_size, self.max_size):
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self.release(conn)
+
+    def acquire(self):
+        start = self._clock()
+        deadline = start + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Pool de connexions fermé")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, idle_since = None, None
+                    break
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    inc_db_pool_timeouts()
+                    raise PoolTimeout(
+                        f"Aucune connexion libre après {self.timeout:g} s (DB_POOL_MAX={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._healthy(conn, idle_since):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited = self._clock() - start
+        observe_db_pool_wait(waited)
+        record("db_pool_wait", waited * 1000)
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Rend la connexion ; rollback de toute transaction restée ouverte
+        (un SELECT sans commit laisse la session « idle in transaction »).
+        """
+        if not discard and not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, self._clock()))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "max": self.max_size}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        # Un pool hérité d'un fork partagerait ses sockets avec le parent
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool()
+        return _pool
+
+
+def open_pool():
+    """
+    Au démarrage : ouvre DB_POOL_MIN connexions. Base injoignable = simple
+    avertissement, les requêtes réessaieront.
+    """
+    try:
+        get_pool().warm()
+    except Exception as e:
+        print(f"⚠️ Pool PostgreSQL non initialisé : {e}")
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
 
 @contextmanager
 def get_db():
-    conn = psycopg2.connect(
-        host="localhost",
-        database="rag-db",
-        user="postgres",
-        password="postgres123",
-        options="-c client_encoding=UTF8"
-    )
+    pool = get_pool()
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
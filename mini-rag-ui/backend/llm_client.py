@@ -1,15 +1,53 @@
+import asyncio
 import os
 import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 
-from .metrics import inc_llm_calls, inc_llm_errors, inc_llm_retries
+from .metrics import (
+    inc_llm_calls,
+    inc_llm_deadline_exceeded,
+    inc_llm_errors,
+    inc_llm_hedges,
+    inc_llm_retries,
+    inc_llm_wins,
+)
+from .tracing import record, span, traced
 
 api_key = os.getenv("OPENROUTER_API_KEY")
 if not api_key:
     raise ValueError("❌ La clé OPENROUTER_API_KEY n'est pas définie.")
 
-client = OpenAI(
+PRIMARY_MODEL = os.getenv("OPENROUTER_PRIMARY_MODEL", "openai/gpt-4o-mini")
+FALLBACK_MODEL = os.getenv("OPENROUTER_FALLBACK_MODEL", "openai/gpt-4o-mini")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Budget total d'une réponse (essais + backoff), 0 = pas de limite globale
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "0"))
+
+# Requête de couverture ("hedge", chemin async) : si le modèle principal n'a
+# pas répondu après le percentile LLM_HEDGE_PERCENTILE de ses latences
+# récentes, la même requête part vers FALLBACK_MODEL ; la première réponse
+# gagne, l'autre est annulée.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "3"))  # tant que l'historique est court
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+
+# Appels LLM simultanés par worker (chemin async) ; les suivants attendent
+# un créneau au lieu d'occuper un thread
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Connexions HTTP gardées ouvertes vers le provider (TLS déjà négocié)
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", str(max(LLM_MAX_CONCURRENCY, 1))))
+LLM_POOL_KEEPALIVE_SECONDS = float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", "60"))
+
+_client_options = dict(
     api_key=api_key,
     base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
     default_headers={
@@ -17,32 +55,292 @@ client = OpenAI(
         "X-Title": os.getenv("OPENROUTER_APP_TITLE", "Mini-RAG-Entreprise"),
     },
 )
+_pool_limits = httpx.Limits(
+    max_connections=LLM_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_POOL_MAX_CONNECTIONS,
+    keepalive_expiry=LLM_POOL_KEEPALIVE_SECONDS,
+)
+
+client = OpenAI(**_client_options)
+
+# Client partagé par toutes les requêtes async du worker
+async_client = AsyncOpenAI(
+    **_client_options,
+    http_client=httpx.AsyncClient(limits=_pool_limits, timeout=LLM_TIMEOUT_SECONDS),
+)
+
+# Un sémaphore par boucle asyncio (uvicorn n'en a qu'une ; les tests en créent plusieurs)
+_slots = weakref.WeakKeyDictionary()
+
+
+def _llm_slots():
+    loop = asyncio.get_running_loop()
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(max(LLM_MAX_CONCURRENCY, 1))
+    return slots
+
+
+@asynccontextmanager
+async def _llm_slot():
+    # Trace llm_queue : attente d'un créneau quand LLM_MAX_CONCURRENCY appels sont en cours
+    slots = _llm_slots()
+    with span("llm_queue"):
+        await slots.acquire()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def _backoff_seconds(attempt: int) -> float:
+    return min(0.6 * (attempt + 1), 2.0)
 
-PRIMARY_MODEL = os.getenv("OPENROUTER_PRIMARY_MODEL", "openai/gpt-4o-mini")
-FALLBACK_MODEL = os.getenv("OPENROUTER_FALLBACK_MODEL", "openai/gpt-4o-mini")
-LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
-LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
 
+def _deadline():
+    return time.monotonic() + LLM_DEADLINE_SECONDS if LLM_DEADLINE_SECONDS > 0 else None
 
+
+def _remaining(deadline) -> float:
+    """
+    Timeout de l'essai suivant : LLM_TIMEOUT_SECONDS, borné par le budget restant.
+    """
+    if deadline is None:
+        return LLM_TIMEOUT_SECONDS
+    return min(LLM_TIMEOUT_SECONDS, deadline - time.monotonic())
+
+
+def _deadline_error(last_error):
+    inc_llm_deadline_exceeded()
+    return RuntimeError(f"Erreur provider LLM: délai total de {LLM_DEADLINE_SECONDS:g}s dépassé ({last_error})")
+
+
+def _path(attempt: int) -> str:
+    if attempt == 0:
+        return "primary"
+    return "retry" if attempt < LLM_MAX_RETRIES else "fallback"
+
+
+@traced("llm")
 def create_response(input_data, temperature=0.1):
     inc_llm_calls()
     last_error = None
+    deadline = _deadline()
 
     for attempt in range(LLM_MAX_RETRIES + 1):
         model = PRIMARY_MODEL if attempt < LLM_MAX_RETRIES else FALLBACK_MODEL
+        timeout = _remaining(deadline)
+        if timeout <= 0:
+            raise _deadline_error(last_error)
         try:
             if attempt > 0:
                 inc_llm_retries()
             response = client.responses.create(
+                model=model,
+                input=input_data,
+                temperature=temperature,
+                timeout=timeout,
+            )
+            inc_llm_wins(_path(attempt))
+            return response
+        except Exception as exc:
+            last_error = exc
+            inc_llm_errors()
+            time.sleep(max(min(_backoff_seconds(attempt), _remaining(deadline)), 0))
+
+    raise RuntimeError(f"Erreur provider LLM: {last_error}")
+
+
+@traced("llm")
+def stream_response(input_data, temperature=0.1):
+    """
+    Génère le texte par fragments, dès que le provider les émet.
+    Nouvel essai (puis modèle de secours) seulement tant qu'aucun fragment
+    n'a été transmis : au-delà, une erreur interrompt le flux.
+    Trace : llm_ttft jusqu'au premier fragment, llm jusqu'à la fin du flux.
+    """
+    inc_llm_calls()
+    last_error = None
+    start = time.perf_counter()
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        model = PRIMARY_MODEL if attempt < LLM_MAX_RETRIES else FALLBACK_MODEL
+        started = False
+        try:
+            if attempt > 0:
+                inc_llm_retries()
+            stream = client.responses.create(
                 model=model,
                 input=input_data,
                 temperature=temperature,
                 timeout=LLM_TIMEOUT_SECONDS,
+                stream=True,
+            )
+            for event in stream:
+                if event.type == "response.output_text.delta" and event.delta:
+                    if not started:
+                        record("llm_ttft", (time.perf_counter() - start) * 1000)
+                    started = True
+                    yield event.delta
+                elif event.type in ("error", "response.failed"):
+                    raise RuntimeError(getattr(event, "message", None) or event.type)
+            return
+        except Exception as exc:
+            last_error = exc
+            inc_llm_errors()
+            if started:
+                raise RuntimeError(f"Erreur provider LLM pendant le streaming: {exc}") from exc
+            time.sleep(_backoff_seconds(attempt))
+
+    raise RuntimeError(f"Erreur provider LLM: {last_error}")
+
+
+# =========================
+# CHEMIN ASYNC
+# =========================
+# Mêmes essais que ci-dessus, sans bloquer de thread : l'attente du
+# provider et le backoff (asyncio.sleep) libèrent la boucle. Le créneau du
+# sémaphore n'est tenu que pendant un appel, pas pendant le backoff ; une
+# requête de couverture prend son propre créneau (pas de hedge si saturé).
+async def _acall(model, input_data, temperature, timeout):
+    async with _llm_slot():
+        return await async_client.responses.create(
+            model=model,
+            input=input_data,
+            temperature=temperature,
+            timeout=timeout,
+        )
+
+
+# Latences récentes du modèle principal (secondes). Un appel annulé par la
+# couverture compte pour sa durée au moment de l'annulation (borne basse) :
+# sinon le percentile ne verrait jamais les appels lents.
+_primary_latencies = deque(maxlen=max(LLM_HEDGE_WINDOW, 1))
+
+
+def hedge_delay() -> float:
+    if len(_primary_latencies) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DELAY_SECONDS
+    latencies = sorted(_primary_latencies)
+    rank = int(round(LLM_HEDGE_PERCENTILE / 100 * (len(latencies) - 1)))
+    return max(latencies[min(rank, len(latencies) - 1)], LLM_HEDGE_MIN_DELAY_SECONDS)
+
+
+async def _hedged(model, input_data, temperature, timeout, path="primary"):
+    """
+    Principal, puis couverture après hedge_delay() (ou dès l'échec du
+    principal) ; la première réponse réussie gagne, dans la limite de timeout.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    end = started + timeout
+    primary = asyncio.ensure_future(_acall(model, input_data, temperature, timeout))
+    paths = {primary: path}
+    errors = []
+
+    try:
+        await asyncio.wait({primary}, timeout=min(hedge_delay(), timeout))
+        if primary.done():
+            if primary.exception() is None:
+                _primary_latencies.append(loop.time() - started)
+                inc_llm_wins(path)
+                return primary.result()
+            errors.append(primary.exception())
+
+        if end - loop.time() <= 0:
+            raise TimeoutError("délai de l'essai dépassé")
+        inc_llm_hedges()
+        hedge = asyncio.ensure_future(_acall(FALLBACK_MODEL, input_data, temperature, end - loop.time()))
+        paths[hedge] = "hedge"
+
+        pending = {task for task in paths if not task.done()}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(end - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
             )
+            if not done:
+                raise TimeoutError("délai de l'essai dépassé")
+            for task in done:
+                if task.exception() is None:
+                    if task is primary:
+                        _primary_latencies.append(loop.time() - started)
+                    inc_llm_wins(paths[task])
+                    return task.result()
+                errors.append(task.exception())
+        raise errors[-1]
+    finally:
+        if not primary.done():
+            _primary_latencies.append(loop.time() - started)
+        for task in paths:
+            if not task.done():
+                task.cancel()
+
+
+@traced("llm")
+async def acreate_response(input_data, temperature=0.1):
+    inc_llm_calls()
+    last_error = None
+    deadline = _deadline()
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        model = PRIMARY_MODEL if attempt < LLM_MAX_RETRIES else FALLBACK_MODEL
+        timeout = _remaining(deadline)
+        if timeout <= 0:
+            raise _deadline_error(last_error)
+        try:
+            if attempt > 0:
+                inc_llm_retries()
+            if LLM_HEDGE_ENABLED and attempt < LLM_MAX_RETRIES:
+                return await _hedged(model, input_data, temperature, timeout, path=_path(attempt))
+            # wait_for : l'attente d'un créneau compte aussi dans le budget
+            response = await asyncio.wait_for(_acall(model, input_data, temperature, timeout), timeout)
+            inc_llm_wins(_path(attempt))
             return response
         except Exception as exc:
             last_error = exc
             inc_llm_errors()
-            time.sleep(min(0.6 * (attempt + 1), 2.0))
+            await asyncio.sleep(max(min(_backoff_seconds(attempt), _remaining(deadline)), 0))
+
+    raise RuntimeError(f"Erreur provider LLM: {last_error}")
+
+
+@traced("llm")
+async def astream_response(input_data, temperature=0.1):
+    """
+    Version async de stream_response : le créneau est tenu jusqu'à la fin du flux.
+    """
+    inc_llm_calls()
+    last_error = None
+    start = time.perf_counter()
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        model = PRIMARY_MODEL if attempt < LLM_MAX_RETRIES else FALLBACK_MODEL
+        started = False
+        try:
+            if attempt > 0:
+                inc_llm_retries()
+            async with _llm_slot():
+                stream = await async_client.responses.create(
+                    model=model,
+                    input=input_data,
+                    temperature=temperature,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    stream=True,
+                )
+                async for event in stream:
+                    if event.type == "response.output_text.delta" and event.delta:
+                        if not started:
+                            record("llm_ttft", (time.perf_counter() - start) * 1000)
+                        started = True
+                        yield event.delta
+                    elif event.type in ("error", "response.failed"):
+                        raise RuntimeError(getattr(event, "message", None) or event.type)
+            return
+        except Exception as exc:
+            last_error = exc
+            inc_llm_errors()
+            if started:
+                raise RuntimeError(f"Erreur provider LLM pendant le streaming: {exc}") from exc
+            await asyncio.sleep(_backoff_seconds(attempt))
 
-    raise RuntimeError(f"Erreur provider LLM: {last_error}")
\ No newline at end of file
+    raise RuntimeError(f"Erreur provider LLM: {last_error}")
@@ -1,62 +1,444 @@
+# backend/metrics.py
+"""
+Compteurs et histogrammes de latence du process, exposés sur /metrics au
+format texte Prometheus, agrégés sur tous les workers uvicorn.
+
+Chaque worker écrit son état dans METRICS_DIR/<pid>.json toutes les
+METRICS_FLUSH_SECONDS (thread démon) ; /metrics additionne son propre état
+et les fichiers des autres workers. Un fichier non réécrit depuis
+METRICS_STALE_SECONDS (worker arrêté) est ignoré puis supprimé : ses
+compteurs disparaissent, ce que Prometheus traite comme une remise à zéro.
+METRICS_DIR doit être propre à la machine (pas de volume partagé entre hôtes).
+"""
+import atexit
+import json
+import os
+import threading
 import time
+from bisect import bisect_left
 from collections import defaultdict
-from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_DIR = os.getenv("METRICS_DIR", "storage/metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", "30"))
+METRICS_PREFIX = "minirag_"
+
+# Secondes : du cache (ms) à l'appel LLM lent
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
 
 _metrics = {
-    "route_count": defaultdict(int),
-    "route_errors": defaultdict(int),
-    "route_latency_ms_total": defaultdict(float),
+    # (méthode, route, statut) -> requêtes
+    "http_requests": defaultdict(int),
     "llm_calls": 0,
     "llm_errors": 0,
     "llm_retries": 0,
+    "llm_hedges": 0,
+    "llm_deadline_exceeded": 0,
+    # Chemin ayant fourni la réponse : primary | retry | fallback | hedge
+    "llm_wins": defaultdict(int),
+    "embedding_cache_hits": 0,
+    "embedding_cache_misses": 0,
+    "query_embedding_cache_hits": 0,
+    "query_embedding_cache_misses": 0,
+    "answer_cache_hits": 0,
+    "answer_cache_misses": 0,
+    "coalesced_requests": 0,
+    # Tokens du contexte RAG avant / après context_packer
+    "prompt_requests": 0,
+    "prompt_tokens_before_total": 0,
+    "prompt_tokens_after_total": 0,
+    "db_connections_opened": 0,
+    "db_connections_discarded": 0,
+    "db_pool_timeouts": 0,
+}
+
+# Noms des labels des compteurs à clés
+_LABELS = {
+    "http_requests": ("method", "route", "status"),
+    "llm_wins": ("path",),
+}
+
+_HELP = {
+    "http_requests": "Requêtes HTTP par route et statut",
+    "llm_calls": "Appels LLM",
+    "llm_errors": "Essais LLM en erreur",
+    "llm_retries": "Nouveaux essais LLM",
+    "llm_hedges": "Requêtes LLM de couverture",
+    "llm_deadline_exceeded": "Appels LLM abandonnés (LLM_DEADLINE_SECONDS)",
+    "llm_wins": "Chemin ayant fourni la réponse LLM",
+    "embedding_cache_hits": "Chunks lus dans le cache d'embeddings",
+    "embedding_cache_misses": "Chunks encodés faute de cache",
+    "query_embedding_cache_hits": "Questions lues dans le LRU d'embeddings",
+    "query_embedding_cache_misses": "Questions encodées",
+    "answer_cache_hits": "Réponses visiteurs servies depuis le cache",
+    "answer_cache_misses": "Réponses visiteurs calculées",
+    "coalesced_requests": "Requêtes ayant partagé un calcul en cours",
+    "prompt_requests": "Contextes LLM construits",
+    "prompt_tokens_before_total": "Tokens de contexte avant context_packer",
+    "prompt_tokens_after_total": "Tokens de contexte après context_packer",
+    "db_connections_opened": "Connexions PostgreSQL ouvertes par le pool",
+    "db_connections_discarded": "Connexions PostgreSQL fermées (cassées ou en trop)",
+    "db_pool_timeouts": "Emprunts au pool abandonnés (DB_POOL_TIMEOUT_SECONDS)",
+    "db_pool_wait_seconds": "Temps pour obtenir une connexion du pool (ouverture comprise)",
+    "http_request_duration_seconds": "Durée des requêtes HTTP (corps streamé compris)",
+    "stage_duration_seconds": "Durée de chaque étape du pipeline par requête (voir tracing)",
 }
 
 
-def inc_route(path: str):
-    _metrics["route_count"][path] += 1
+class Histogram:
+    """
+    Comptes par bucket (non cumulés ; cumulés à l'exposition), somme, nombre.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
 
 
-def inc_route_error(path: str):
-    _metrics["route_errors"][path] += 1
+_histograms = {
+    # (méthode, route) -> durée de la requête
+    "http_request_duration_seconds": defaultdict(Histogram),
+    # (étape,) -> durée cumulée de l'étape dans une requête
+    "stage_duration_seconds": defaultdict(Histogram),
+    # () -> attente d'une connexion PostgreSQL
+    "db_pool_wait_seconds": defaultdict(Histogram),
+}
+
+_HISTOGRAM_LABELS = {
+    "http_request_duration_seconds": ("method", "route"),
+    "stage_duration_seconds": ("stage",),
+    "db_pool_wait_seconds": (),
+}
 
 
-def add_route_latency(path: str, elapsed_ms: float):
-    _metrics["route_latency_ms_total"][path] += elapsed_ms
+def _inc(name: str, amount=1):
+    with _lock:
+        _metrics[name] += amount
 
 
 def inc_llm_calls():
-    _metrics["llm_calls"] += 1
+    _inc("llm_calls")
 
 
 def inc_llm_errors():
-    _metrics["llm_errors"] += 1
+    _inc("llm_errors")
 
 
 def inc_llm_retries():
-    _metrics["llm_retries"] += 1
+    _inc("llm_retries")
+
+
+def inc_llm_hedges():
+    _inc("llm_hedges")
+
+
+def inc_llm_deadline_exceeded():
+    _inc("llm_deadline_exceeded")
+
+
+def inc_llm_wins(path: str):
+    with _lock:
+        _metrics["llm_wins"][path] += 1
+
+
+def inc_embedding_cache_hits(count: int = 1):
+    _inc("embedding_cache_hits", count)
+
+
+def inc_embedding_cache_misses(count: int = 1):
+    _inc("embedding_cache_misses", count)
+
+
+def inc_query_embedding_cache_hits():
+    _inc("query_embedding_cache_hits")
+
+
+def inc_query_embedding_cache_misses():
+    _inc("query_embedding_cache_misses")
+
+
+def inc_answer_cache_hits():
+    _inc("answer_cache_hits")
+
+
+def inc_answer_cache_misses():
+    _inc("answer_cache_misses")
+
+
+def inc_coalesced_requests():
+    _inc("coalesced_requests")
+
+
+def add_prompt_tokens(before: int, after: int):
+    with _lock:
+        _metrics["prompt_requests"] += 1
+        _metrics["prompt_tokens_before_total"] += before
+        _metrics["prompt_tokens_after_total"] += after
+
+
+def inc_db_connections_opened():
+    _inc("db_connections_opened")
+
+
+def inc_db_connections_discarded():
+    _inc("db_connections_discarded")
+
+
+def inc_db_pool_timeouts():
+    _inc("db_pool_timeouts")
+
+
+def observe_db_pool_wait(elapsed_s: float):
+    with _lock:
+        _histograms["db_pool_wait_seconds"][()].observe(elapsed_s)
+
+
+def observe_request(method: str, route: str, status: int, elapsed_s: float, stages=None):
+    """
+    Une requête terminée : compteur (méthode, route, statut), histogramme de
+    durée et, si elle a été tracée, une observation par étape (stages :
+    {étape: {"ms": ...}} de RequestTrace.breakdown()).
+    """
+    with _lock:
+        _metrics["http_requests"][(method, route, str(status))] += 1
+        _histograms["http_request_duration_seconds"][(method, route)].observe(elapsed_s)
+        for stage, d in (stages or {}).items():
+            _histograms["stage_duration_seconds"][(stage,)].observe(d["ms"] / 1000)
+
+
+def _hit_rate(hits: int, misses: int):
+    total = hits + misses
+    return round(hits / total, 4) if total else 0
+
+
+def _average(total, count):
+    return round(total / count, 1) if count else 0
 
 
 def snapshot_metrics():
-    avg_latency = {}
-    for path, count in _metrics["route_count"].items():
-        total = _metrics["route_latency_ms_total"].get(path, 0.0)
-        avg_latency[path] = round(total / count, 2) if count else 0
+    """
+    Vue JSON du worker courant (sans agrégation entre workers).
+    """
+    with _lock:
+        requests = dict(_metrics["http_requests"])
+        durations = {key: (h.sum, h.count) for key, h in _histograms["http_request_duration_seconds"].items()}
+        pool_wait = _histograms["db_pool_wait_seconds"].get(())
+        pool_wait = (pool_wait.sum, pool_wait.count) if pool_wait else (0.0, 0)
+        values = {k: (dict(v) if isinstance(v, defaultdict) else v) for k, v in _metrics.items()}
+
+    route_count = defaultdict(int)
+    route_errors = defaultdict(int)
+    for (method, route, status), count in requests.items():
+        route_count[f"{method} {route}"] += count
+        if status.startswith("5"):
+            route_errors[f"{method} {route}"] += count
 
     return {
-        "route_count": dict(_metrics["route_count"]),
-        "route_errors": dict(_metrics["route_errors"]),
-        "route_avg_latency_ms": avg_latency,
-        "llm_calls": _metrics["llm_calls"],
-        "llm_errors": _metrics["llm_errors"],
-        "llm_retries": _metrics["llm_retries"],
+        "route_count": dict(route_count),
+        "route_errors": dict(route_errors),
+        "route_avg_latency_ms": {
+            f"{method} {route}": round(total / count * 1000, 2) if count else 0
+            for (method, route), (total, count) in durations.items()
+        },
+        "llm_calls": values["llm_calls"],
+        "llm_errors": values["llm_errors"],
+        "llm_retries": values["llm_retries"],
+        "llm_hedges": values["llm_hedges"],
+        "llm_deadline_exceeded": values["llm_deadline_exceeded"],
+        "llm_wins": values["llm_wins"],
+        "embedding_cache_hits": values["embedding_cache_hits"],
+        "embedding_cache_misses": values["embedding_cache_misses"],
+        "query_embedding_cache_hits": values["query_embedding_cache_hits"],
+        "query_embedding_cache_misses": values["query_embedding_cache_misses"],
+        "query_embedding_cache_hit_rate": _hit_rate(
+            values["query_embedding_cache_hits"], values["query_embedding_cache_misses"]
+        ),
+        "answer_cache_hits": values["answer_cache_hits"],
+        "answer_cache_misses": values["answer_cache_misses"],
+        "answer_cache_hit_rate": _hit_rate(values["answer_cache_hits"], values["answer_cache_misses"]),
+        "coalesced_requests": values["coalesced_requests"],
+        "prompt_tokens_before_avg": _average(values["prompt_tokens_before_total"], values["prompt_requests"]),
+        "prompt_tokens_after_avg": _average(values["prompt_tokens_after_total"], values["prompt_requests"]),
+        "db_connections_opened": values["db_connections_opened"],
+        "db_connections_discarded": values["db_connections_discarded"],
+        "db_pool_timeouts": values["db_pool_timeouts"],
+        "db_pool_wait_avg_ms": _average(pool_wait[0] * 1000, pool_wait[1]),
     }
 
 
-@contextmanager
-def route_timer(path: str):
-    start = time.perf_counter()
+# =========================
+# AGRÉGATION ENTRE WORKERS
+# =========================
+def export_state():
+    """
+    État du worker en JSON : compteurs [[labels], valeur], histogrammes
+    [[labels], comptes par bucket, somme, nombre].
+    """
+    with _lock:
+        counters = {}
+        for name, value in _metrics.items():
+            if isinstance(value, defaultdict):
+                counters[name] = [[list(k) if isinstance(k, tuple) else [k], v] for k, v in value.items()]
+            else:
+                counters[name] = [[[], value]]
+        histograms = {
+            name: [[list(k), list(h.counts), h.sum, h.count] for k, h in series.items()]
+            for name, series in _histograms.items()
+        }
+    return {"pid": os.getpid(), "buckets": list(LATENCY_BUCKETS), "counters": counters, "histograms": histograms}
+
+
+def merge_states(states):
+    """
+    Somme des états de plusieurs workers : {nom: {labels: valeur}} et
+    {nom: {labels: [comptes, somme, nombre]}}.
+    """
+    counters = defaultdict(lambda: defaultdict(float))
+    histograms = defaultdict(dict)
+    for state in states:
+        if state.get("buckets") != list(LATENCY_BUCKETS):
+            continue  # worker d'une autre version pendant un redéploiement
+        for name, series in state["counters"].items():
+            for labels, value in series:
+                counters[name][tuple(labels)] += value
+        for name, series in state["histograms"].items():
+            for labels, counts, total, count in series:
+                entry = histograms[name].setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+    return counters, histograms
+
+
+def _worker_file(directory=None) -> Path:
+    return Path(directory or METRICS_DIR) / f"{os.getpid()}.json"
+
+
+def flush(directory=None):
+    path = _worker_file(directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(export_state()), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _other_worker_states(directory=None, stale_seconds=None):
+    stale_seconds = METRICS_STALE_SECONDS if stale_seconds is None else stale_seconds
+    own = _worker_file(directory).name
+    states = []
+    now = time.time()
+    for path in Path(directory or METRICS_DIR).glob("*.json"):
+        if path.name == own:
+            continue
+        try:
+            if now - path.stat().st_mtime > stale_seconds:
+                path.unlink()
+                continue
+            states.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue  # fichier supprimé ou réécrit entre-temps
+    return states
+
+
+_stop = threading.Event()
+_writer_thread = None
+
+
+def _writer():
+    while not _stop.wait(METRICS_FLUSH_SECONDS):
+        try:
+            flush()
+        except OSError as e:
+            print(f"⚠️ Métriques non écrites ({METRICS_DIR}): {e}")
+
+
+def stop_metrics_writer():
+    """
+    Arrêt du worker : plus d'écriture, puis suppression de son fichier
+    (fin du lifespan de l'API ; atexit pour les autres process).
+    """
+    _stop.set()
+    if _writer_thread is not None:
+        _writer_thread.join(timeout=2)
     try:
-        yield
-    finally:
-        elapsed = (time.perf_counter() - start) * 1000
-        add_route_latency(path, elapsed)
+        _worker_file().unlink()
+    except OSError:
+        pass
+
+
+def start_metrics_writer():
+    """
+    Écriture périodique de l'état du worker (début du lifespan de l'API).
+    """
+    global _writer_thread
+    with _lock:
+        if _writer_thread is not None:
+            return
+        _writer_thread = threading.Thread(target=_writer, name="metrics-writer", daemon=True)
+    _writer_thread.start()
+    atexit.register(stop_metrics_writer)
+
+
+# =========================
+# EXPOSITION PROMETHEUS
+# =========================
+def _metric_name(name: str, suffix: str = "") -> str:
+    if suffix == "_total" and name.endswith("_total"):
+        suffix = ""
+    return f"{METRICS_PREFIX}{name}{suffix}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus(states):
+    counters, histograms = merge_states(states)
+    lines = []
+    for name, series in counters.items():
+        metric = _metric_name(name, "_total")
+        lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{metric}{_labels(_LABELS.get(name, ()), labels)} {_number(value)}")
+
+    bounds = [repr(b) for b in LATENCY_BUCKETS] + ["+Inf"]
+    for name, series in histograms.items():
+        metric = _metric_name(name)
+        label_names = _HISTOGRAM_LABELS.get(name, ())
+        lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{_labels(label_names, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(label_names, labels)} {_number(total)}")
+            lines.append(f"{metric}_count{_labels(label_names, labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics(directory=None):
+    """
+    Texte /metrics : état courant de ce worker + derniers états écrits par les autres.
+    """
+    return render_prometheus([export_state()] + _other_worker_states(directory))
@@ -0,0 +1,109 @@
+# backend/rag/answer_cache.py
+"""
+Cache sémantique des réponses publiques (/rag/visitor).
+
+Les visiteurs posent les mêmes questions (contact, services, rendez-vous)
+avec des formulations proches : si le vecteur d'une nouvelle question est
+assez proche (cosinus >= seuil) d'une question déjà traitée, la réponse est
+réutilisée sans appel LLM.
+
+Les réponses ne valent que pour une version de l'index public (génération
+du manifest) : un changement de version vide le cache.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))  # 0 = sans expiration
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        max_size=ANSWER_CACHE_SIZE,
+        ttl=ANSWER_CACHE_TTL_SECONDS,
+        enabled=ANSWER_CACHE_ENABLED,
+        clock=time.monotonic,
+    ):
+        self.threshold = threshold
+        self.max_size = max(max_size, 0)
+        self.ttl = ttl
+        self.enabled = enabled and self.max_size > 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.version = None
+        self._reset()
+
+    def _reset(self):
+        # Alloués au premier put (dimension du modèle), max_size lignes
+        self._vectors = None
+        self._stored_at = np.zeros(self.max_size)
+        self._last_used = np.zeros(self.max_size)
+        self._answers = []
+
+    def __len__(self):
+        return len(self._answers)
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._reset()
+            self.version = version
+
+    def get(self, q_vec, version):
+        """
+        Réponse de la question la plus proche si cosinus >= seuil, sinon None.
+        """
+        if not self.enabled:
+            return None
+        q_vec = np.asarray(q_vec, dtype="float32").reshape(-1)
+
+        with self._lock:
+            self._check_version(version)
+            if not self._answers:
+                return None
+
+            n = len(self._answers)
+            scores = self._vectors[:n] @ q_vec
+            now = self._clock()
+            if self.ttl:
+                scores[now - self._stored_at[:n] > self.ttl] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._last_used[best] = now
+            return self._answers[best]
+
+    def put(self, q_vec, answer: str, version):
+        """
+        Ignoré si l'index a changé depuis (version différente de celle du cache).
+        """
+        if not self.enabled or not answer:
+            return
+        q_vec = np.asarray(q_vec, dtype="float32").reshape(-1)
+
+        with self._lock:
+            if self.version is not None and version != self.version:
+                return
+            self._check_version(version)
+
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(q_vec)), dtype="float32")
+
+            if len(self._answers) < self.max_size:
+                row = len(self._answers)
+                self._answers.append(answer)
+            else:
+                # Plein : remplace l'entrée la moins récemment utilisée
+                row = int(np.argmin(self._last_used))
+                self._answers[row] = answer
+
+            now = self._clock()
+            self._vectors[row] = q_vec
+            self._stored_at[row] = now
+            self._last_used[row] = now
@@ -0,0 +1,328 @@
+# backend/rag/chunk_store.py
+"""
+Stockage colonnaire des chunks (remplace le dict id -> {"text", "type", "source"}).
+
+- type / source : codes entiers vers des tables de chaînes internées
+  (une seule copie de "presentation_smartia.txt" pour tous ses chunks) ;
+- texte : un seul buffer UTF-8 contigu + tableau d'offsets, mappé en
+  mémoire au rechargement (ou compressé zstd sur disque) ;
+- les dicts ne sont construits qu'à la demande, pour les seuls résultats
+  d'une recherche.
+
+Les lignes sont triées par id FAISS (ids croissants) : id -> ligne par
+recherche dichotomique. Une suppression marque la ligne comme morte ; les
+lignes mortes sont compactées quand elles deviennent majoritaires, et
+avant chaque sauvegarde.
+"""
+import io
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # compression optionnelle
+    zstandard = None
+
+CHUNK_STORE_COMPRESSION = os.getenv("CHUNK_STORE_COMPRESSION", "none").strip().lower()  # none | zstd
+
+COLUMNS_FILE = "chunks.npz"
+TABLES_FILE = "chunks.tables.json"
+TEXT_FILE = "chunks.bin"
+TEXT_FILE_ZSTD = "chunks.bin.zst"
+
+# Windows refuse de remplacer un fichier mappé : texte chargé en mémoire
+MMAP_TEXT = os.name != "nt"
+
+
+class _StringTable:
+    """
+    Chaînes internées : code entier <-> chaîne.
+    """
+
+    def __init__(self, values=None):
+        self.values = list(values or [])
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def rename(self, old: str, new: str):
+        code = self.codes.pop(old)
+        self.values[code] = new
+        self.codes[new] = code
+
+
+class _Column:
+    """
+    Tableau numpy à capacité doublée (ajouts amortis en O(1)).
+    Peut démarrer sur un tableau en lecture seule (memmap) : il n'est
+    copié en mémoire qu'au premier ajout.
+    """
+
+    def __init__(self, dtype, data=None):
+        self._data = np.asarray(data, dtype=dtype) if data is not None else np.empty(0, dtype=dtype)
+        self.size = len(self._data)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        end = self.size + len(values)
+        if end > len(self._data) or not self._data.flags.writeable:
+            grown = np.empty(max(end, 2 * len(self._data), 1024), dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:end] = values
+        self.size = end
+
+    def view(self):
+        return self._data[:self.size]
+
+
+class ChunkStore:
+    def __init__(self):
+        self.types = _StringTable()
+        self.sources = _StringTable()
+        self.ids = _Column(np.int64)
+        self.type_codes = _Column(np.uint16)
+        self.source_codes = _Column(np.int32)
+        self.alive = _Column(bool)
+        self.offsets = _Column(np.int64, [0])
+        self.text = _Column(np.uint8)
+        self.n_alive = 0
+
+    def __len__(self):
+        return self.n_alive
+
+    # =========================
+    # LECTURE
+    # =========================
+    def _row(self, chunk_id: int):
+        ids = self.ids.view()
+        row = int(np.searchsorted(ids, chunk_id))
+        if row < len(ids) and ids[row] == chunk_id and self.alive.view()[row]:
+            return row
+        return None
+
+    def _materialize(self, row: int):
+        offsets = self.offsets.view()
+        return {
+            "text": self.text.view()[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8"),
+            "type": self.types.values[self.type_codes.view()[row]],
+            "source": self.sources.values[self.source_codes.view()[row]],
+        }
+
+    def get(self, chunk_id: int):
+        row = self._row(chunk_id)
+        return None if row is None else self._materialize(row)
+
+    def iter_chunks(self):
+        for row in np.flatnonzero(self.alive.view()):
+            yield self._materialize(int(row))
+
+    def iter_texts(self):
+        """
+        (id, texte) des lignes vivantes, par id croissant.
+        """
+        ids = self.ids.view()
+        offsets = self.offsets.view()
+        data = self.text.view()
+        for row in np.flatnonzero(self.alive.view()):
+            yield int(ids[row]), data[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def source_names(self):
+        codes = np.unique(self.source_codes.view()[self.alive.view()])
+        return [self.sources.values[code] for code in codes]
+
+    def _source_rows(self, source: str):
+        code = self.sources.codes.get(source)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero((self.source_codes.view() == code) & self.alive.view())
+
+    def ids_matching(self, sources=None, types=None):
+        """
+        Ids vivants dont la source / le type est dans la liste (None = pas de filtre).
+        """
+        mask = self.alive.view().copy()
+        if sources is not None:
+            codes = [self.sources.codes[s] for s in sources if s in self.sources.codes]
+            mask &= np.isin(self.source_codes.view(), codes)
+        if types is not None:
+            codes = [self.types.codes[t] for t in types if t in self.types.codes]
+            mask &= np.isin(self.type_codes.view(), codes)
+        return self.ids.view()[mask]
+
+    def count(self, source: str) -> int:
+        return len(self._source_rows(source))
+
+    def memory_bytes(self) -> int:
+        columns = (self.ids, self.type_codes, self.source_codes, self.alive, self.offsets, self.text)
+        return sum(c.view().nbytes for c in columns)
+
+    # =========================
+    # ÉCRITURE
+    # =========================
+    def add(self, ids, chunks):
+        """
+        ids : croissants et supérieurs à tous les ids déjà présents.
+        """
+        if not chunks:
+            return
+
+        payloads = [(c.get("text") or "").encode("utf-8") for c in chunks]
+        lengths = np.fromiter((len(p) for p in payloads), dtype=np.int64, count=len(payloads))
+
+        self.text.append(np.frombuffer(b"".join(payloads), dtype=np.uint8))
+        self.offsets.append(self.offsets.view()[-1] + np.cumsum(lengths))
+        self.ids.append(ids)
+        self.type_codes.append([self.types.code(c.get("type", "doc")) for c in chunks])
+        self.source_codes.append([self.sources.code(c.get("source", "unknown")) for c in chunks])
+        self.alive.append(np.ones(len(chunks), dtype=bool))
+        self.n_alive += len(chunks)
+
+    def remove_source(self, source: str):
+        """
+        Retourne les ids supprimés (à retirer aussi de l'index FAISS).
+        """
+        rows = self._source_rows(source)
+        ids = self.ids.view()[rows]
+        if not len(rows):
+            return ids
+
+        self.alive.view()[rows] = False
+        self.n_alive -= len(rows)
+        dead = len(self.ids) - self.n_alive
+        if dead > 1024 and dead > self.n_alive:
+            self.compact()
+        return ids
+
+    def rename_source(self, old: str, new: str) -> int:
+        """
+        O(1) si le nouveau nom n'existe pas encore : seule la table change.
+        """
+        rows = self._source_rows(old)
+        if not len(rows) or old == new:
+            return len(rows)
+
+        if new in self.sources.codes:
+            self.source_codes.view()[rows] = self.sources.codes[new]
+        else:
+            self.sources.rename(old, new)
+        return len(rows)
+
+    def compact(self):
+        rows = np.flatnonzero(self.alive.view())
+        offsets = self.offsets.view()
+        data = self.text.view()
+
+        # Copie par plages de lignes vivantes contiguës (une plage par
+        # source supprimée environ), pas chunk par chunk.
+        text = _Column(np.uint8)
+        if len(rows):
+            breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+            for run in np.split(rows, breaks):
+                text.append(data[offsets[run[0]]:offsets[run[-1] + 1]])
+        lengths = offsets[rows + 1] - offsets[rows]
+
+        type_codes = self.type_codes.view()[rows]
+        source_codes = self.source_codes.view()[rows]
+        used_types = np.unique(type_codes)
+        used_sources = np.unique(source_codes)
+        type_remap = np.zeros(len(self.types.values), dtype=np.uint16)
+        type_remap[used_types] = np.arange(len(used_types))
+        source_remap = np.zeros(len(self.sources.values), dtype=np.int32)
+        source_remap[used_sources] = np.arange(len(used_sources))
+
+        self.types = _StringTable(self.types.values[c] for c in used_types)
+        self.sources = _StringTable(self.sources.values[c] for c in used_sources)
+        self.ids = _Column(np.int64, self.ids.view()[rows])
+        self.type_codes = _Column(np.uint16, type_remap[type_codes])
+        self.source_codes = _Column(np.int32, source_remap[source_codes])
+        self.alive = _Column(bool, np.ones(len(rows), dtype=bool))
+        self.offsets = _Column(np.int64, np.concatenate([[0], np.cumsum(lengths)]))
+        self.text = text
+
+    # =========================
+    # PERSISTANCE
+    # =========================
+    def to_files(self, compression=CHUNK_STORE_COMPRESSION):
+        """
+        {nom de fichier: octets} ; les lignes mortes sont compactées avant.
+        """
+        if len(self.ids) != self.n_alive:
+            self.compact()
+
+        if compression == "zstd" and zstandard is None:
+            print("⚠️ CHUNK_STORE_COMPRESSION=zstd mais le module zstandard est absent : texte non compressé")
+            compression = "none"
+
+        columns = io.BytesIO()
+        np.savez(
+            columns,
+            ids=self.ids.view(),
+            type_codes=self.type_codes.view(),
+            source_codes=self.source_codes.view(),
+            offsets=self.offsets.view(),
+        )
+        tables = {"types": self.types.values, "sources": self.sources.values, "compression": compression}
+        text = self.text.view().tobytes()
+
+        files = {
+            COLUMNS_FILE: columns.getvalue(),
+            TABLES_FILE: json.dumps(tables, ensure_ascii=False).encode("utf-8"),
+        }
+        if compression == "zstd":
+            files[TEXT_FILE_ZSTD] = zstandard.ZstdCompressor(level=3).compress(text)
+        else:
+            files[TEXT_FILE] = text
+        return files
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Le buffer texte non compressé est mappé en mémoire (lecture seule) :
+        seules les pages des chunks réellement lus sont chargées.
+        """
+        directory = Path(directory)
+        with open(directory / TABLES_FILE, "r", encoding="utf-8") as f:
+            tables = json.load(f)
+        with np.load(directory / COLUMNS_FILE) as columns:
+            ids = columns["ids"]
+            type_codes = columns["type_codes"]
+            source_codes = columns["source_codes"]
+            offsets = columns["offsets"]
+
+        if tables.get("compression") == "zstd":
+            if zstandard is None:
+                raise RuntimeError("chunks compressés en zstd mais le module zstandard est absent")
+            raw = zstandard.ZstdDecompressor().decompress((directory / TEXT_FILE_ZSTD).read_bytes())
+            data = np.frombuffer(raw, dtype=np.uint8)
+        elif MMAP_TEXT and (directory / TEXT_FILE).stat().st_size:
+            data = np.memmap(directory / TEXT_FILE, dtype=np.uint8, mode="r")
+        else:
+            data = np.fromfile(directory / TEXT_FILE, dtype=np.uint8)
+
+        if len(data) != offsets[-1]:
+            raise ValueError(f"buffer texte incohérent ({len(data)} octets, {offsets[-1]} attendus)")
+
+        store = cls()
+        store.types = _StringTable(tables["types"])
+        store.sources = _StringTable(tables["sources"])
+        store.ids = _Column(np.int64, ids)
+        store.type_codes = _Column(np.uint16, type_codes)
+        store.source_codes = _Column(np.int32, source_codes)
+        store.alive = _Column(bool, np.ones(len(ids), dtype=bool))
+        store.offsets = _Column(np.int64, offsets)
+        store.text = _Column(np.uint8, data)
+        store.n_alive = len(ids)
+        return store
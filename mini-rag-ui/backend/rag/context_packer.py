@@ -0,0 +1,162 @@
+# backend/rag/context_packer.py
+"""
+Mise en forme du contexte envoyé au LLM dans un budget de tokens.
+
+ask passait les ~20 chunks rerankés, ask_public tout le corpus public
+quand la récupération ne trouvait rien : taille du prompt (donc latence
+et coût LLM) sans limite. Ici, dans l'ordre du classement :
+
+- un chunk dont les n-grammes de mots sont presque tous déjà présents
+  dans le contexte retenu est écarté (quasi-doublon) ;
+- le recouvrement de smart_chunk (40 mots partagés entre chunks voisins
+  d'une même source) est retiré du chunk ajouté ;
+- les chunks sont ajoutés tant qu'ils tiennent dans le budget ; un chunk
+  trop long est sauté au profit des suivants, sauf le premier, tronqué.
+
+Tokens comptés avec tiktoken si installé (pip install tiktoken),
+sinon estimés (~4 caractères par token).
+"""
+import math
+import os
+
+try:
+    import tiktoken
+except ImportError:  # comptage exact optionnel
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # 0 = sans limite
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "o200k_base")  # encodage de gpt-4o / gpt-4o-mini
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # part de n-grammes déjà vus
+
+SHINGLE_WORDS = 5
+# Recouvrement retiré seulement à partir de ce nombre de mots identiques
+MIN_OVERLAP_WORDS = 8
+MAX_OVERLAP_WORDS = 80
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _split_tag(text: str):
+    # "[SOURCE:pdf] ..." (smart_chunk) : le tag ne compte pas dans le recouvrement
+    words = text.split()
+    if words and words[0].startswith("[SOURCE:"):
+        return words[0], words[1:]
+    return None, words
+
+
+def _shingles(words):
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _overlap(head, tail):
+    """
+    Plus long n (>= MIN_OVERLAP_WORDS) tel que tail[-n:] == head[:n].
+    """
+    for n in range(min(len(head), len(tail), MAX_OVERLAP_WORDS), MIN_OVERLAP_WORDS - 1, -1):
+        if head[:n] == tail[-n:]:
+            return n
+    return 0
+
+
+def _strip_overlap(words, kept_words):
+    """
+    Retire de words ce qu'un chunk retenu de la même source couvre déjà :
+    son début (chunk suivant) ou sa fin (chunk précédent).
+    """
+    for other in kept_words:
+        n = _overlap(words, other)
+        if n:
+            words = words[n:]
+        n = _overlap(other, words)
+        if n:
+            words = words[:-n]
+    return words
+
+
+class PackStats:
+    def __init__(self):
+        self.chunks_in = 0
+        self.chunks_out = 0
+        self.duplicates = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def __repr__(self):
+        return (
+            f"{self.tokens_before} -> {self.tokens_after} tokens, "
+            f"{self.chunks_out}/{self.chunks_in} chunks ({self.duplicates} doublon(s))"
+        )
+
+
+def pack_context(chunks, budget=CONTEXT_TOKEN_BUDGET, render=lambda c: c.get("text", ""), threshold=CONTEXT_DEDUP_THRESHOLD):
+    """
+    chunks : dicts classés (meilleur d'abord) ; render(chunk) -> texte tel
+    qu'il apparaît dans le prompt. Retourne (chunks retenus, PackStats) ;
+    un chunk raccourci est une copie dont "text" est modifié.
+    """
+    stats = PackStats()
+    packed = []
+    seen = set()
+    kept_by_source = {}
+    used = 0
+
+    for chunk in chunks:
+        text = chunk.get("text")
+        if not isinstance(text, str) or not text.strip():
+            continue
+        stats.chunks_in += 1
+        stats.tokens_before += count_tokens(render(chunk))
+
+        tag, words = _split_tag(text)
+        shingles = _shingles(words)
+        if packed and shingles and len(shingles & seen) >= threshold * len(shingles):
+            stats.duplicates += 1
+            continue
+
+        source = chunk.get("source")
+        stripped = _strip_overlap(words, kept_by_source.get(source, []))
+        if not stripped:
+            stats.duplicates += 1
+            continue
+        if len(stripped) != len(words):
+            chunk = dict(chunk, text=" ".join(([tag] if tag else []) + stripped))
+
+        tokens = count_tokens(render(chunk))
+        if budget and used + tokens > budget:
+            if packed:
+                continue
+            # Le meilleur chunk passe toujours, tronqué au budget
+            chunk = dict(chunk, text=truncate_tokens(chunk["text"], max(budget - (tokens - count_tokens(chunk["text"])), 1)))
+            tokens = count_tokens(render(chunk))
+
+        packed.append(chunk)
+        seen |= shingles
+        kept_by_source.setdefault(source, []).append(words)
+        used += tokens
+
+    stats.chunks_out = len(packed)
+    stats.tokens_after = used
+    return packed, stats
@@ -0,0 +1,95 @@
+# backend/rag/embedding_batcher.py
+"""
+Micro-batching des embeddings de questions.
+
+Sous charge, N requêtes simultanées appelaient chacune model.encode sur
+une seule question : N passes avant d'une ligne qui se disputent le CPU
+(et le GIL entre deux opérations torch). Ici, un thread unique collecte
+les questions en attente, attend au plus QUERY_EMBEDDING_BATCH_WAIT_MS
+que d'autres arrivent (jusqu'à QUERY_EMBEDDING_BATCH_MAX), lance un seul
+encode et rend à chaque appelant sa ligne.
+
+Le délai n'est appliqué que sous charge (lot précédent de plus d'une
+question) : une question isolée part tout de suite. Les questions arrivées
+pendant un encode partent de toute façon ensemble au suivant.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+QUERY_EMBEDDING_BATCHING = os.getenv("QUERY_EMBEDDING_BATCHING", "1").strip().lower() not in ("0", "false", "no")
+QUERY_EMBEDDING_BATCH_MAX = int(os.getenv("QUERY_EMBEDDING_BATCH_MAX", "32"))
+QUERY_EMBEDDING_BATCH_WAIT_MS = float(os.getenv("QUERY_EMBEDDING_BATCH_WAIT_MS", "2"))
+
+
+class EmbeddingBatcher:
+    """
+    encode : List[str] -> ndarray (n, dim), appelé depuis le thread du batcher.
+    """
+
+    def __init__(self, encode, max_batch=QUERY_EMBEDDING_BATCH_MAX, max_wait_ms=QUERY_EMBEDDING_BATCH_WAIT_MS):
+        self.encode = encode
+        self.max_batch = max(max_batch, 1)
+        self.max_wait = max(max_wait_ms, 0) / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_batch_size = 0
+        # Observabilité (benchmarks, tests)
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str):
+        """
+        Vecteur (dim,) de text ; bloque l'appelant jusqu'à l'encode de son lot.
+        """
+        return self.submit(text).result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        wait = self.max_wait if self._last_batch_size > 1 else 0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                # Déjà en file : pris sans attendre, même délai écoulé
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._last_batch_size = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Même question plusieurs fois dans le lot : encodée une fois
+            positions = {}
+            for text, _ in batch:
+                positions.setdefault(text, len(positions))
+            try:
+                vectors = self.encode(list(positions))
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for text, future in batch:
+                future.set_result(vectors[positions[text]].copy())
@@ -0,0 +1,156 @@
+# backend/rag/embedding_cache.py
+"""
+Cache d'embeddings adressé par contenu : clé = sha256(modèle + texte).
+
+Le texte est haché tel qu'il est encodé : deux textes qui ne diffèrent que
+par les espaces donnent des vecteurs différents, donc des clés différentes.
+
+Stocké dans un fichier SQLite local, partagé entre les reconstructions,
+les visibilités (public / private) et les workers uvicorn.
+Éviction LRU quand le nombre d'entrées dépasse EMBEDDING_CACHE_MAX_ENTRIES ;
+le nombre d'entrées est tenu à jour en mémoire (COUNT(*) seulement à
+l'ouverture et au franchissement du seuil, les autres workers écrivant
+aussi dans le fichier).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "storage/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# SQLite limite le nombre de paramètres par requête
+_SQL_BATCH = 500
+
+# last_used n'est réécrit que s'il date de plus de TOUCH_INTERVAL secondes :
+# une lecture du cache n'entraîne pas une écriture à chaque fois.
+TOUCH_INTERVAL_SECONDS = 3600
+
+
+def cache_key(model_id: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_id}\0{text or ''}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._count = self._row_count()
+
+    def _row_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model_id: str, texts):
+        """
+        Retourne {position dans texts: vecteur} pour les textes déjà en cache.
+        """
+        keys = [cache_key(model_id, t) for t in texts]
+        found = {}
+        stale = []
+        now = time.time()
+        stale_before = now - TOUCH_INTERVAL_SECONDS
+
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = list(set(keys[start:start + _SQL_BATCH]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, vector, last_used in rows:
+                    found[key] = np.frombuffer(vector, dtype="float32")
+                    if last_used < stale_before:
+                        stale.append(key)
+
+            if stale:
+                for start in range(0, len(stale), _SQL_BATCH):
+                    batch = stale[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used=? WHERE key IN ({placeholders})",
+                        [now, *batch],
+                    )
+                self._conn.commit()
+
+        return {i: found[k] for i, k in enumerate(keys) if k in found}
+
+    def put_many(self, model_id: str, texts, vectors):
+        now = time.time()
+        rows = [
+            (cache_key(model_id, t), np.asarray(v, dtype="float32").tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            # Même clé = même texte et même modèle = même vecteur : rien à remplacer
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._count += max(cursor.rowcount, 0)
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._row_count()
+        self._count = count
+        if count <= self.max_entries:
+            return
+
+        # On redescend à 90 % pour ne pas évincer à chaque insertion
+        to_delete = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (to_delete,),
+        )
+        self._count = count - to_delete
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _cache, _cache_failed
+    if not EMBEDDING_CACHE_ENABLED or _cache_failed:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = EmbeddingCache()
+            except Exception as e:
+                _cache_failed = True
+                print(f"⚠️ Cache d'embeddings indisponible ({EMBEDDING_CACHE_PATH}): {e}")
+                return None
+    return _cache
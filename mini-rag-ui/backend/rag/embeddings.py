@@ -1,22 +1,31 @@
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import numpy as np
 
-_model = None
+from .embedding_batcher import QUERY_EMBEDDING_BATCHING, EmbeddingBatcher
+from .embedding_cache import get_embedding_cache, cache_key
+from .model_registry import model_id, get_model as get_registry_model
+from ..metrics import (
+    inc_embedding_cache_hits,
+    inc_embedding_cache_misses,
+    inc_query_embedding_cache_hits,
+    inc_query_embedding_cache_misses,
+)
 
-def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
-    return _model
+EMBEDDING_MODEL_ID = model_id()
 
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))  # 0 = désactivé
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "3600"))  # 0 = sans expiration
 
-def embed(texts):
-    """
-    texts : List[str]
-    """
-    if not texts or not isinstance(texts[0], str):
-        raise ValueError("embed() attend une liste de strings")
 
+def get_model():
+    return get_registry_model()
+
+
+def _encode(texts):
     model = get_model()
     embeddings = model.encode(
         texts,
@@ -26,5 +35,137 @@ def embed(texts):
     return embeddings.astype("float32")
 
 
+def embed(texts, use_cache=True):
+    """
+    texts : List[str]
+    Les vecteurs déjà calculés (même modèle, même texte)
+    sont lus depuis le cache au lieu d'être ré-encodés.
+    """
+    if not texts or not isinstance(texts[0], str):
+        raise ValueError("embed() attend une liste de strings")
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return _encode(texts)
+
+    cached = cache.get_many(EMBEDDING_MODEL_ID, texts)
+    inc_embedding_cache_hits(len(cached))
+    inc_embedding_cache_misses(len(texts) - len(cached))
+    if len(cached) == len(texts):
+        return np.vstack([cached[i] for i in range(len(texts))])
+
+    # Textes manquants, dédoublonnés (un même chunk peut apparaître plusieurs fois)
+    missing = {}
+    for i, t in enumerate(texts):
+        if i not in cached:
+            missing.setdefault(cache_key(EMBEDDING_MODEL_ID, t), []).append(i)
+
+    to_encode = [texts[positions[0]] for positions in missing.values()]
+    encoded = _encode(to_encode)
+    cache.put_many(EMBEDDING_MODEL_ID, to_encode, encoded)
+
+    result = np.empty((len(texts), encoded.shape[1]), dtype="float32")
+    for i, vector in cached.items():
+        result[i] = vector
+    for positions, vector in zip(missing.values(), encoded):
+        result[positions] = vector
+    return result
+
+
+class QueryVectorCache:
+    """
+    LRU en mémoire (modèle, question normalisée) -> vecteur, avec expiration.
+    Par worker : les questions répétées (FAQ visiteurs, messages renvoyés,
+    relances reformulées à l'identique) n'appellent plus le modèle.
+    """
+
+    def __init__(self, max_size=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._vectors.get(key)
+            if entry is None:
+                return None
+            vector, stored_at = entry
+            if self.ttl and self._clock() - stored_at > self.ttl:
+                del self._vectors[key]
+                return None
+            self._vectors.move_to_end(key)
+            return vector
+
+    def put(self, key, vector):
+        if self.max_size <= 0:
+            return
+        # Partagé entre requêtes : lecture seule
+        vector.setflags(write=False)
+        with self._lock:
+            self._vectors[key] = (vector, self._clock())
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+
+_query_vectors = QueryVectorCache()
+
+# Questions non cachées de requêtes simultanées : un encode par lot
+# (embed résolu à l'appel, comme pour les autres chemins)
+_query_batcher = EmbeddingBatcher(lambda texts: embed(texts, use_cache=False)) if QUERY_EMBEDDING_BATCHING else None
+
+
+def normalize_query(query: str) -> str:
+    # Espaces seulement : le texte normalisé est celui qui est encodé
+    return " ".join((query or "").split())
+
+
 def embed_query(query):
-    return embed([query])[0].reshape(1, -1)
+    # Les questions ne passent pas par le cache disque, seulement par le LRU en mémoire
+    query = normalize_query(query)
+    key = (EMBEDDING_MODEL_ID, query)
+    vector = _query_vectors.get(key)
+    if vector is not None:
+        inc_query_embedding_cache_hits()
+        return vector
+
+    inc_query_embedding_cache_misses()
+    if _query_batcher is not None:
+        vector = _query_batcher.embed(query).reshape(1, -1)
+    else:
+        vector = embed([query], use_cache=False)[0].reshape(1, -1)
+    _query_vectors.put(key, vector)
+    return vector
+
+
+def embed_queries(queries):
+    """
+    (n, dim) : les questions absentes du LRU sont encodées en un seul appel.
+    """
+    normalized = [normalize_query(q) for q in queries]
+    vectors = [None] * len(normalized)
+    missing = {}
+    for i, query in enumerate(normalized):
+        vector = _query_vectors.get((EMBEDDING_MODEL_ID, query))
+        if vector is None:
+            inc_query_embedding_cache_misses()
+            missing.setdefault(query, []).append(i)
+        else:
+            inc_query_embedding_cache_hits()
+            vectors[i] = vector[0]
+
+    if missing:
+        texts = list(missing)
+        for query, vector in zip(texts, embed(texts, use_cache=False)):
+            vector = vector.reshape(1, -1)
+            _query_vectors.put((EMBEDDING_MODEL_ID, query), vector)
+            for i in missing[query]:
+                vectors[i] = vector[0]
+
+    return np.vstack(vectors)
@@ -0,0 +1,256 @@
+# backend/rag/index_store.py
+"""
+Persistance de l'index FAISS + chunks sur disque.
+
+Un dossier par visibilité (public / private) contient :
+- index.faiss   : l'index vectoriel
+- chunks.*      : les chunks en colonnes (voir chunk_store.py), par id FAISS
+- lexical.*     : l'index BM25 des mêmes chunks (voir lexical.py)
+- manifest.json : empreintes des sources + modèle d'embedding + génération
+
+Au démarrage, l'index est rechargé puis seuls les fichiers ajoutés,
+modifiés ou supprimés depuis le dernier manifest sont (ré)indexés.
+
+La génération est incrémentée à chaque sauvegarde : un worker uvicorn dont
+la génération en mémoire diffère de celle du disque recharge l'artefact
+avant de le modifier ou de servir une requête.
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from .chunk_store import ChunkStore
+from .lexical import LexicalIndex
+from .loaders import SUPPORTED_EXTENSIONS
+from .vectorstore import TOMBSTONES_FILE, VectorStore
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-process
+    fcntl = None
+
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "storage/index")
+
+# À incrémenter dès que le chunking / la normalisation change :
+# les index persistés deviennent alors obsolètes.
+PIPELINE_VERSION = 3
+
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_fingerprint(texts) -> str:
+    h = hashlib.sha256()
+    for t in texts:
+        h.update((t or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_fingerprint(path: Path, previous=None):
+    """
+    Taille + mtime d'abord ; le hash n'est recalculé que si l'un des deux a changé.
+    """
+    stats = path.stat()
+    if (
+        previous
+        and previous.get("size") == stats.st_size
+        and previous.get("mtime_ns") == stats.st_mtime_ns
+        and previous.get("sha256")
+    ):
+        return dict(previous)
+
+    return {
+        "size": stats.st_size,
+        "mtime_ns": stats.st_mtime_ns,
+        "sha256": _sha256_file(path),
+    }
+
+
+def build_manifest(data_dir, db_texts, model_id: str, previous=None):
+    previous_files = (previous or {}).get("files", {})
+    files = {}
+
+    data_path = Path(data_dir)
+    if data_path.exists():
+        for p in sorted(data_path.iterdir(), key=lambda x: x.name):
+            if not is_indexable_file(p):
+                continue
+            files[p.name] = file_fingerprint(p, previous_files.get(p.name))
+
+    return {
+        "pipeline_version": PIPELINE_VERSION,
+        "embedding_model": model_id,
+        "files": files,
+        "db": text_fingerprint(db_texts),
+        "db_sources": [],
+    }
+
+
+def has_supported_extension(name: str) -> bool:
+    # Sensible à la casse, comme load_file : "a.TXT" n'est pas indexé
+    return name.endswith(SUPPORTED_EXTENSIONS)
+
+
+def is_indexable_file(path: Path) -> bool:
+    return path.is_file() and has_supported_extension(path.name) and path.stat().st_size > 0
+
+
+def manifest_compatible(saved, current) -> bool:
+    """
+    Un index sauvegardé n'est réutilisable que si le pipeline et le modèle
+    d'embedding n'ont pas changé (sinon les vecteurs ne sont pas comparables).
+    """
+    if not saved:
+        return False
+    return (
+        saved.get("pipeline_version") == current.get("pipeline_version")
+        and saved.get("embedding_model") == current.get("embedding_model")
+    )
+
+
+def diff_manifest(saved, current):
+    """
+    Retourne (fichiers supprimés, fichiers ajoutés/modifiés, db modifiée).
+    """
+    if not manifest_compatible(saved, current):
+        return [], sorted(current.get("files", {})), True
+
+    saved_files = saved.get("files", {})
+    current_files = current.get("files", {})
+
+    removed = sorted(name for name in saved_files if name not in current_files)
+    changed = sorted(
+        name
+        for name, fp in current_files.items()
+        if saved_files.get(name, {}).get("sha256") != fp.get("sha256")
+    )
+    db_changed = saved.get("db") != current.get("db")
+    return removed, changed, db_changed
+
+
+def read_manifest(index_dir):
+    path = Path(index_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Manifest illisible {path}: {e}")
+        return None
+
+
+def _atomic_write_bytes(path: Path, data: bytes):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def save_index(index_dir, store: VectorStore, manifest):
+    """
+    Réécrit l'artefact complet (index, chunks, BM25) : coût proportionnel au corpus,
+    y compris après l'ajout ou la suppression d'un seul fichier.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    index_bytes, chunk_files, n_chunks, next_id = store.export()
+    manifest = dict(manifest)
+    manifest["n_chunks"] = n_chunks
+    manifest["next_id"] = next_id
+    manifest["generation"] = manifest.get("generation", 0) + 1
+
+    # Le manifest est écrit en dernier : il "valide" l'index et les chunks.
+    if index_bytes is not None:
+        _atomic_write_bytes(index_dir / INDEX_FILE, index_bytes)
+    elif (index_dir / INDEX_FILE).exists():
+        (index_dir / INDEX_FILE).unlink()
+    for name, data in chunk_files.items():
+        _atomic_write_bytes(index_dir / name, data)
+    _atomic_write_bytes(
+        index_dir / MANIFEST_FILE,
+        json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+    )
+    return manifest
+
+
+def manifest_mtime_ns(index_dir):
+    """
+    Test bon marché (un stat) avant de relire le manifest pour comparer la génération.
+    """
+    try:
+        return (Path(index_dir) / MANIFEST_FILE).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_index(index_dir, manifest):
+    """
+    Retourne (store, manifest sauvegardé) si l'artefact est réutilisable
+    avec le pipeline / modèle courant, sinon None.
+    """
+    index_dir = Path(index_dir)
+    saved = read_manifest(index_dir)
+    if not manifest_compatible(saved, manifest):
+        return None
+
+    try:
+        index = None
+        if (index_dir / INDEX_FILE).exists():
+            index = faiss.read_index(str(index_dir / INDEX_FILE))
+        chunks = ChunkStore.load(index_dir)
+        tombstones = np.load(index_dir / TOMBSTONES_FILE) if (index_dir / TOMBSTONES_FILE).exists() else []
+        lexical = LexicalIndex.load(index_dir)
+    except Exception as e:
+        print(f"⚠️ Index persistant illisible dans {index_dir}: {e}")
+        return None
+
+    ntotal = index.ntotal if index is not None else 0
+    if ntotal - len(tombstones) != len(chunks) or saved.get("n_chunks") != len(chunks):
+        print(f"⚠️ Index persistant incohérent dans {index_dir}, reconstruction")
+        return None
+
+    if lexical is not None and len(lexical) != len(chunks):
+        print(f"⚠️ Index lexical incohérent dans {index_dir}, reconstruit depuis les chunks")
+        lexical = None
+
+    # lexical None (artefact antérieur) : reconstruit depuis les chunks, sans ré-embedding
+    store = VectorStore(index, chunks, next_id=saved.get("next_id", 0), tombstones=tombstones, lexical=lexical)
+    return store, saved
+
+
+@contextmanager
+def index_lock(index_dir):
+    """
+    Verrou inter-process : un seul worker uvicorn reconstruit l'index,
+    les autres attendent puis rechargent l'artefact à jour.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    if fcntl is None:
+        yield
+        return
+
+    with open(index_dir / LOCK_FILE, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,289 @@
+# backend/rag/lexical.py
+"""
+Index lexical BM25 en mémoire, tenu à jour avec l'index FAISS (mêmes ids).
+
+Les embeddings MiniLM retrouvent mal les identifiants exacts (nom de projet,
+d'entreprise, de fichier) : ce sont les termes rares que BM25 favorise.
+
+- tokenisation : minuscules, accents retirés ("équipe" = "equipe"),
+  mots vides français ignorés ;
+- postings en tableaux numpy : un segment trié par (terme, id) + les ajouts
+  récents, fusionnés dans le segment au-delà d'un seuil et avant sauvegarde ;
+- une suppression masque le document ; ses postings sont purgés à la fusion.
+"""
+import io
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from .chunk_store import _Column, _StringTable
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+LEXICAL_FILE = "lexical.npz"
+LEXICAL_TERMS_FILE = "lexical.terms.json"
+
+# Ajouts non fusionnés au-delà desquels le segment trié est reconstruit
+# (ou un quart du segment : fusions en coût amorti linéaire)
+_TAIL_MERGE_POSTINGS = 200_000
+_TF_MAX = np.iinfo(np.uint16).max
+
+# Formes sans accents (comparées après fold())
+FRENCH_STOPWORDS = frozenset("""
+    au aux avec ce ces cet cette dans de des du elle elles en est et etre eu il ils
+    je la le les leur leurs lui ma mais me meme mes moi mon ne nos notre nous on ou
+    par pas pour qu que qui sa se ses son sont sur ta te tes toi ton tu un une vos
+    votre vous ete etait sont ont avait fait comme plus tout tous toute toutes tres
+    aussi donc alors ainsi si ni car quel quelle quels quelles dont cela ca ceci
+    the and of to in is for on with
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_COMBINING_RE = re.compile(r"[\u0300-\u036f]+")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+
+def fold(text: str) -> str:
+    """
+    Minuscules sans accents : "Élève Cœur" -> "eleve coeur".
+    """
+    text = (text or "").lower().translate(_LIGATURES)
+    return _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text))
+
+
+def tokenize(text: str):
+    # "l'entreprise" -> "l", "entreprise" : les élisions d'une lettre tombent
+    return [t for t in _TOKEN_RE.findall(fold(text)) if (len(t) > 1 or t.isdigit()) and t not in FRENCH_STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    ids : ajoutés en ordre croissant (ceux de VectorStore), comme ChunkStore.
+    """
+
+    def __init__(self):
+        self.terms = _StringTable()
+        # Postings du terme t : [term_offsets[t], term_offsets[t + 1]), triés par id
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.post_ids = np.empty(0, dtype=np.int64)
+        self.post_tfs = np.empty(0, dtype=np.uint16)
+        # Ajouts depuis la dernière fusion, dans l'ordre des ids
+        self.tail_terms = _Column(np.int32)
+        self.tail_ids = _Column(np.int64)
+        self.tail_tfs = _Column(np.uint16)
+        # Documents : longueur en tokens, masqués à la suppression
+        self.doc_ids = _Column(np.int64)
+        self.doc_lens = _Column(np.int32)
+        self.alive = _Column(bool)
+        self.n_docs = 0
+        self.total_len = 0
+
+    def __len__(self):
+        return self.n_docs
+
+    @classmethod
+    def from_chunks(cls, items):
+        """
+        items : (id, texte) en ordre croissant d'id.
+        """
+        index = cls()
+        ids, texts = [], []
+        for chunk_id, text in items:
+            ids.append(chunk_id)
+            texts.append(text)
+        index.add(ids, texts)
+        index.merge()
+        return index
+
+    # =========================
+    # ÉCRITURE
+    # =========================
+    def add(self, ids, texts):
+        terms, post_ids, tfs, lengths = [], [], [], []
+        for chunk_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                terms.append(self.terms.code(term))
+                post_ids.append(chunk_id)
+                tfs.append(min(tf, _TF_MAX))
+
+        self.tail_terms.append(terms)
+        self.tail_ids.append(post_ids)
+        self.tail_tfs.append(tfs)
+        self.doc_ids.append(ids)
+        self.doc_lens.append(lengths)
+        self.alive.append(np.ones(len(lengths), dtype=bool))
+        self.n_docs += len(lengths)
+        self.total_len += sum(lengths)
+
+        if len(self.tail_ids) > max(_TAIL_MERGE_POSTINGS, len(self.post_ids) // 4):
+            self.merge()
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = self._doc_rows(ids)
+        found = rows < len(self.doc_ids)
+        rows, ids = rows[found], ids[found]
+        rows = rows[(self.doc_ids.view()[rows] == ids) & self.alive.view()[rows]]
+        self.alive.view()[rows] = False
+        self.n_docs -= len(rows)
+        self.total_len -= int(self.doc_lens.view()[rows].sum())
+
+    def merge(self):
+        """
+        Segment trié <- segment + ajouts récents, sans les documents supprimés.
+        Les ajouts ont des ids supérieurs à ceux du segment : un tri stable
+        par terme suffit à garder l'ordre (terme, id).
+        """
+        alive = self.alive.view()
+        if not len(self.tail_ids) and alive.all():
+            return
+
+        base_terms = np.repeat(np.arange(len(self.term_offsets) - 1, dtype=np.int32), np.diff(self.term_offsets))
+        terms = np.concatenate([base_terms, self.tail_terms.view()])
+        ids = np.concatenate([self.post_ids, self.tail_ids.view()])
+        tfs = np.concatenate([self.post_tfs, self.tail_tfs.view()])
+
+        live = alive[self._doc_rows(ids)]
+        terms, ids, tfs = terms[live], ids[live], tfs[live]
+        order = np.argsort(terms, kind="stable")
+        terms, ids, tfs = terms[order], ids[order], tfs[order]
+
+        # Les termes sans posting vivant sortent du vocabulaire
+        counts = np.bincount(terms, minlength=len(self.terms.values))
+        used = np.flatnonzero(counts)
+        self.terms = _StringTable(self.terms.values[code] for code in used)
+        self.term_offsets = np.concatenate([[0], np.cumsum(counts[used])]).astype(np.int64)
+        self.post_ids = ids
+        self.post_tfs = tfs
+
+        self.tail_terms = _Column(np.int32)
+        self.tail_ids = _Column(np.int64)
+        self.tail_tfs = _Column(np.uint16)
+        self.doc_ids = _Column(np.int64, self.doc_ids.view()[alive])
+        self.doc_lens = _Column(np.int32, self.doc_lens.view()[alive])
+        self.alive = _Column(bool, np.ones(self.n_docs, dtype=bool))
+
+    # =========================
+    # RECHERCHE
+    # =========================
+    def _doc_rows(self, ids):
+        return np.searchsorted(self.doc_ids.view(), ids)
+
+    def _postings(self, code: int):
+        ids, tfs = [], []
+        if code < len(self.term_offsets) - 1:
+            start, end = self.term_offsets[code], self.term_offsets[code + 1]
+            ids.append(self.post_ids[start:end])
+            tfs.append(self.post_tfs[start:end])
+        if len(self.tail_ids):
+            mask = self.tail_terms.view() == code
+            ids.append(self.tail_ids.view()[mask])
+            tfs.append(self.tail_tfs.view()[mask])
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16)
+        return np.concatenate(ids), np.concatenate(tfs)
+
+    def search(self, query: str, top_k=5, allowed=None):
+        """
+        [(id, score BM25), ...] par score décroissant. L'IDF est calculé sur
+        les documents vivants au moment de la requête (tout le corpus, même
+        si allowed restreint les ids renvoyés).
+        """
+        codes = {self.terms.codes[t] for t in tokenize(query) if t in self.terms.codes}
+        if not codes or not self.n_docs:
+            return []
+
+        avgdl = self.total_len / self.n_docs or 1.0
+        alive = self.alive.view()
+        doc_lens = self.doc_lens.view()
+
+        hit_ids, hit_scores = [], []
+        for code in codes:
+            ids, tfs = self._postings(code)
+            rows = self._doc_rows(ids)
+            live = alive[rows]
+            ids, tfs, rows = ids[live], tfs[live].astype(np.float32), rows[live]
+            if not len(ids):
+                continue
+
+            df = len(ids)
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            if allowed is not None:
+                keep = np.isin(ids, allowed)
+                ids, tfs, rows = ids[keep], tfs[keep], rows[keep]
+                if not len(ids):
+                    continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lens[rows] / avgdl)
+            hit_ids.append(ids)
+            hit_scores.append(idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+
+        if not hit_ids:
+            return []
+
+        ids, inverse = np.unique(np.concatenate(hit_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(hit_scores))
+        if len(ids) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(ids))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in best]
+
+    def memory_bytes(self) -> int:
+        arrays = (self.term_offsets, self.post_ids, self.post_tfs)
+        columns = (self.tail_terms, self.tail_ids, self.tail_tfs, self.doc_ids, self.doc_lens, self.alive)
+        return sum(a.nbytes for a in arrays) + sum(c.view().nbytes for c in columns)
+
+    # =========================
+    # PERSISTANCE
+    # =========================
+    def to_files(self):
+        self.merge()
+        arrays = io.BytesIO()
+        np.savez(
+            arrays,
+            term_offsets=self.term_offsets,
+            post_ids=self.post_ids,
+            post_tfs=self.post_tfs,
+            doc_ids=self.doc_ids.view(),
+            doc_lens=self.doc_lens.view(),
+        )
+        return {
+            LEXICAL_FILE: arrays.getvalue(),
+            LEXICAL_TERMS_FILE: json.dumps(self.terms.values, ensure_ascii=False).encode("utf-8"),
+        }
+
+    @classmethod
+    def load(cls, directory):
+        """
+        None si l'index n'a pas été sauvegardé (artefact antérieur).
+        """
+        directory = Path(directory)
+        if not (directory / LEXICAL_FILE).exists() or not (directory / LEXICAL_TERMS_FILE).exists():
+            return None
+
+        with open(directory / LEXICAL_TERMS_FILE, "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        with np.load(directory / LEXICAL_FILE) as arrays:
+            index = cls()
+            index.terms = _StringTable(terms)
+            index.term_offsets = arrays["term_offsets"]
+            index.post_ids = arrays["post_ids"]
+            index.post_tfs = arrays["post_tfs"]
+            index.doc_ids = _Column(np.int64, arrays["doc_ids"])
+            index.doc_lens = _Column(np.int32, arrays["doc_lens"])
+
+        if len(index.term_offsets) != len(terms) + 1:
+            raise ValueError("index lexical incohérent (vocabulaire / offsets)")
+        index.alive = _Column(bool, np.ones(len(index.doc_ids), dtype=bool))
+        index.n_docs = len(index.doc_ids)
+        index.total_len = int(index.doc_lens.view().sum())
+        return index
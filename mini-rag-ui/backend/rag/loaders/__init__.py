@@ -10,6 +10,7 @@ from .json_loader import load_json_as_chunks
 
 from .db_loader import load_db_jobs, load_db_projects
 
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".docx", ".csv", ".xls", ".xlsx", ".json")
 
 def load_file(path: str):
     if not os.path.exists(path) or os.path.getsize(path) == 0:
@@ -31,56 +32,32 @@ def load_file(path: str):
     return []
 
 
-def load_all_documents(data_dir: str):
-    documents = []
-
-    for file in os.listdir(data_dir):
-        path = os.path.join(data_dir, file)
-
-        if not os.path.isfile(path) or os.path.getsize(path) == 0:
-            continue
+def load_file_documents(path: str):
+    """
+    Documents d'un seul fichier (même format que load_all_documents).
+    """
+    file = os.path.basename(path)
+
+    if file.endswith(".txt"):
+        return [{"text": load_txt(path), "source": file, "type": "txt"}]
+    elif file.endswith(".pdf"):
+        return [{"text": load_pdf(path), "source": file, "type": "pdf"}]
+    elif file.endswith(".docx"):
+        return [{"text": load_docx(path), "source": file, "type": "docx"}]
+    elif file.endswith(".csv"):
+        return [{"text": load_csv(path), "source": file, "type": "csv"}]
+    elif file.endswith(".xls") or file.endswith(".xlsx"):
+        return load_excel_as_chunks(path)
+    elif file.endswith(".json"):
+        return load_json_as_chunks(path)
 
-        try:
-            if file.endswith(".txt"):
-                documents.append({
-                    "text": load_txt(path),
-                    "source": file,
-                    "type": "txt"
-                })
-
-            elif file.endswith(".pdf"):
-                documents.append({
-                    "text": load_pdf(path),
-                    "source": file,
-                    "type": "pdf"
-                })
-
-            elif file.endswith(".docx"):
-                documents.append({
-                    "text": load_docx(path),
-                    "source": file,
-                    "type": "docx"
-                })
-
-            elif file.endswith(".csv"):
-                documents.append({
-                    "text": load_csv(path),
-                    "source": file,
-                    "type": "csv"
-                })
-
-            elif file.endswith(".xls") or file.endswith(".xlsx"):
-                documents.extend(load_excel_as_chunks(path))
-
-            elif file.endswith(".json"):
-                documents.extend(load_json_as_chunks(path))
+    return []
 
 
-        except Exception as e:
-            print(f"[WARN] {file} ignoré : {e}")
+def load_db_documents(db_jobs=None, db_projects=None):
+    documents = []
 
-    # 🔹 Charger la base de données
-    db_texts = load_db_jobs()
+    db_texts = load_db_jobs() if db_jobs is None else db_jobs
     for i, t in enumerate(db_texts):
         documents.append({
             "text": t,
@@ -88,14 +65,34 @@ def load_all_documents(data_dir: str):
             "type": "db_job"
         })
 
-    db_projects = load_db_projects()
+    if db_projects is None:
+        db_projects = load_db_projects()
     for i, t in enumerate(db_projects):
         documents.append({
             "text": t,
             "source": f"db_project_{i+1}",
             "type": "db_project"
         })
+    return documents
+
+
+def load_all_documents(data_dir: str, db_jobs=None, db_projects=None):
+    """
+    db_jobs / db_projects : textes déjà lus depuis la DB (évite une seconde requête).
+    """
+    documents = []
+
+    for file in os.listdir(data_dir):
+        path = os.path.join(data_dir, file)
 
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            continue
 
+        try:
+            documents.extend(load_file_documents(path))
+        except Exception as e:
+            print(f"[WARN] {file} ignoré : {e}")
+
+    # 🔹 Charger la base de données
+    documents.extend(load_db_documents(db_jobs, db_projects))
     return documents
-    
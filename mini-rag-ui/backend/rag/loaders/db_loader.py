@@ -1,14 +1,14 @@
-import psycopg2
+import os
+
+from backend.database import connect
+
+# Offres et projets vivent dans la base JobMatchAI (mêmes serveur et identifiants)
+JOBS_DB_NAME = os.getenv("JOBS_DB_NAME", "jobmatchai_db")
+
 
 def load_db_jobs():
     try:
-        conn = psycopg2.connect(
-            host="localhost",
-            database="jobmatchai_db",
-            user="postgres",
-            password="postgres123",
-            options="-c client_encoding=UTF8"
-        )
+        conn = connect(database=JOBS_DB_NAME)
     except Exception as e:
         print(f"❌ Impossible de se connecter à la DB : {e}")
         return []
@@ -36,17 +36,9 @@ def load_db_jobs():
         print(f"❌ Erreur lecture DB : {e}")
         return []
 
-import psycopg2
-
 def load_db_projects():
     try:
-        conn = psycopg2.connect(
-            host="localhost",
-            database="jobmatchai_db",
-            user="postgres",
-            password="postgres123",
-            options="-c client_encoding=UTF8"
-        )
+        conn = connect(database=JOBS_DB_NAME)
     except Exception as e:
         print(f"❌ Impossible de se connecter à la DB : {e}")
         return []
@@ -0,0 +1,139 @@
+# backend/rag/model_registry.py
+"""
+Registre unique des modèles (SentenceTransformer, ...) du process.
+
+Une seule instance par (type, nom, device, précision) : l'indexation,
+embed_query et le reranker partagent le même modèle au lieu d'en
+charger chacun une copie.
+
+sentence_transformers (et torch) n'est importé qu'au premier chargement.
+"""
+import os
+import threading
+import time
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or None  # None : détection auto (cuda > mps > cpu)
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "fp32")  # fp32 | fp16 | bf16
+
+CROSS_ENCODER_MODEL_NAME = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+CROSS_ENCODER_MAX_LENGTH = int(os.getenv("CROSS_ENCODER_MAX_LENGTH", "256"))  # tokens (question + chunk)
+
+SUPPORTED_PRECISIONS = ("fp32", "fp16", "bf16")
+
+_models = {}
+_lock = threading.Lock()
+
+
+def model_id(name: str = EMBEDDING_MODEL_NAME, precision: str = EMBEDDING_PRECISION) -> str:
+    """
+    Identifiant des vecteurs produits (cache d'embeddings, manifest d'index) :
+    la précision change légèrement les vecteurs, le device non.
+    """
+    return name if precision == "fp32" else f"{name}@{precision}"
+
+
+def embedding_model_key():
+    return ("bi-encoder", EMBEDDING_MODEL_NAME, EMBEDDING_DEVICE, EMBEDDING_PRECISION)
+
+
+def _load(kind: str, name: str, device, precision: str):
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(f"Précision non supportée: {precision} ({', '.join(SUPPORTED_PRECISIONS)})")
+
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    if kind == "bi-encoder":
+        model = SentenceTransformer(name, device=device)
+        module = model
+    elif kind == "cross-encoder":
+        model = CrossEncoder(name, max_length=CROSS_ENCODER_MAX_LENGTH, device=device)
+        module = model.model
+    else:
+        raise ValueError(f"Type de modèle inconnu: {kind}")
+
+    if precision == "fp16":
+        module.half()
+    elif precision == "bf16":
+        import torch
+        module.to(torch.bfloat16)
+
+    return model
+
+
+def get_model(
+    name: str = EMBEDDING_MODEL_NAME,
+    device=EMBEDDING_DEVICE,
+    precision: str = EMBEDDING_PRECISION,
+    kind: str = "bi-encoder",
+):
+    # Clé stable quel que soit le device retenu par l'auto-détection
+    key = (kind, name, device or "auto", precision)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            start = time.perf_counter()
+            _models[key] = _load(kind, name, device, precision)
+            elapsed = time.perf_counter() - start
+            print(f"🧠 Modèle {name} ({kind}, {device or 'auto'}, {precision}) chargé en {elapsed:.1f}s")
+        return _models[key]
+
+
+def register_model(
+    model,
+    name: str = EMBEDDING_MODEL_NAME,
+    device=EMBEDDING_DEVICE,
+    precision: str = EMBEDDING_PRECISION,
+    kind: str = "bi-encoder",
+):
+    """
+    Enregistre un modèle déjà construit sous la clé de get_model (benchmarks
+    hors ligne : modèle de substitution sans sentence_transformers).
+    """
+    with _lock:
+        _models[(kind, name, device or "auto", precision)] = model
+    return model
+
+
+def warmup(keys=None):
+    """
+    Charge les modèles et exécute une première inférence (allocation mémoire,
+    init des kernels) pour que la première vraie requête ne paie pas ce coût.
+    keys : liste de (kind, name, device, precision) ; défaut = modèle d'embedding.
+    """
+    keys = keys or [embedding_model_key()]
+    for kind, name, device, precision in keys:
+        model = get_model(name, device=device, precision=precision, kind=kind)
+        if kind == "bi-encoder":
+            model.encode(["warmup"], convert_to_numpy=True)
+        elif kind == "cross-encoder":
+            model.predict([("warmup", "warmup")])
+
+    footprint = memory_footprint()
+    print(f"🧠 Modèles chargés : {len(footprint['models'])} ({footprint['total_bytes'] / 1024 ** 2:.1f} Mo)")
+    return footprint
+
+
+def _module_bytes(model) -> int:
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def memory_footprint():
+    """
+    Mémoire occupée par les poids (paramètres + buffers) de chaque modèle chargé.
+    """
+    models = {}
+    for (kind, name, device, precision), model in list(_models.items()):
+        models[f"{kind}:{name}:{device}:{precision}"] = _module_bytes(model)
+
+    return {"models": models, "total_bytes": sum(models.values())}
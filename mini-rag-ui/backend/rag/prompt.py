@@ -1,9 +1,9 @@
+def format_chunk(c):
+    return f"[{c.get('type', 'doc')} | {c.get('source', 'unknown')}]\n{c.get('text', '')}"
+
+
 def build_prompt(context_chunks, question):
-    context = "\n\n".join(
-        f"[{c.get('type', 'doc')} | {c.get('source', 'unknown')}]\n{c.get('text', '')}"
-        for c in context_chunks
-        if c.get("text")
-    )
+    context = "\n\n".join(format_chunk(c) for c in context_chunks if c.get("text"))
 
     return f"""
 Tu es un assistant IA d’entreprise.
@@ -1,18 +1,132 @@
-from sentence_transformers import util
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 
-def rerank(question, chunks, embedder):
-    texts = [c["text"] for c in chunks]
+import numpy as np
 
-    q_emb = embedder.encode(question, convert_to_tensor=True)
-    c_emb = embedder.encode(texts, convert_to_tensor=True)
+from .model_registry import (
+    CROSS_ENCODER_MODEL_NAME,
+    EMBEDDING_DEVICE,
+    EMBEDDING_PRECISION,
+    get_model,
+)
 
-    scores = util.cos_sim(q_emb, c_emb)[0]
+# none | bi-encoder | cross-encoder (choisi par déploiement)
+RERANK_MODE = os.getenv("RERANK_MODE", "bi-encoder").strip().lower()
+RERANK_MODES = ("none", "bi-encoder", "cross-encoder")
 
-    ranked = sorted(
-        zip(chunks, scores),
-        key=lambda x: x[1],
-        reverse=True
-    )
+CROSS_ENCODER_BATCH_SIZE = int(os.getenv("CROSS_ENCODER_BATCH_SIZE", "32"))
+RERANK_SCORE_CACHE_SIZE = int(os.getenv("RERANK_SCORE_CACHE_SIZE", "20000"))
+
+
+def cross_encoder_key():
+    return ("cross-encoder", CROSS_ENCODER_MODEL_NAME, EMBEDDING_DEVICE, EMBEDDING_PRECISION)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+class PairScoreCache:
+    """
+    LRU (hash question, id chunk) -> score cross-encoder.
+    L'id chunk est le hash de son texte : stable entre index public / privé
+    et entre reconstructions, contrairement aux ids FAISS.
+    """
+
+    def __init__(self, max_size=RERANK_SCORE_CACHE_SIZE):
+        self.max_size = max_size
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def put(self, key, score):
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+
+
+_pair_scores = PairScoreCache()
+
+
+def cross_encoder_scores(question, chunks):
+    """
+    Scores (question, chunk) en une seule passe batchée (tant que le nombre
+    de chunks <= CROSS_ENCODER_BATCH_SIZE) ; les paires déjà scorées sont lues
+    depuis le cache. Entrées tronquées à CROSS_ENCODER_MAX_LENGTH tokens.
+    """
+    q_hash = _digest(question)
+    keys = [(q_hash, _digest(c["text"])) for c in chunks]
+
+    scores = np.empty(len(chunks), dtype="float32")
+    missing = []
+    for i, key in enumerate(keys):
+        score = _pair_scores.get(key)
+        if score is None:
+            missing.append(i)
+        else:
+            scores[i] = score
+
+    if missing:
+        kind, name, device, precision = cross_encoder_key()
+        model = get_model(name, device=device, precision=precision, kind=kind)
+        pairs = [(question, chunks[i]["text"]) for i in missing]
+        predicted = model.predict(
+            pairs,
+            batch_size=min(CROSS_ENCODER_BATCH_SIZE, len(pairs)),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        for i, score in zip(missing, predicted):
+            scores[i] = float(score)
+            _pair_scores.put(keys[i], float(score))
+
+    return scores
+
+
+def rerank(question, chunks, embedder=None, mode=None):
+    """
+    Réordonne les chunks selon le mode :
+    - none          : ordre de la recherche vectorielle conservé
+    - bi-encoder    : similarité cosinus question / chunk. Les chunks issus de
+                      retrieve portent déjà leur score (cosinus, ou score fusionné
+                      dense + BM25 en mode hybrid) : simple tri, aucun ré-encodage,
+                      l'ordre est donc celui de la recherche ; le modèle n'est
+                      utilisé que pour des chunks sans score.
+    - cross-encoder : score (question, chunk) par un cross-encoder
+    """
+    mode = (mode or RERANK_MODE).strip().lower()
+    if mode not in RERANK_MODES:
+        raise ValueError(f"RERANK_MODE invalide: {mode} ({', '.join(RERANK_MODES)})")
+
+    if not chunks or mode == "none":
+        return list(chunks)
+
+    if mode == "cross-encoder":
+        scores = cross_encoder_scores(question, chunks)
+    elif all(isinstance(c.get("score"), float) for c in chunks):
+        scores = np.asarray([c["score"] for c in chunks], dtype="float32")
+    else:
+        embedder = embedder or get_model()
+        texts = [c["text"] for c in chunks]
+        query_vec = embedder.encode([question], convert_to_numpy=True, normalize_embeddings=True)
+        chunk_vecs = embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        scores = np.asarray(chunk_vecs, dtype="float32") @ np.asarray(query_vec, dtype="float32").reshape(-1)
+
+    order = np.argsort(-scores, kind="stable")
 
     # 🔑 On retourne UNIQUEMENT les chunks
-    return [chunk for chunk, score in ranked]
+    return [chunks[i] for i in order]
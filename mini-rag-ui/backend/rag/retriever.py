@@ -1,16 +1,80 @@
 # backend/rag/retriever.py
-from .embeddings import embed_query
+import os
 
-def retrieve(query, index, chunks, top_k=5):
-    q_vec = embed_query(query)
-    scores, indices = index.search(q_vec, top_k)
+from .embeddings import embed_queries, embed_query
+from ..tracing import span
 
-    results = []
-    for score, idx in zip(scores[0], indices[0]):
-        if idx < len(chunks):
-            results.append({
-                "text": chunks[idx],
-                "score": float(score)
-            })
+# dense : FAISS seul ; hybrid : FAISS + BM25 fusionnés par rang (RRF)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").strip().lower()
+RAG_RETRIEVAL_MODES = ("dense", "hybrid")
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "50"))
 
-    return results
+
+def reciprocal_rank_fusion(ranked_lists, top_k=5, k=RAG_RRF_K):
+    """
+    ranked_lists : {"dense": [...], "lexical": [...]} ; score = somme des
+    1 / (k + rang). Chaque résultat garde le score d'origine de chaque liste
+    ("dense_score", "lexical_score") ; "score" devient le score fusionné.
+    """
+    fused = {}
+    for name, results in ranked_lists.items():
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["id"])
+            if entry is None:
+                entry = fused[result["id"]] = {**result, "score": 0.0}
+            entry[f"{name}_score"] = result["score"]
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:top_k]
+
+
+def _resolve_mode(mode):
+    mode = (mode or RAG_RETRIEVAL_MODE).strip().lower()
+    if mode not in RAG_RETRIEVAL_MODES:
+        raise ValueError(f"RAG_RETRIEVAL_MODE invalide: {mode} ({', '.join(RAG_RETRIEVAL_MODES)})")
+    return mode
+
+
+def _fuse(query, dense, store, top_k, sources, types):
+    with span("lexical"):
+        lexical = store.search_lexical(query, max(top_k, RAG_HYBRID_CANDIDATES), sources=sources, types=types)
+        return reciprocal_rank_fusion({"dense": dense, "lexical": lexical}, top_k)
+
+
+def retrieve(query, store, top_k=5, mode=None, sources=None, types=None):
+    """
+    Retourne les top_k chunks les plus proches :
+    [{"id", "text", "type", "source", "score"}, ...]
+    En mode hybrid, les RAG_HYBRID_CANDIDATES premiers résultats dense et BM25
+    sont fusionnés : un identifiant exact ("jobmatchai") remonte même si
+    l'embedding le rapproche mal de la question.
+
+    Filtres appliqués dans la recherche : sources (noms de fichiers / db_job_N),
+    types ("db_job", "excel", ...) ; la visibilité est celle du store passé.
+    """
+    mode = _resolve_mode(mode)
+    with span("embed_query"):
+        q_vec = embed_query(query)
+    with span("search"):
+        if mode == "dense":
+            return store.search(q_vec, top_k, sources=sources, types=types)
+        dense = store.search(q_vec, max(top_k, RAG_HYBRID_CANDIDATES), sources=sources, types=types)
+    return _fuse(query, dense, store, top_k, sources, types)
+
+
+def retrieve_many(queries, store, top_k=5, mode=None, sources=None, types=None):
+    """
+    retrieve() pour plusieurs questions : un seul encode (hors questions en
+    cache) et une seule recherche FAISS multi-requêtes. BM25 reste par question.
+    """
+    if not queries:
+        return []
+
+    mode = _resolve_mode(mode)
+    with span("embed_query"):
+        q_vecs = embed_queries(queries)
+    with span("search"):
+        if mode == "dense":
+            return store.search_many(q_vecs, top_k, sources=sources, types=types)
+        dense = store.search_many(q_vecs, max(top_k, RAG_HYBRID_CANDIDATES), sources=sources, types=types)
+    return [_fuse(query, hits, store, top_k, sources, types) for query, hits in zip(queries, dense)]
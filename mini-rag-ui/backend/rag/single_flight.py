@@ -0,0 +1,89 @@
+# backend/rag/single_flight.py
+"""
+Regroupement des requêtes identiques en cours ("single flight").
+
+Quand un lien est partagé, des dizaines de visiteurs posent la même
+question à quelques secondes d'intervalle : seule la première déclenche
+récupération + appel LLM, les suivantes attendent son résultat (ou son
+erreur) tant qu'elle est en cours. Une fois terminée, la clé est libérée :
+ce n'est pas un cache (voir answer_cache.py pour la réutilisation).
+
+Le résultat partagé est un concurrent.futures.Future : un appelant
+synchrone (thread) et un appelant async peuvent attendre le même calcul.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from ..metrics import inc_coalesced_requests
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = set()  # références fortes : la boucle ne garde que des refs faibles
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._calls)
+
+    def _join(self, key):
+        """
+        (future, True) pour le premier appelant, qui doit calculer ;
+        (future du calcul en cours, False) pour les suivants.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                inc_coalesced_requests()
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _settle(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._settle(key, future, error=exc)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def ado(self, key, fn):
+        """
+        fn : fonction sans argument renvoyant une coroutine. Le calcul tourne
+        dans sa propre tâche : si le premier client se déconnecte, les
+        autres reçoivent quand même la réponse.
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self._tasks.add(task)
+
+            def settle(task):
+                self._tasks.discard(task)
+                if task.cancelled():
+                    self._settle(key, future, error=asyncio.CancelledError())
+                elif task.exception() is not None:
+                    self._settle(key, future, error=task.exception())
+                else:
+                    self._settle(key, future, task.result())
+
+            task.add_done_callback(settle)
+
+        # shield : l'annulation d'un appelant n'annule pas le Future partagé
+        return await asyncio.shield(asyncio.wrap_future(future))
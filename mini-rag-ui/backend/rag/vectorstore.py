@@ -1,7 +1,352 @@
+import io
+import math
+import os
+import threading
+from itertools import islice
+
 import faiss
+import numpy as np
+
+from .chunk_store import ChunkStore
+from .lexical import LexicalIndex
+
+# flat | hnsw | ivf | ivfpq | auto (flat sous RAG_ANN_MIN_VECTORS, hnsw au-delà)
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "auto").strip().lower()
+RAG_INDEX_TYPES = ("auto", "flat", "hnsw", "ivf", "ivfpq")
+RAG_ANN_MIN_VECTORS = int(os.getenv("RAG_ANN_MIN_VECTORS", "50000"))
+
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 : 4 * sqrt(n)
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "0"))  # sous-vecteurs PQ ; 0 : dim / 8
+
+# HNSW ne sait pas supprimer : les ids supprimés sont masqués à la recherche
+# puis l'index est reconstruit au-delà de cette proportion.
+TOMBSTONE_REBUILD_RATIO = 0.2
+TOMBSTONES_FILE = "tombstones.npy"
+
+# Recherche filtrée (sources / types) : jusqu'à ce nombre de chunks, seuls
+# leurs vecteurs sont relus et comparés (exact) ; au-delà, sélecteur d'ids
+# passé à la recherche FAISS
+RAG_FILTER_EXACT_MAX = int(os.getenv("RAG_FILTER_EXACT_MAX", "10000"))
+
+# Points d'entraînement minimum par centroïde (en dessous : index exact)
+_IVF_MIN_POINTS_PER_LIST = 39
+
+
+def resolve_index_type(n_vectors: int, index_type: str = None) -> str:
+    """
+    Type effectif pour n_vectors : "auto" choisit selon la taille du corpus,
+    un IVF sans assez de points pour l'entraînement reste exact.
+    """
+    index_type = (index_type or RAG_INDEX_TYPE).strip().lower()
+    if index_type not in RAG_INDEX_TYPES:
+        raise ValueError(f"RAG_INDEX_TYPE invalide: {index_type} ({', '.join(RAG_INDEX_TYPES)})")
+    if index_type == "auto":
+        return "hnsw" if n_vectors >= RAG_ANN_MIN_VECTORS else "flat"
+    if index_type in ("ivf", "ivfpq") and n_vectors < _IVF_MIN_POINTS_PER_LIST * 4:
+        return "flat"
+    return index_type
+
+
+def _ivf_nlist(n_vectors: int) -> int:
+    nlist = RAG_IVF_NLIST or int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // _IVF_MIN_POINTS_PER_LIST))
+
+
+def _pq_m(dim: int) -> int:
+    m = RAG_PQ_M or max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
 
-def build_index(embeddings):
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)  # cosine similarity
-    index.add(embeddings)
+
+def build_index(embeddings, ids=None, index_type="flat"):
+    """
+    flat  : recherche exhaustive exacte (cosine = produit scalaire de vecteurs normalisés)
+    hnsw  : graphe HNSW, pas d'entraînement ; efSearch réglable à la requête
+    ivf   : k-means en nlist listes (entraîné ici), nprobe listes visitées
+    ivfpq : idem + vecteurs compressés par quantification produit
+    Un IVF sans assez de points d'entraînement retombe sur flat.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n, dim = embeddings.shape
+
+    index_type = resolve_index_type(n, index_type)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, RAG_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = RAG_HNSW_EF_CONSTRUCTION
+    elif index_type in ("ivf", "ivfpq"):
+        nlist = _ivf_nlist(n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            # 8 bits par sous-vecteur = 256 centroïdes PQ, 4 bits si peu de points
+            nbits = 8 if n >= 256 * _IVF_MIN_POINTS_PER_LIST else 4
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), nbits, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        # Table id -> liste : reconstruct() (reconstruction de l'index par
+        # optimize()) tout en gardant remove_ids()
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        raise ValueError(f"Type d'index inconnu: {index_type}")
+
+    if ids is None:
+        index.add(embeddings)
+        return index
+
+    # Index à identifiants : permet remove_ids() par document. Un IVF stocke
+    # lui-même les ids dans ses listes (IDMap2 s'y désynchronise après remove_ids).
+    if index_type not in ("ivf", "ivfpq"):
+        index = faiss.IndexIDMap2(index)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
     return index
+
+
+def remove_ids(index, ids):
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    if isinstance(index, faiss.IndexIVF):
+        # La table directe en hashtable n'accepte que IDSelectorArray
+        return index.remove_ids(faiss.IDSelectorArray(len(ids), faiss.swig_ptr(ids)))
+    return index.remove_ids(ids)
+
+
+def index_type_of(index) -> str:
+    if index is None:
+        return "flat"
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def search_parameters(index_type: str, selector=None, ef_search=None, nprobe=None):
+    """
+    Paramètres appliqués à chaque recherche (pas figés dans l'index sauvegardé).
+    """
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search or RAG_HNSW_EF_SEARCH, sel=selector)
+    if index_type in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(nprobe=nprobe or RAG_IVF_NPROBE, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+class VectorStore:
+    """
+    Index FAISS à identifiants + chunks, regroupés par source (nom de fichier,
+    db_job_N, ...) pour pouvoir ajouter / supprimer / renommer un seul document
+    sans ré-embedder tout le corpus.
+
+    index_type : type demandé (RAG_INDEX_TYPE) ; optimize() reconstruit l'index
+    quand le type effectif change avec la taille du corpus.
+
+    Un index lexical BM25 (lexical.py) suit les mêmes ajouts / suppressions.
+    """
+
+    def __init__(self, index=None, chunks=None, next_id=0, tombstones=None, index_type=None, lexical=None):
+        self.index = index
+        self.chunks = chunks if chunks is not None else ChunkStore()
+        if lexical is None:
+            lexical = LexicalIndex.from_chunks(self.chunks.iter_texts())
+        self.lexical = lexical
+        self.next_id = next_id
+        self.index_type = index_type or RAG_INDEX_TYPE
+        self.tombstones = set(int(i) for i in (tombstones if tombstones is not None else ()))
+        self._kind = index_type_of(index)
+        self._selector = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def sources(self):
+        with self._lock:
+            return self.chunks.source_names()
+
+    def iter_chunks(self, limit=None):
+        with self._lock:
+            return list(islice(self.chunks.iter_chunks(), limit))
+
+    def add(self, chunks, embeddings):
+        if not chunks:
+            return []
+
+        with self._lock:
+            ids = list(range(self.next_id, self.next_id + len(chunks)))
+            self.next_id += len(chunks)
+
+            if self.index is None:
+                kind = resolve_index_type(len(ids), self.index_type)
+                self.index = build_index(embeddings, ids=ids, index_type=kind)
+                self._kind = index_type_of(self.index)
+            else:
+                self.index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+
+            self.chunks.add(ids, chunks)
+            self.lexical.add(ids, [c.get("text") or "" for c in chunks])
+            return ids
+
+    def count(self, source):
+        with self._lock:
+            return self.chunks.count(source)
+
+    def replace_source(self, source, chunks, embeddings):
+        """
+        Remplace les chunks d'une source en une seule opération : une recherche
+        concurrente voit l'ancienne ou la nouvelle version, jamais un mélange.
+        """
+        with self._lock:
+            self.remove_source(source)
+            return self.add(chunks, embeddings)
+
+    def remove_source(self, source):
+        with self._lock:
+            ids = self.chunks.remove_source(source)
+            if not len(ids):
+                return 0
+
+            self.lexical.remove(ids)
+            if self._kind == "hnsw":
+                self.tombstones.update(int(i) for i in ids)
+                self._selector = None
+            else:
+                remove_ids(self.index, ids)
+            return len(ids)
+
+    def rename_source(self, old_source, new_source):
+        """
+        Renommage = réécriture des métadonnées uniquement, les vecteurs sont conservés.
+        """
+        with self._lock:
+            return self.chunks.rename_source(old_source, new_source)
+
+    def optimize(self) -> bool:
+        """
+        Reconstruit l'index si le type effectif a changé (corpus passé sous /
+        au-dessus de RAG_ANN_MIN_VECTORS, RAG_INDEX_TYPE modifié) ou si trop
+        de vecteurs supprimés sont encore masqués. Les vecteurs sont relus dans
+        l'index (exacts pour flat / hnsw / ivf, approchés pour ivfpq).
+        Retourne True si l'index a été reconstruit.
+        """
+        with self._lock:
+            if self.index is None:
+                return False
+
+            target = resolve_index_type(len(self.chunks), self.index_type)
+            too_many_tombstones = len(self.tombstones) > TOMBSTONE_REBUILD_RATIO * max(self.index.ntotal, 1)
+            if target == self._kind and not too_many_tombstones:
+                return False
+
+            ids = self.chunks.ids.view()[self.chunks.alive.view()]
+            if not len(ids):
+                self.index, self._kind = None, "flat"
+            else:
+                vectors = self.index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+                self.index = build_index(vectors, ids=ids, index_type=target)
+                self._kind = index_type_of(self.index)
+            self.tombstones = set()
+            self._selector = None
+            print(f"🧭 Index reconstruit : {self._kind} ({len(ids)} vecteurs)")
+            return True
+
+    def _tombstone_selector(self):
+        if not self.tombstones:
+            return None
+        if self._selector is None:
+            batch = faiss.IDSelectorBatch(np.fromiter(self.tombstones, dtype="int64"))
+            # IDSelectorNot ne garde qu'un pointeur : on conserve aussi batch
+            self._selector = (faiss.IDSelectorNot(batch), batch)
+        return self._selector[0]
+
+    def export(self):
+        """
+        (index sérialisé ou None, fichiers des chunks + ids masqués + index
+        lexical, nombre de chunks, next_id) lus sous le même verrou, pour une
+        sauvegarde cohérente.
+        """
+        with self._lock:
+            index_bytes = faiss.serialize_index(self.index).tobytes() if self.index is not None else None
+            files = self.chunks.to_files()
+            tombstones = io.BytesIO()
+            np.save(tombstones, np.fromiter(sorted(self.tombstones), dtype="int64"))
+            files[TOMBSTONES_FILE] = tombstones.getvalue()
+            files.update(self.lexical.to_files())
+            return index_bytes, files, len(self.chunks), self.next_id
+
+    def _allowed_ids(self, sources=None, types=None):
+        if sources is None and types is None:
+            return None
+        return self.chunks.ids_matching(sources, types)
+
+    def _materialize(self, hits):
+        # Seuls les top_k résultats sont matérialisés en dicts
+        results = []
+        for chunk_id, score in hits:
+            chunk = self.chunks.get(int(chunk_id))
+            if chunk is not None:
+                results.append({**chunk, "id": int(chunk_id), "score": float(score)})
+        return results
+
+    def search(self, q_vec, top_k=5, sources=None, types=None):
+        """
+        sources / types : ne cherche que parmi les chunks de ces fichiers /
+        types (ex. ["db_job", "db_project"]), à l'intérieur de la recherche.
+        """
+        return self.search_many(q_vec, top_k, sources=sources, types=types)[0]
+
+    def search_many(self, q_vecs, top_k=5, sources=None, types=None):
+        """
+        Une seule recherche FAISS pour toutes les questions (une ligne de
+        q_vecs par question) ; une liste de résultats par question.
+        """
+        q_vecs = np.atleast_2d(np.asarray(q_vecs, dtype="float32"))
+        with self._lock:
+            if self.index is None or not len(self.chunks):
+                return [[] for _ in q_vecs]
+
+            allowed = self._allowed_ids(sources, types)
+            if allowed is None:
+                params = search_parameters(self._kind, self._tombstone_selector())
+            elif not len(allowed):
+                return [[] for _ in q_vecs]
+            elif len(allowed) <= RAG_FILTER_EXACT_MAX:
+                # Sous-ensemble réduit : produit scalaire sur ses seuls vecteurs
+                scores = q_vecs @ self.index.reconstruct_batch(allowed).T
+                best = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+                return [
+                    self._materialize(zip(allowed[rows], row_scores[rows]))
+                    for rows, row_scores in zip(best, scores)
+                ]
+            else:
+                batch = faiss.IDSelectorBatch(allowed)
+                params = search_parameters(self._kind, batch)
+
+            scores, ids = self.index.search(q_vecs, top_k, params=params)
+            return [
+                self._materialize((i, s) for i, s in zip(id_row, score_row) if i >= 0)
+                for id_row, score_row in zip(ids, scores)
+            ]
+
+    def search_lexical(self, query: str, top_k=5, sources=None, types=None):
+        """
+        Top_k chunks par score BM25 (mêmes dicts et filtres que search()).
+        """
+        with self._lock:
+            allowed = self._allowed_ids(sources, types)
+            if allowed is not None and not len(allowed):
+                return []
+            return self._materialize(self.lexical.search(query, top_k, allowed=allowed))
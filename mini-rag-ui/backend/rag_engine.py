@@ -1,43 +1,87 @@
+import asyncio
 import os
 import re
 from pathlib import Path
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 
-from .rag.loaders import load_all_documents, load_db_jobs, load_db_projects, load_file
+from .rag.loaders import load_db_documents, load_db_jobs, load_db_projects, load_file, load_file_documents
 from .rag.chunking import smart_chunk
-from .rag.embeddings import embed
-from .rag.vectorstore import build_index
-from .rag.retriever import retrieve
-from .rag.reranker import rerank
-from .rag.prompt import build_prompt
+from .rag.answer_cache import SemanticAnswerCache
+from .rag.single_flight import SingleFlight
+from .rag.embeddings import embed, embed_query, normalize_query, EMBEDDING_MODEL_ID
+from .rag.model_registry import embedding_model_key, warmup
+from .rag.vectorstore import VectorStore
+from .rag.index_store import (
+    INDEX_DIR,
+    build_manifest,
+    diff_manifest,
+    file_fingerprint,
+    has_supported_extension,
+    index_lock,
+    is_indexable_file,
+    load_index,
+    manifest_mtime_ns,
+    read_manifest,
+    save_index,
+)
+from .rag.retriever import retrieve, retrieve_many
+from .rag.reranker import RERANK_MODE, RERANK_MODES, cross_encoder_key, rerank
+from .rag.prompt import build_prompt, format_chunk
+from .rag.context_packer import pack_context
 from .rag.social import detect_social_intent, social_response, is_pure_social_message
-from .llm_client import create_response
+from .llm_client import acreate_response, astream_response, create_response, stream_response
+from .metrics import add_prompt_tokens, inc_answer_cache_hits, inc_answer_cache_misses
+from .tracing import span
 
 # =========================
 # ENV & CLIENT
 # =========================
 load_dotenv()
 
+class LLMCall:
+    """
+    Question préparée : réponse immédiate (answer) ou appel LLM à faire
+    (llm_input, temperature) puis finish(texte) -> réponse finale.
+    """
+
+    def __init__(self, answer=None, llm_input=None, temperature=0.1, finish=None):
+        self.answer = answer
+        self.llm_input = llm_input
+        self.temperature = temperature
+        self.finish = finish
+
+
 # =========================
 # RAG ENGINE SÛR
 # =========================
 class RAGEngine:
-    def __init__(self, public_dir="data/public", private_dir="data/private"):
+    def __init__(self, public_dir="data/public", private_dir="data/private", index_dir=INDEX_DIR, rerank_mode=RERANK_MODE):
         base_dir = Path(__file__).resolve().parents[1]
         self.public_dir = Path(public_dir)
         self.private_dir = Path(private_dir)
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
-        self.public_chunks = []
-        self.private_chunks = []
-        self.public_index = None
-        self.private_index = None
+        self.index_dir = Path(index_dir)
+        self.rerank_mode = (rerank_mode or "bi-encoder").strip().lower()
+        if self.rerank_mode not in RERANK_MODES:
+            raise ValueError(f"rerank_mode invalide: {self.rerank_mode} ({', '.join(RERANK_MODES)})")
+        self.public_store = VectorStore()
+        self.private_store = VectorStore()
+        self._manifests = {}
+        self._manifest_mtimes = {}
+        # Réponses /rag/visitor par question proche, valables pour une génération de l'index public
+        self.public_answers = SemanticAnswerCache()
+        # Questions identiques simultanées : un seul calcul (chemins sync et async)
+        self.inflight = SingleFlight()
 
         # Chargement des données
         self.load_public_data(public_dir)
         if os.path.exists(private_dir):
             self.load_private_data(private_dir)
 
+        warmup_keys = None
+        if self.rerank_mode == "cross-encoder":
+            warmup_keys = [embedding_model_key(), cross_encoder_key()]
+        warmup(warmup_keys)
+
     def _is_full_file_request(self, question: str) -> bool:
         q = (question or "").lower()
         markers = [
@@ -195,6 +239,156 @@ class RAGEngine:
 
         raise ValueError("visibility must be 'public' or 'private'")
 
+    def _data_dir(self, visibility: str) -> Path:
+        if visibility == "public":
+            return self.public_dir
+        if visibility == "private":
+            return self.private_dir
+        raise ValueError("visibility must be 'public' or 'private'")
+
+    def _store(self, visibility: str) -> VectorStore:
+        return self.public_store if visibility == "public" else self.private_store
+
+    # =========================
+    # INDEXATION PAR FICHIER
+    # =========================
+    def index_file(self, visibility: str, filename: str) -> int:
+        """
+        (Ré)indexe un seul fichier : seuls ses chunks sont embeddés.
+        """
+        data_dir = self._data_dir(visibility)
+        if visibility not in self._manifests:
+            self.refresh_data(visibility)
+            return self._store(visibility).count(filename)
+
+        path = data_dir / filename
+        chunks = self._file_chunks(path)
+        embeddings = embed([c["text"] for c in chunks]) if chunks else None
+
+        with index_lock(self.index_dir / visibility):
+            self._reload_if_stale(visibility)
+            self._store(visibility).replace_source(filename, chunks, embeddings)
+            self._record_file(visibility, path)
+            self._save(visibility)
+
+        print(f"➕ {filename} indexé ({len(chunks)} chunks)")
+        return len(chunks)
+
+    def remove_file(self, visibility: str, filename: str) -> int:
+        self._data_dir(visibility)
+        if visibility not in self._manifests:
+            self.refresh_data(visibility)
+            return 0
+
+        with index_lock(self.index_dir / visibility):
+            self._reload_if_stale(visibility)
+            removed = self._store(visibility).remove_source(filename)
+            self._manifests[visibility]["files"].pop(filename, None)
+            self._save(visibility)
+
+        print(f"➖ {filename} retiré de l'index ({removed} chunks)")
+        return removed
+
+    def rename_file(self, visibility: str, old_name: str, new_name: str) -> int:
+        """
+        Même extension (à la casse près) et indexable : seules les métadonnées
+        "source" sont réécrites. Sinon le fichier est ré-indexé : le loader
+        change, ou l'un des deux noms n'est pas indexable.
+        """
+        data_dir = self._data_dir(visibility)
+        if visibility not in self._manifests:
+            self.refresh_data(visibility)
+            return 0
+
+        same_loader = (
+            Path(old_name).suffix == Path(new_name).suffix
+            and has_supported_extension(old_name)
+            and has_supported_extension(new_name)
+        )
+        if not same_loader:
+            self.remove_file(visibility, old_name)
+            return self.index_file(visibility, new_name)
+
+        with index_lock(self.index_dir / visibility):
+            self._reload_if_stale(visibility)
+            renamed = self._store(visibility).rename_source(old_name, new_name)
+            files = self._manifests[visibility]["files"]
+            previous = files.pop(old_name, None)
+            new_path = data_dir / new_name
+            if is_indexable_file(new_path):
+                files[new_name] = file_fingerprint(new_path, previous)
+            self._save(visibility)
+
+        print(f"✏️ {old_name} → {new_name} ({renamed} chunks)")
+        return renamed
+
+    # =========================
+    # COHÉRENCE MULTI-WORKERS
+    # =========================
+    def _save(self, visibility: str):
+        """
+        À appeler sous index_lock : sauvegarde et retient la nouvelle génération.
+        """
+        index_dir = self.index_dir / visibility
+        store = self._store(visibility)
+        store.optimize()
+        self._manifests[visibility] = save_index(index_dir, store, self._manifests[visibility])
+        self._manifest_mtimes[visibility] = manifest_mtime_ns(index_dir)
+
+    def _reload_if_stale(self, visibility: str):
+        """
+        À appeler sous index_lock : si un autre worker a sauvegardé depuis
+        (génération différente), recharge son index avant de le modifier.
+        """
+        index_dir = self.index_dir / visibility
+        mtime = manifest_mtime_ns(index_dir)
+        saved = read_manifest(index_dir)
+        current = self._manifests.get(visibility)
+        if not saved or not current or saved.get("generation", 0) == current.get("generation", 0):
+            self._manifest_mtimes[visibility] = mtime
+            return
+
+        loaded = load_index(index_dir, current)
+        if loaded is None:
+            return
+
+        store, saved = loaded
+        if visibility == "public":
+            self.public_store = store
+        else:
+            self.private_store = store
+        self._manifests[visibility] = saved
+        self._manifest_mtimes[visibility] = mtime
+        print(f"🔄 Index {visibility} rechargé (génération {saved.get('generation')})")
+
+    def _ensure_fresh(self, visibility: str):
+        """
+        Avant de servir : un stat du manifest suffit tant qu'aucun autre
+        worker n'a écrit ; sinon rechargement sous verrou.
+        """
+        if visibility not in self._manifests:
+            return
+        if manifest_mtime_ns(self.index_dir / visibility) == self._manifest_mtimes.get(visibility):
+            return
+        with index_lock(self.index_dir / visibility):
+            self._reload_if_stale(visibility)
+
+    def _record_file(self, visibility: str, path: Path):
+        files = self._manifests[visibility]["files"]
+        if path.exists() and is_indexable_file(path):
+            files[path.name] = file_fingerprint(path, files.get(path.name))
+        else:
+            files.pop(path.name, None)
+
+    def _file_chunks(self, path: Path):
+        if not path.exists() or not is_indexable_file(path):
+            return []
+        try:
+            return self._process_documents(load_file_documents(str(path)))
+        except Exception as e:
+            print(f"[WARN] {path.name} ignoré : {e}")
+            return []
+
     def _get_files_context(self, file_names, max_chars_per_file: int = 12000) -> str:
         if not file_names:
             return ""
@@ -231,35 +425,15 @@ class RAGEngine:
         return "\n\n".join(blocks)
 
     # =========================
-    # PUBLIC
-    # =========================
-    def load_public_data(self, data_dir):
-        documents = load_all_documents(data_dir)
-        self.public_chunks = self._process_documents(documents)
-
-        if not self.public_chunks:
-            print("⚠️ Aucun chunk public trouvé")
-            return
-
-        texts = [c["text"] for c in self.public_chunks if c.get("text")]
-        embeddings = embed(texts)
-        self.public_index = build_index(embeddings)
-
-        print("🔎 EXEMPLE CHUNKS PUBLICS :")
-        for c in self.public_chunks[:5]:
-            print("-", c["text"][:120])
-
-        print(f"🌍 RAG PUBLIC prêt ({len(self.public_chunks)} chunks)")
-
-    # =========================
-    # PRIVATE
+    # INDEX PERSISTANT
     # =========================
-    def load_private_data(self, data_dir):
-        documents = load_all_documents(data_dir)
+    def _db_documents(self, visibility, db_jobs, db_projects):
+        documents = load_db_documents(db_jobs, db_projects)
+        if visibility != "private":
+            return documents
 
         # Jobs
-        db_texts = load_db_jobs()
-        for i, t in enumerate(db_texts):
+        for i, t in enumerate(db_jobs):
             documents.append({
                 "text": t,
                 "source": f"db_job_{i+1}",
@@ -268,7 +442,6 @@ class RAGEngine:
             })
 
         # 🔹 Projets
-        db_projects = load_db_projects()
         for i, t in enumerate(db_projects):
             documents.append({
                 "text": t,
@@ -276,17 +449,96 @@ class RAGEngine:
                 "type": "db_project",
                 "already_chunked": True
             })
-        self.private_chunks = self._process_documents(documents)
+        return documents
 
-        if not self.private_chunks:
-            print("⚠️ Aucun chunk privé trouvé")
+    def _embed_and_add(self, store, chunks):
+        if chunks:
+            store.add(chunks, embed([c["text"] for c in chunks]))
+
+    def _sync_index(self, visibility, data_dir):
+        """
+        Recharge l'index persisté puis ne (ré)indexe que les fichiers ajoutés /
+        modifiés, retire les fichiers supprimés et rafraîchit la DB si elle a changé.
+        Reconstruction complète si le modèle ou le pipeline a changé.
+        Retourne (store, manifest, fichiers modifiés, fichiers supprimés).
+        """
+        db_jobs = load_db_jobs()
+        db_projects = load_db_projects()
+        index_dir = self.index_dir / visibility
+
+        with index_lock(index_dir):
+            saved = read_manifest(index_dir)
+            manifest = build_manifest(data_dir, db_jobs + db_projects, EMBEDDING_MODEL_ID, previous=saved)
+            manifest["generation"] = (saved or {}).get("generation", 0)
+
+            loaded = load_index(index_dir, manifest)
+            if loaded:
+                store, saved = loaded
+            else:
+                store, saved = VectorStore(), None
+
+            removed, changed, db_changed = diff_manifest(saved, manifest)
+            manifest["db_sources"] = (saved or {}).get("db_sources", [])
+
+            for name in removed:
+                store.remove_source(name)
+
+            for name in changed:
+                store.remove_source(name)
+                self._embed_and_add(store, self._file_chunks(Path(data_dir) / name))
+
+            if db_changed:
+                for source in manifest["db_sources"]:
+                    store.remove_source(source)
+                db_chunks = self._process_documents(self._db_documents(visibility, db_jobs, db_projects))
+                self._embed_and_add(store, db_chunks)
+                manifest["db_sources"] = sorted({c["source"] for c in db_chunks})
+
+            optimized = store.optimize()
+            if not loaded or removed or changed or db_changed or optimized:
+                manifest = save_index(index_dir, store, manifest)
+            self._manifest_mtimes[visibility] = manifest_mtime_ns(index_dir)
+
+        return store, manifest, changed, removed
+
+    # =========================
+    # PUBLIC
+    # =========================
+    def load_public_data(self, data_dir):
+        store, manifest, changed, removed = self._sync_index("public", data_dir)
+        self.public_store = store
+        self._manifests["public"] = manifest
+
+        if not self.public_store:
+            print("⚠️ Aucun chunk public trouvé")
             return
 
-        texts = [c["text"] for c in self.private_chunks if c.get("text")]
-        embeddings = embed(texts)
-        self.private_index = build_index(embeddings)
+        if changed:
+            print("🔎 EXEMPLE CHUNKS PUBLICS :")
+            for c in self.public_store.iter_chunks(limit=5):
+                print("-", c["text"][:120])
+
+        print(
+            f"🌍 RAG PUBLIC prêt ({len(self.public_store)} chunks, "
+            f"{len(changed)} fichier(s) indexé(s), {len(removed)} retiré(s))"
+        )
+
+    # =========================
+    # PRIVATE
+    # =========================
+    def load_private_data(self, data_dir):
+        store, manifest, changed, removed = self._sync_index("private", data_dir)
+        self.private_store = store
+        self._manifests["private"] = manifest
+
+        if not self.private_store:
+            print("⚠️ Aucun chunk privé trouvé")
+            return
 
-        print(f"🔐 RAG PRIVÉ prêt ({len(self.private_chunks)} chunks)")
+        print(
+            f"🔐 RAG PRIVÉ prêt ({len(self.private_store)} chunks, "
+            f"{len(changed)} fichier(s) indexé(s), {len(removed)} retiré(s))"
+        )
 
     # =========================
     # PROCESS DOCUMENTS
@@ -320,34 +572,143 @@ class RAGEngine:
             return " ".join(str(v) for v in text).strip()
         return ""
 
+    # =========================
+    # RECHERCHE SEULE (SANS LLM)
+    # =========================
+    def search_many(self, queries, visibility="private", top_k=5, sources=None, types=None):
+        """
+        Chunks classés (texte, source, type, score) pour chaque question :
+        un seul encode et une seule recherche FAISS pour tout le lot.
+        """
+        self._data_dir(visibility)
+        self._ensure_fresh(visibility)
+        return retrieve_many(queries, self._store(visibility), top_k=top_k, sources=sources, types=types)
+
+    # =========================
+    # APPEL LLM (COMPLET OU EN STREAMING)
+    # =========================
+    # Chaque question est préparée en un LLMCall : soit une réponse
+    # immédiate (salutation, fichier intégral, rien trouvé), soit l'entrée
+    # du LLM + la finalisation de son texte (repli, mise en cache).
+    def _complete(self, call):
+        if call.answer is not None:
+            return call.answer
+        response = create_response(call.llm_input, temperature=call.temperature)
+        return call.finish(response.output_text.strip())
+
+    def _stream(self, call):
+        """
+        Fragments de réponse au fil de l'eau ; le texte complet (identique à
+        _complete) est dans call.answer une fois le générateur épuisé.
+        """
+        if call.answer is not None:
+            yield call.answer
+            return
+
+        parts = []
+        for delta in stream_response(call.llm_input, temperature=call.temperature):
+            parts.append(delta)
+            yield delta
+
+        text = "".join(parts).strip()
+        call.answer = call.finish(text)
+        if not text:
+            yield call.answer
+
+    # Chemin async (endpoints async) : la préparation (embedding, FAISS,
+    # BM25, rerank) reste synchrone et part dans un thread ; seule l'attente
+    # du LLM se fait sur la boucle, bornée par LLM_MAX_CONCURRENCY.
+    async def _acomplete(self, prepare, *args):
+        call = await asyncio.to_thread(prepare, *args)
+        if call.answer is not None:
+            return call.answer
+        response = await acreate_response(call.llm_input, temperature=call.temperature)
+        return call.finish(response.output_text.strip())
+
+    async def _astream(self, prepare, *args):
+        call = await asyncio.to_thread(prepare, *args)
+        if call.answer is not None:
+            yield call.answer
+            return
+
+        parts = []
+        async for delta in astream_response(call.llm_input, temperature=call.temperature):
+            parts.append(delta)
+            yield delta
+
+        text = "".join(parts).strip()
+        call.answer = call.finish(text)
+        if not text:
+            yield call.answer
+
     # =========================
     # ASK PUBLIC
     # =========================
+    def _flight_key(self, mode, visibility, question, file_names=None, history_user_questions=None):
+        """
+        Même clé = même réponse : question normalisée, fichiers ciblés,
+        dernière question de l'historique (seule utilisée pour recomposer
+        une question de suivi) et génération de l'index interrogé.
+        """
+        previous = (history_user_questions or [None])[-1]
+        version = self._manifests.get(visibility, {}).get("generation")
+        return (mode, normalize_query(question), tuple(file_names or ()), previous, version)
+
     def ask_public(self, question: str):
+        key = self._flight_key("public", "public", question)
+        return self.inflight.do(key, lambda: self._complete(self._prepare_public(question)))
+
+    def stream_public(self, question: str):
+        return self._stream(self._prepare_public(question))
+
+    async def aask_public(self, question: str):
+        key = self._flight_key("public", "public", question)
+        return await self.inflight.ado(key, lambda: self._acomplete(self._prepare_public, question))
+
+    def astream_public(self, question: str):
+        return self._astream(self._prepare_public, question)
+
+    def _prepare_public(self, question: str):
 
         intent = detect_social_intent(question)
         if is_pure_social_message(question, intent):
-            return social_response(intent)
-
-        if not self.public_chunks:
-            return "Je n'ai pas cette information 😔"
+            return LLMCall(answer=social_response(intent))
+
+        with span("ensure_fresh"):
+            self._ensure_fresh("public")
+        if not self.public_store:
+            return LLMCall(answer="Je n'ai pas cette information 😔")
+
+        # 🔹 Question proche déjà traitée sur cette version de l'index
+        with span("embed_query"):
+            q_vec = embed_query(question)
+        version = self._manifests.get("public", {}).get("generation")
+        with span("answer_cache"):
+            cached = self.public_answers.get(q_vec, version)
+        if cached is not None:
+            inc_answer_cache_hits()
+            return LLMCall(answer=cached)
+        inc_answer_cache_misses()
 
         # 🔹 Récupération via retriever
-        retrieved = retrieve(question, self.public_index, self.public_chunks, top_k=5)
+        retrieved = retrieve(question, self.public_store, top_k=5)
 
         # 🔹 Extraire uniquement les textes sûrs
-        texts = []
+        candidates = []
         for r in retrieved:
             if isinstance(r, dict):
                 t = r.get("text", "")
                 if isinstance(t, str) and t.strip():
-                    texts.append(t.strip())
+                    candidates.append(dict(r, text=t.strip()))
             elif isinstance(r, str) and r.strip():
-                texts.append(r.strip())
+                candidates.append({"text": r.strip()})
+
+        # 🔹 Si retriever ne trouve rien, fallback sur les chunks publics (dans le budget)
+        if not candidates:
+            candidates = [c for c in self.public_store.iter_chunks() if isinstance(c.get("text"), str)]
 
-        # 🔹 Si retriever ne trouve rien, fallback sur tous les chunks publics
-        if not texts:
-            texts = [c["text"] for c in self.public_chunks if isinstance(c.get("text"), str)]
+        with span("prompt"):
+            texts = [c["text"] for c in self._pack(candidates)]
 
         prompt = (
             "Tu es un assistant virtuel de l'entreprise SmartIA.\n"
@@ -358,19 +719,42 @@ class RAGEngine:
             + f"\n\nQUESTION : {question}\nRÉPONSE :"
         )
 
-        response = create_response(prompt, temperature=0.1)
-        return response.output_text.strip() or "Je n'ai pas cette information 😔"
+        def finish(text):
+            answer = text or "Je n'ai pas cette information 😔"
+            self.public_answers.put(q_vec, answer, version)
+            return answer
+
+        return LLMCall(llm_input=prompt, temperature=0.1, finish=finish)
 
     # =========================
     # ASK PRIVATE
     # =========================
     def ask(self, question: str, file_names=None, history_user_questions=None):
+        key = self._flight_key("rag", "private", question, file_names, history_user_questions)
+        return self.inflight.do(
+            key, lambda: self._complete(self._prepare_private(question, file_names, history_user_questions))
+        )
+
+    def stream_ask(self, question: str, file_names=None, history_user_questions=None):
+        return self._stream(self._prepare_private(question, file_names, history_user_questions))
+
+    async def aask(self, question: str, file_names=None, history_user_questions=None):
+        key = self._flight_key("rag", "private", question, file_names, history_user_questions)
+        return await self.inflight.ado(
+            key, lambda: self._acomplete(self._prepare_private, question, file_names, history_user_questions)
+        )
+
+    def astream_ask(self, question: str, file_names=None, history_user_questions=None):
+        return self._astream(self._prepare_private, question, file_names, history_user_questions)
 
-        question = self._contextualize_question(question, history_user_questions)
+    def _prepare_private(self, question: str, file_names=None, history_user_questions=None):
+
+        with span("contextualize"):
+            question = self._contextualize_question(question, history_user_questions)
 
         intent = detect_social_intent(question)
         if is_pure_social_message(question, intent):
-            return social_response(intent)
+            return LLMCall(answer=social_response(intent))
         
         if self._is_full_file_request(question):
             full_file_path = self._find_file_path(question)
@@ -385,40 +769,102 @@ class RAGEngine:
             if full_file_path:
                 full_text = self._load_full_file_text(full_file_path)
                 if full_text:
-                    return (
+                    return LLMCall(answer=(
                         f"Voici le contenu intégral de **{full_file_path.name}** :\n\n"
                         f"```text\n{full_text}\n```"
-                    )
-
-        if not self.private_chunks:
-            return "Je n'ai pas cette information 😔"
+                    ))
+
+        with span("ensure_fresh"):
+            self._ensure_fresh("private")
+        scoped = self._scoped_sources(file_names)
+        if scoped:
+            retrieved = self._retrieve_scoped(question, scoped, top_k=20)
+        elif self.private_store:
+            retrieved = retrieve(question, self.private_store, top_k=20)
+        else:
+            return LLMCall(answer="Je n'ai pas cette information 😔")
 
-        retrieved = retrieve(question, self.private_index, self.private_chunks, top_k=20)
         if not retrieved:
-            return "Je n'ai pas cette information 😔"
+            return LLMCall(answer="Je n'ai pas cette information 😔")
 
-        reranked = rerank(question, retrieved, self.embedder)
+        with span("rerank"):
+            reranked = rerank(question, retrieved, mode=self.rerank_mode)
         if not reranked:
-            return "Je n'ai pas cette information 😔"
+            return LLMCall(answer="Je n'ai pas cette information 😔")
 
         print("DEBUG chunk:", reranked[0])
 
-        prompt = build_prompt(reranked, question)
-        response = create_response(prompt, temperature=0.1)
-        return response.output_text.strip() or "Je n'ai pas cette information 😔"
-    
-    
+        with span("prompt"):
+            prompt = build_prompt(self._pack(reranked, render=format_chunk), question)
+        return LLMCall(
+            llm_input=prompt,
+            temperature=0.1,
+            finish=lambda text: text or "Je n'ai pas cette information 😔",
+        )
+
+    def _pack(self, chunks, render=lambda c: c["text"]):
+        """
+        Contexte du prompt réduit au budget CONTEXT_TOKEN_BUDGET (voir context_packer).
+        """
+        packed, stats = pack_context(chunks, render=render)
+        add_prompt_tokens(stats.tokens_before, stats.tokens_after)
+        print(f"📦 Contexte LLM : {stats}")
+        return packed
+
+    def _scoped_sources(self, file_names):
+        """
+        Fichiers joints à la question et présents dans un index :
+        {visibilité: [noms]}. Vide = recherche sur tout l'index privé.
+        """
+        names = {os.path.basename((n or "").strip()) for n in (file_names or []) if isinstance(n, str)}
+        names.discard("")
+        if not names:
+            return {}
+
+        self._ensure_fresh("public")
+        scoped = {}
+        for visibility in ("private", "public"):
+            store = self._store(visibility)
+            found = sorted(n for n in names if store.count(n))
+            if found:
+                scoped[visibility] = found
+        return scoped
+
+    def _retrieve_scoped(self, question, scoped, top_k=20):
+        """
+        Recherche limitée aux chunks des fichiers demandés (filtre dans
+        l'index) : moins de vecteurs parcourus, moins de contexte envoyé.
+        """
+        retrieved = []
+        for visibility, sources in scoped.items():
+            retrieved.extend(retrieve(question, self._store(visibility), top_k=top_k, sources=sources))
+        retrieved.sort(key=lambda r: r["score"], reverse=True)
+        return retrieved[:top_k]
 
     # =========================
     # ASK CHAT (LLM PUR)
     # =========================
     def ask_chat(self, question: str, file_names=None, history_user_questions=None):
-        question = self._contextualize_question(question, history_user_questions)
+        return self._complete(self._prepare_chat(question, file_names, history_user_questions))
+
+    def stream_chat(self, question: str, file_names=None, history_user_questions=None):
+        return self._stream(self._prepare_chat(question, file_names, history_user_questions))
+
+    async def aask_chat(self, question: str, file_names=None, history_user_questions=None):
+        return await self._acomplete(self._prepare_chat, question, file_names, history_user_questions)
+
+    def astream_chat(self, question: str, file_names=None, history_user_questions=None):
+        return self._astream(self._prepare_chat, question, file_names, history_user_questions)
+
+    def _prepare_chat(self, question: str, file_names=None, history_user_questions=None):
+        with span("contextualize"):
+            question = self._contextualize_question(question, history_user_questions)
         intent = detect_social_intent(question)
         if is_pure_social_message(question, intent):
-            return social_response(intent)
+            return LLMCall(answer=social_response(intent))
 
-        files_context = self._get_files_context(file_names or [])
+        with span("files_context"):
+            files_context = self._get_files_context(file_names or [])
 
         system_prompt = (
             "Tu es SmartIA Assistant, un assistant conversationnel général en français. "
@@ -436,9 +882,11 @@ class RAGEngine:
                 f"Contexte fichiers fournis:\n{files_context}"
             )
 
-        response = create_response([
+        return LLMCall(
+            llm_input=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content},
-            ], temperature=0.4)
-
-        return response.output_text.strip() or "Je n'ai pas pu générer de réponse pour le moment."
+            ],
+            temperature=0.4,
+            finish=lambda text: text or "Je n'ai pas pu générer de réponse pour le moment.",
+        )
@@ -0,0 +1,203 @@
+# backend/tracing.py
+"""
+Durée de chaque étape d'une requête (historique DB, recomposition de la
+question, embedding, FAISS, BM25, rerank, prompt, LLM...).
+
+Le middleware HTTP ouvre une RequestTrace par requête (contextvar) ; les
+étapes instrumentées y ajoutent leur durée via span() / @traced. Le
+contexte suit asyncio.to_thread, run_in_threadpool et les tâches créées
+pendant la requête ; hors requête (CLI, tests, thread du batcher),
+span() ne mesure rien.
+
+- SERVER_TIMING_ENABLED=1 : en-tête Server-Timing sur chaque réponse
+  (étapes terminées avant l'envoi des en-têtes : pour une réponse en
+  streaming, tout sauf la génération) ;
+- SLOW_REQUEST_MS : au-delà, le détail complet (streaming compris) est
+  écrit dans les logs. 0 = désactivé ;
+- chaque étape alimente aussi l'histogramme stage_duration_seconds de /metrics.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .metrics import observe_request
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") == "1"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "3000"))
+
+_current = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """
+    Étapes dans l'ordre de leur première fin : nom -> [durée totale ms, appels].
+    """
+
+    def __init__(self, name: str, clock=time.perf_counter):
+        self.name = name
+        self._clock = clock
+        self.started = clock()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += elapsed_ms
+            entry[1] += 1
+
+    def elapsed_ms(self) -> float:
+        return (self._clock() - self.started) * 1000
+
+    def breakdown(self):
+        with self._lock:
+            return {stage: {"ms": round(ms, 1), "count": count} for stage, (ms, count) in self.stages.items()}
+
+    def server_timing(self) -> str:
+        parts = [f"{stage};dur={d['ms']:.1f}" for stage, d in self.breakdown().items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        parts = [
+            f"{stage} {d['ms']:.0f} ms" + (f" x{d['count']}" if d["count"] > 1 else "")
+            for stage, d in self.breakdown().items()
+        ]
+        return f"{self.name} : {self.elapsed_ms():.0f} ms ({', '.join(parts) or 'aucune étape'})"
+
+
+def start_trace(name: str):
+    """
+    (trace, jeton) ; end_trace(jeton) rétablit le contexte précédent.
+    """
+    trace = RequestTrace(name)
+    return trace, _current.set(trace)
+
+
+def end_trace(token):
+    _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+def record(stage: str, elapsed_ms: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(stage, elapsed_ms)
+
+
+@contextmanager
+def span(stage: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, (time.perf_counter() - start) * 1000)
+
+
+def traced(stage: str):
+    """
+    Décorateur : toute la durée de la fonction compte pour stage ; pour un
+    générateur (sync ou async), jusqu'à son épuisement ou sa fermeture.
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def async_gen_wrapper(*args, **kwargs):
+                # aclose() explicite : un client déconnecté libère tout de suite
+                # les ressources du générateur (créneau LLM, connexion)
+                gen = fn(*args, **kwargs)
+                with span(stage):
+                    try:
+                        async for item in gen:
+                            yield item
+                    finally:
+                        await gen.aclose()
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                with span(stage):
+                    yield from fn(*args, **kwargs)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def log_if_slow(trace, threshold_ms=None):
+    threshold_ms = SLOW_REQUEST_MS if threshold_ms is None else threshold_ms
+    if threshold_ms > 0 and trace.elapsed_ms() >= threshold_ms:
+        print(f"🐢 Requête lente {trace.summary()}")
+
+
+def _route_label(request) -> str:
+    # Modèle de chemin (/conversations/{thread_id}/...) : cardinalité bornée
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def trace_requests(request, call_next):
+    """
+    Middleware HTTP : une trace par requête, puis à la fin du corps (flux
+    SSE compris) les métriques de la route et le log des requêtes lentes.
+    """
+    trace, token = None, None
+    if TRACING_ENABLED:
+        trace, token = start_trace(f"{request.method} {request.url.path}")
+        request.state.trace = trace
+    start = time.perf_counter()
+
+    def finish(status):
+        stages = trace.breakdown() if trace is not None else None
+        observe_request(request.method, _route_label(request), status, time.perf_counter() - start, stages)
+        if trace is not None:
+            log_if_slow(trace)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500)
+        raise
+    finally:
+        if token is not None:
+            end_trace(token)
+
+    if trace is not None and SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = trace.server_timing()
+
+    body = response.body_iterator
+
+    async def body_then_finish():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = body_then_finish()
+    return response
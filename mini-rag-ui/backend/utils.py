@@ -1,10 +1,14 @@
+import base64
 import re
+from datetime import datetime
 
 from fastapi import Depends, HTTPException
 
 from .database import get_db
 from .auth.security import get_current_user
+from .tracing import traced
 
+@traced("db.save_conversation")
 def save_conversation(user_id, question, answer, sources=None):
     with get_db() as conn:
         cur = conn.cursor()
@@ -19,6 +23,7 @@ def save_conversation(user_id, question, answer, sources=None):
         cur.close()
 
 
+@traced("db.get_history")
 def get_history(user_id, limit=5):
     with get_db() as conn:
         cur = conn.cursor()
@@ -38,6 +43,7 @@ def get_history(user_id, limit=5):
     return [{"question": q, "answer": a} for q, a in rows]
 
 
+@traced("db.get_all_conversations")
 def get_all_conversations(user=Depends(get_current_user)):
     if user["role"] != "admin":
         raise HTTPException(403, "Accès admin requis")
@@ -71,6 +77,7 @@ def _normalize_title(text: str, max_len: int = 60) -> str:
     return clean[:max_len] if clean else "Nouveau chat"
 
 
+@traced("db.create_thread")
 def create_thread(user_id: int, title: str = "Nouveau chat"):
     with get_db() as conn:
         cur = conn.cursor()
@@ -95,6 +102,7 @@ def create_thread(user_id: int, title: str = "Nouveau chat"):
     }
 
 
+@traced("db.list_threads")
 def list_threads(user_id: int, search: str = ""):
     with get_db() as conn:
         cur = conn.cursor()
@@ -133,36 +141,110 @@ def list_threads(user_id: int, search: str = ""):
     ]
 
 
-def get_thread_messages(user_id: int, thread_id: int):
+def _check_thread_owner(cur, user_id: int, thread_id: int):
+    cur.execute(
+        "SELECT id FROM chat_threads WHERE id=%s AND user_id=%s",
+        (thread_id, user_id),
+    )
+    if not cur.fetchone():
+        cur.close()
+        raise HTTPException(404, "Conversation introuvable")
+
+
+def encode_message_cursor(created_at, message_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_message_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, message_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Curseur invalide")
+
+
+@traced("db.get_thread_messages")
+def get_thread_messages_page(user_id: int, thread_id: int, limit: int = 100, before: str = None):
+    """
+    (messages, curseur) : les limit messages les plus récents avant le
+    curseur, du plus ancien au plus récent. Le curseur (None s'il ne reste
+    rien) donne la page précédente.
+
+    Pagination par clé (created_at, id) sur l'index
+    idx_messages_thread_created : même coût quelle que soit la longueur du
+    fil. id départage la question et la réponse, insérées avec le même NOW().
+    """
+    position = decode_message_cursor(before) if before else None
+
     with get_db() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id FROM chat_threads WHERE id=%s AND user_id=%s",
-            (thread_id, user_id),
-        )
-        owner = cur.fetchone()
-        if not owner:
-            cur.close()
-            raise HTTPException(404, "Conversation introuvable")
+        _check_thread_owner(cur, user_id, thread_id)
 
+        if position:
+            cur.execute(
+                """
+                SELECT id, role, content, created_at
+                FROM chat_messages
+                WHERE thread_id = %s AND (created_at, id) < (%s, %s)
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+                """,
+                (thread_id, position[0], position[1], limit + 1),
+            )
+        else:
+            cur.execute(
+                """
+                SELECT id, role, content, created_at
+                FROM chat_messages
+                WHERE thread_id = %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+                """,
+                (thread_id, limit + 1),
+            )
+        rows = cur.fetchall()
+        cur.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_message_cursor(rows[-1][3], rows[-1][0])
+
+    messages = [
+        {"id": r[0], "role": r[1], "content": r[2], "created_at": r[3]}
+        for r in reversed(rows)
+    ]
+    return messages, next_cursor
+
+
+@traced("db.get_recent_user_questions")
+def get_recent_user_questions(user_id: int, thread_id: int, limit: int = 3):
+    """
+    Les limit dernières questions de l'utilisateur dans le fil, de la plus
+    ancienne à la plus récente (history_user_questions du RAG).
+    """
+    with get_db() as conn:
+        cur = conn.cursor()
+        _check_thread_owner(cur, user_id, thread_id)
         cur.execute(
             """
-            SELECT id, role, content, created_at
+            SELECT content
             FROM chat_messages
-            WHERE thread_id = %s
-            ORDER BY created_at ASC
+            WHERE thread_id = %s AND role = 'user'
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
             """,
-            (thread_id,),
+            (thread_id, limit),
         )
         rows = cur.fetchall()
         cur.close()
 
-    return [
-        {"id": r[0], "role": r[1], "content": r[2], "created_at": r[3]}
-        for r in rows
-    ]
+    return [r[0] for r in reversed(rows)]
 
 
+@traced("db.rename_thread")
 def rename_thread(user_id: int, thread_id: int, title: str):
     new_title = _normalize_title(title, 120)
 
@@ -193,6 +275,7 @@ def rename_thread(user_id: int, thread_id: int, title: str):
     }
 
 
+@traced("db.delete_thread")
 def delete_thread(user_id: int, thread_id: int):
     with get_db() as conn:
         cur = conn.cursor()
@@ -209,6 +292,7 @@ def delete_thread(user_id: int, thread_id: int):
     return {"ok": True}
 
 
+@traced("db.append_message_and_answer")
 def append_message_and_answer(user_id: int, thread_id: int, question: str, answer: str):
     auto_title = _normalize_title(question)
 
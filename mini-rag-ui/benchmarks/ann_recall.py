@@ -0,0 +1,100 @@
+# benchmarks/ann_recall.py
+"""
+Recall@k et latence des index approchés (hnsw, ivf, ivfpq) face à l'index exact.
+
+Corpus synthétique "type embeddings" : vecteurs normalisés tirés autour de
+centres aléatoires ; les questions sont des points bruités hors corpus.
+La latence est mesurée requête par requête (une question = une recherche,
+comme dans l'API).
+
+    cd mini-rag-ui
+    python -m benchmarks.ann_recall --vectors 100000 --queries 500
+"""
+import argparse
+import statistics
+import time
+
+import faiss
+import numpy as np
+
+from backend.rag.vectorstore import build_index, search_parameters
+
+SWEEPS = {
+    "flat": [{}],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)],
+    "ivf": [{"nprobe": n} for n in (1, 4, 16, 64)],
+    "ivfpq": [{"nprobe": n} for n in (4, 16, 64)],
+}
+
+
+def clustered_vectors(n, dim, n_clusters, noise, rng):
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    labels = rng.integers(n_clusters, size=n)
+    vectors = centers[labels] + noise * rng.standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def run(index, index_type, queries, truth, k, params):
+    search_params = search_parameters(index_type, **params)
+    found = np.empty((len(queries), k), dtype="int64")
+    timings = []
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k, params=search_params)
+        timings.append((time.perf_counter() - start) * 1000)
+        found[i] = ids[0]
+    timings.sort()
+    return {
+        "recall": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.08)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default="flat,hnsw,ivf,ivfpq")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(args.seed)
+    data = clustered_vectors(args.vectors + args.queries, args.dim, args.clusters, args.noise, rng)
+    corpus, queries = data[:args.vectors], data[args.vectors:]
+    ids = np.arange(args.vectors, dtype="int64")
+
+    exact = build_index(corpus, ids=ids, index_type="flat")
+    _, truth = exact.search(queries, args.k)
+
+    print(f"corpus {args.vectors} x {args.dim}, {args.queries} requêtes, recall@{args.k}, {args.threads} thread(s)")
+    print(f"{'index':<8} {'réglage':<14} {'build_s':>8} {'Mo':>8} {'recall':>8} {'p50_ms':>8} {'p95_ms':>8}")
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = exact if index_type == "flat" else build_index(corpus, ids=ids, index_type=index_type)
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2 ** 20
+
+        for params in SWEEPS[index_type]:
+            result = run(index, index_type, queries, truth, args.k, params)
+            setting = ",".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(
+                f"{index_type:<8} {setting:<14} {build_s:>8.1f} {size_mb:>8.1f} "
+                f"{result['recall']:>8.4f} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
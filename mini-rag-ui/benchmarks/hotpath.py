@@ -0,0 +1,347 @@
+# benchmarks/hotpath.py
+"""
+Micro-benchmarks du chemin d'indexation et de recherche, étape par étape :
+
+    chunk        smart_chunk, latence par document
+    process      RAGEngine._process_documents, latence par document
+    embed        embed(use_cache=False), par lot de --batch-size chunks
+    build_index  vectorstore.build_index (FAISS seul)
+    store_add    VectorStore.add (FAISS + colonnes + BM25)
+    retrieve     retrieve() dense et hybrid, par question (embedding compris)
+    rerank       rerank() par mode sur les candidats de retrieve
+
+Pour chaque étape et chaque taille : débit (chunks/s à l'indexation,
+questions/s à la recherche), latences p50 / p95 / p99 (étapes
+répétées), pic mémoire Python + numpy (tracemalloc, passe séparée pour ne
+pas fausser les temps) et pic RSS du process. FAISS alloue hors de
+tracemalloc : son coût n'apparaît que dans le RSS.
+
+Corpus et questions synthétiques (benchmarks.synthetic). Par défaut le
+modèle d'embedding est le HashingEncoder local (hors ligne) ; --model real
+charge le modèle configuré (EMBEDDING_MODEL).
+
+    cd mini-rag-ui
+    python -m benchmarks.hotpath --sizes 1000 10000 100000 --json avant.json
+    python -m benchmarks.hotpath --sizes 1000 10000 100000 --json apres.json
+    python -m benchmarks.hotpath --compare avant.json apres.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import faiss
+import numpy as np
+
+# RAGEngine._process_documents n'appelle pas le LLM, mais llm_client exige une clé à l'import
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from backend.rag import embeddings as embeddings_module
+from backend.rag import reranker as reranker_module
+from backend.rag.chunking import smart_chunk
+from backend.rag.embeddings import embed
+from backend.rag.model_registry import (
+    CROSS_ENCODER_MODEL_NAME,
+    EMBEDDING_MODEL_NAME,
+    register_model,
+)
+from backend.rag.reranker import RERANK_MODES, cross_encoder_key, rerank
+from backend.rag.retriever import RAG_RETRIEVAL_MODES, retrieve
+from backend.rag.vectorstore import VectorStore, build_index, resolve_index_type
+from backend.rag_engine import RAGEngine
+
+from .synthetic import HashingEncoder, documents, questions
+
+STAGES = ("chunk", "process", "embed", "build_index", "store_add", "retrieve", "rerank")
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+def max_rss_mb():
+    # Linux : Ko ; macOS : octets
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def measure(stage, size, fn, items, unit, memory=True):
+    """
+    fn() -> (résultat, latences en ms par opération, ou [] pour une étape
+    en un seul appel). Une seconde passe sous tracemalloc donne le pic mémoire.
+    """
+    start = time.perf_counter()
+    result, latencies = fn()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    latencies = sorted(latencies)
+    row = {
+        "stage": stage,
+        "size": size,
+        "items": items,
+        "unit": unit,
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 1) if seconds else None,
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p95_ms": _round(percentile(latencies, 95)),
+        "p99_ms": _round(percentile(latencies, 99)),
+        "peak_mb": _round(peak_mb),
+        "rss_mb": round(max_rss_mb(), 1),
+    }
+    return result, row
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def per_item(fn, items):
+    def run():
+        results, latencies = [], []
+        for item in items:
+            start = time.perf_counter()
+            results.append(fn(item))
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results, latencies
+    return run
+
+
+def once(fn):
+    def run():
+        return fn(), []
+    return run
+
+
+# =========================
+# ÉTAPES
+# =========================
+def bench_size(size, args, stages, report):
+    docs = documents(size, seed=args.seed)
+    engine = RAGEngine.__new__(RAGEngine)  # _process_documents seul, sans chargement de données
+
+    results = {}
+    if "chunk" in stages:
+        _, row = measure("chunk", size, per_item(smart_chunk, docs), size, "chunks", args.memory)
+        report(row)
+    if "process" in stages or stages & {"embed", "build_index", "store_add", "retrieve", "rerank"}:
+        per_doc, row = measure("process", size, per_item(lambda d: engine._process_documents([d]), docs), size, "chunks", args.memory)
+        if "process" in stages:
+            report(row)
+        results["chunks"] = [c for doc_chunks in per_doc for c in doc_chunks]
+    del docs
+
+    chunks = results.get("chunks", [])
+    if not chunks:
+        return
+    texts = [c["text"] for c in chunks]
+
+    if stages & {"embed", "build_index", "store_add", "retrieve", "rerank"}:
+        batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+        batch_vectors, row = measure(
+            "embed", size, per_item(lambda b: embed(b, use_cache=False), batches), len(texts), "chunks", args.memory
+        )
+        if "embed" in stages:
+            report(row)
+        vectors = np.vstack(batch_vectors)
+        del batch_vectors, batches
+
+    ids = np.arange(len(chunks), dtype="int64")
+    index_type = resolve_index_type(len(chunks), args.index_type)
+    if "build_index" in stages:
+        _, row = measure(
+            "build_index", size, once(lambda: build_index(vectors, ids=ids, index_type=index_type)),
+            len(chunks), "chunks", args.memory,
+        )
+        row["index_type"] = index_type
+        report(row)
+
+    if not stages & {"store_add", "retrieve", "rerank"}:
+        return
+
+    def add():
+        store = VectorStore(index_type=args.index_type)
+        store.add(chunks, vectors)
+        return store
+
+    store, row = measure("store_add", size, once(add), len(chunks), "chunks", args.memory)
+    if "store_add" in stages:
+        row["index_type"] = index_type
+        report(row)
+    del vectors
+
+    qs = questions(args.queries, seed=args.seed)
+    candidates = None
+    for mode in RAG_RETRIEVAL_MODES:
+        if "retrieve" not in stages and mode != "hybrid":
+            continue
+        search = per_item(lambda q: retrieve(q, store, top_k=args.top_k, mode=mode), qs)
+
+        def fresh_search():
+            # Questions distinctes, LRU vidé à chaque passe : chaque question est encodée
+            embeddings_module._query_vectors.clear()
+            return search()
+
+        hits, row = measure(f"retrieve[{mode}]", size, fresh_search, len(qs), "queries", args.memory)
+        embeddings_module._query_vectors.clear()
+        if "retrieve" in stages:
+            report(row)
+        if mode == "hybrid":
+            candidates = list(zip(qs, hits))
+
+    if "rerank" not in stages:
+        return
+    for mode in args.rerank_modes:
+        try:
+            rerank(*candidates[0], mode=mode)
+        except Exception as e:
+            print(f"rerank[{mode}] indisponible : {e}", file=sys.stderr)
+            continue
+        score = per_item(lambda qc: rerank(qc[0], qc[1], mode=mode), candidates)
+
+        def fresh_scores():
+            # Paires jamais scorées : le cache cross-encoder est vidé à chaque passe
+            reranker_module._pair_scores.clear()
+            return score()
+
+        _, row = measure(f"rerank[{mode}]", size, fresh_scores, len(candidates), "queries", args.memory)
+        report(row)
+
+
+# =========================
+# RAPPORT
+# =========================
+COLUMNS = (
+    ("stage", "étape", "<21"), ("size", "chunks", ">9"), ("throughput", "débit/s", ">11"), ("unit", "unité", "<8"),
+    ("p50_ms", "p50 ms", ">9"), ("p95_ms", "p95 ms", ">9"), ("p99_ms", "p99 ms", ">9"),
+    ("seconds", "total s", ">9"), ("peak_mb", "pic Mo", ">8"), ("rss_mb", "RSS Mo", ">8"),
+)
+
+
+def _cell(value, fmt):
+    if value is None:
+        value = "-"
+    elif isinstance(value, float):
+        value = f"{value:.3f}" if value < 10 else f"{value:.1f}"
+    return f"{value:{fmt}}"
+
+
+def print_header():
+    print(" ".join(_cell(title, fmt) for _, title, fmt in COLUMNS))
+
+
+def print_row(row):
+    print(" ".join(_cell(row.get(key), fmt) for key, _, fmt in COLUMNS), flush=True)
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "faiss": getattr(faiss, "__version__", None),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "faiss_threads": faiss.omp_get_max_threads(),
+        "model": args.model,
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+    }
+
+
+def compare(before_path, after_path):
+    """
+    Débit et p95 d'un rapport JSON à l'autre, par (étape, taille).
+    """
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+
+    old = {(r["stage"], r["size"]): r for r in before["results"]}
+    print(f"{before['environment'].get('commit')} -> {after['environment'].get('commit')}")
+    print(f"{'étape':<21} {'chunks':>9} {'débit avant':>12} {'après':>12} {'x':>6} {'p95 avant':>10} {'après':>10}")
+    for row in after["results"]:
+        prev = old.get((row["stage"], row["size"]))
+        if prev is None:
+            continue
+        ratio = row["throughput"] / prev["throughput"] if prev.get("throughput") and row.get("throughput") else None
+        print(
+            f"{row['stage']:<21} {row['size']:>9} {_cell(prev['throughput'], '>12')} {_cell(row['throughput'], '>12')} "
+            f"{_cell(ratio, '>6')} {_cell(prev['p95_ms'], '>10')} {_cell(row['p95_ms'], '>10')}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="chunks (jusqu'à 1000000)")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--model", choices=("stand-in", "real"), default="stand-in")
+    parser.add_argument("--dim", type=int, default=384, help="dimension du modèle de substitution")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks par appel à embed")
+    parser.add_argument("--index-type", default=None, help="flat | hnsw | ivf | ivfpq | auto (défaut : RAG_INDEX_TYPE)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--rerank-modes", default=",".join(RERANK_MODES))
+    parser.add_argument("--threads", type=int, default=None, help="threads FAISS (défaut : tous)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="sans la passe tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="compare deux rapports JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    stages = set(args.stages.split(","))
+    unknown = stages - set(STAGES)
+    if unknown:
+        parser.error(f"étapes inconnues : {', '.join(sorted(unknown))}")
+    args.rerank_modes = args.rerank_modes.split(",")
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    if args.model == "stand-in":
+        encoder = HashingEncoder(args.dim)
+        register_model(encoder, EMBEDDING_MODEL_NAME)
+        _, _, device, precision = cross_encoder_key()
+        register_model(encoder, CROSS_ENCODER_MODEL_NAME, device=device, precision=precision, kind="cross-encoder")
+
+    results = []
+
+    def report(row):
+        results.append(row)
+        print_row(row)
+
+    print(f"modèle : {args.model}, {os.cpu_count()} CPU, {args.queries} questions, top_k {args.top_k}")
+    print_header()
+    for size in args.sizes:
+        bench_size(size, args, stages, report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"📄 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
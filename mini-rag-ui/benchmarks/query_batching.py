@@ -0,0 +1,83 @@
+# benchmarks/query_batching.py
+"""
+Débit d'embedding des questions sous charge : un encode par question
+face au micro-batching (EmbeddingBatcher), à concurrence égale.
+
+Chaque thread simule une requête API qui encode des questions distinctes
+(pas de cache). Nécessite le modèle réel (sentence-transformers).
+
+    cd mini-rag-ui
+    python -m benchmarks.query_batching --concurrency 1 8 32 --queries 512
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from backend.rag.embedding_batcher import EmbeddingBatcher
+from backend.rag.embeddings import _encode
+
+WORDS = (
+    "projet client données modèle recherche équipe développement analyse "
+    "contrat mission livrable budget planning réunion architecture api"
+).split()
+
+
+def questions(n):
+    return [f"Quel est le {WORDS[i % len(WORDS)]} du dossier {i} ?" for i in range(n)]
+
+
+def run(embed_one, texts, concurrency):
+    latencies = []
+    lock = threading.Lock()
+    chunks = [texts[i::concurrency] for i in range(concurrency)]
+
+    def worker(chunk):
+        local = []
+        for text in chunk:
+            start = time.perf_counter()
+            embed_one(text)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "qps": len(texts) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    _encode(["préchauffage"])
+    texts = questions(args.queries)
+
+    print(f"{'concurrence':>11} {'mode':>8} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'lot moy.':>8}")
+    for concurrency in args.concurrency:
+        single = run(lambda t: _encode([t])[0], texts, concurrency)
+        print(f"{concurrency:>11} {'unitaire':>8} {single['qps']:>8.0f} {single['p50']:>8.1f} {single['p95']:>8.1f} {1:>8.1f}")
+
+        batcher = EmbeddingBatcher(_encode, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        batched = run(batcher.embed, texts, concurrency)
+        mean_batch = batcher.items / max(batcher.batches, 1)
+        print(f"{concurrency:>11} {'lots':>8} {batched['qps']:>8.0f} {batched['p50']:>8.1f} {batched['p95']:>8.1f} {mean_batch:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
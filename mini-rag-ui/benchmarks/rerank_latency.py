@@ -0,0 +1,101 @@
+# benchmarks/rerank_latency.py
+"""
+Latence du reranking par mode (none | bi-encoder | cross-encoder) sur CPU.
+
+Corpus synthétique (vecteurs aléatoires normalisés) : seule l'étape
+recherche + rerank est mesurée, l'embedding de la question est exclu.
+
+    cd mini-rag-ui
+    python -m benchmarks.rerank_latency --chunks 5000 --top-k 20 --runs 50
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+from backend.rag.reranker import RERANK_MODES, rerank
+from backend.rag.vectorstore import VectorStore
+
+WORDS = (
+    "projet client données modèle recherche équipe développement analyse "
+    "contrat mission livrable budget planning réunion architecture api"
+).split()
+
+
+def synthetic_store(n_chunks, dim, rng):
+    vectors = rng.standard_normal((n_chunks, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [
+        {
+            "text": " ".join(rng.choice(WORDS, size=60)),
+            "type": "txt",
+            "source": f"doc_{i // 10}.txt",
+        }
+        for i in range(n_chunks)
+    ]
+    store = VectorStore()
+    store.add(chunks, vectors)
+    return store
+
+
+def rerank_once(store, mode, question, q_vec, top_k):
+    retrieved = store.search(q_vec, top_k)
+    return rerank(question, retrieved, mode=mode)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench_mode(store, mode, dim, runs, top_k, rng, repeat_question):
+    timings = []
+    for i in range(runs):
+        question = "question fixe" if repeat_question else f"question {i} {rng.integers(1_000_000)}"
+        q_vec = rng.standard_normal((1, dim)).astype("float32")
+        q_vec /= np.linalg.norm(q_vec)
+
+        start = time.perf_counter()
+        rerank_once(store, mode, question, q_vec, top_k)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--modes", default=",".join(RERANK_MODES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    store = synthetic_store(args.chunks, args.dim, rng)
+    print(f"corpus: {args.chunks} chunks, dim {args.dim}, top_k {args.top_k}, {args.runs} runs, {os.cpu_count()} CPU")
+
+    for mode in args.modes.split(","):
+        try:
+            # Premier appel hors mesure (chargement du modèle cross-encoder)
+            bench_mode(store, mode, args.dim, 1, args.top_k, rng, repeat_question=False)
+        except Exception as e:
+            print(f"{mode:<14} indisponible : {e}")
+            continue
+
+        cold = bench_mode(store, mode, args.dim, args.runs, args.top_k, rng, repeat_question=False)
+        print(f"{mode:<14} {cold}")
+        if mode == "cross-encoder":
+            warm = bench_mode(store, mode, args.dim, args.runs, args.top_k, rng, repeat_question=True)
+            print(f"{'  (cache)':<14} {warm}")
+
+
+if __name__ == "__main__":
+    main()
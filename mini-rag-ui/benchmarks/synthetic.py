@@ -0,0 +1,149 @@
+# benchmarks/synthetic.py
+"""
+Corpus français synthétique et modèle d'embedding de substitution.
+
+- documents(n_chunks) : documents .txt déterministes pour une graine donnée.
+  Chaque paragraphe fait entre 110 et 180 mots : smart_chunk (200 mots,
+  recouvrement 40) en tire exactement un chunk, le corpus fait donc n_chunks
+  chunks. Mots tirés selon une loi de Zipf (quelques mots très fréquents,
+  une longue traîne) + identifiants rares (clients, projets, références)
+  que BM25 retrouve et l'embedding dense moins bien.
+- questions(n) : questions mêlant vocabulaire courant et identifiants.
+- HashingEncoder : sac de mots haché en dim dimensions, normalisé. Même
+  interface que SentenceTransformer.encode / CrossEncoder.predict ; aucune
+  dépendance, aucun téléchargement. Mesure le coût du pipeline autour du
+  modèle, pas celui d'un vrai modèle.
+"""
+import zlib
+
+import numpy as np
+
+WORDS = (
+    "le la les un une des de du et en à au aux pour par sur dans avec sans sous entre "
+    "est sont a ont être avoir fait faire peut doit va cette ce ces son sa ses leur leurs "
+    "nous vous ils elle qui que dont où plus moins très aussi ainsi donc mais ou "
+    "projet client données modèle recherche équipe développement analyse contrat mission "
+    "livrable budget planning réunion architecture api sécurité qualité formation support "
+    "maintenance déploiement cloud tableau indicateur rapport recrutement compétence offre "
+    "entreprise service conseil audit migration application serveur base utilisateur "
+    "interface fonctionnalité version test recette production environnement incident "
+    "ticket demande besoin solution outil processus étape phase objectif résultat délai "
+    "coût facture devis commande partenaire fournisseur prestataire consultant chef "
+    "responsable directeur manager ingénieur développeur designer analyste stagiaire "
+    "semaine mois trimestre année jour date échéance calendrier sprint jalon "
+    "documentation spécification exigence contrainte risque priorité validation "
+    "performance latence disponibilité sauvegarde supervision journal alerte métrique "
+    "réseau stockage mémoire processeur conteneur cluster machine virtuelle licence "
+    "sécurisé rapide simple complet nouveau ancien principal important critique "
+    "français européen national régional local interne externe technique fonctionnel "
+    "mise place suivi gestion pilotage accompagnement évolution amélioration optimisation "
+    "intégration automatisation transformation numérique intelligence artificielle "
+    "apprentissage automatique traitement langage naturel vision calcul prédiction"
+).split()
+
+RARE_PREFIXES = ("client", "projet", "ref", "lot", "site")
+
+TEMPLATES = (
+    "Quel est le {a} du {rare} ?",
+    "Qui est {a} sur le {rare} ?",
+    "Quel {a} pour la {b} ?",
+    "Comment se passe la {a} de la {b} ?",
+    "Quelles sont les {a} du {b} pour le {rare} ?",
+    "Où en est la {a} du {rare} ?",
+)
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def rare_terms(n=5000):
+    return np.array([f"{RARE_PREFIXES[i % len(RARE_PREFIXES)]}{i:05d}" for i in range(n)])
+
+
+def documents(n_chunks, seed=0, max_paragraphs=8, rare_ratio=0.02, n_rare=5000):
+    """
+    Liste de {"text", "source", "type"} totalisant exactement n_chunks chunks.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS)
+    weights = _zipf_weights(len(words))
+    rare = rare_terms(n_rare)
+
+    docs = []
+    remaining = n_chunks
+    while remaining > 0:
+        n_paragraphs = min(int(rng.integers(1, max_paragraphs + 1)), remaining)
+        remaining -= n_paragraphs
+        paragraphs = []
+        for length in rng.integers(110, 181, size=n_paragraphs):
+            tokens = words[rng.choice(len(words), size=length, p=weights)]
+            mask = rng.random(length) < rare_ratio
+            tokens[mask] = rare[rng.integers(len(rare), size=int(mask.sum()))]
+            paragraphs.append(" ".join(tokens.tolist()).capitalize() + ".")
+        docs.append({"text": "\n".join(paragraphs), "source": f"doc_{len(docs):07d}.txt", "type": "txt"})
+    return docs
+
+
+def questions(n, seed=0, n_rare=5000):
+    rng = np.random.default_rng(seed + 1)
+    rare = rare_terms(n_rare)
+    content = WORDS[WORDS.index("projet"):]
+    return [
+        TEMPLATES[int(rng.integers(len(TEMPLATES)))].format(
+            a=content[int(rng.integers(len(content)))],
+            b=content[int(rng.integers(len(content)))],
+            rare=rare[int(rng.integers(len(rare)))],
+        )
+        for _ in range(n)
+    ]
+
+
+class HashingEncoder:
+    """
+    Modèle de substitution : chaque mot va dans un seau (crc32) avec un signe,
+    le vecteur est normalisé. Deux textes qui partagent des mots sont proches.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self._buckets = {}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _bucket(self, token):
+        entry = self._buckets.get(token)
+        if entry is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            entry = self._buckets[token] = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+        return entry
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True, batch_size=32, show_progress_bar=False):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                col, sign = self._bucket(token)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        flat = np.asarray(rows, dtype="int64") * self.dim + np.asarray(cols, dtype="int64")
+        vectors = np.bincount(flat, weights=signs, minlength=len(texts) * self.dim)
+        vectors = vectors.reshape(len(texts), self.dim).astype("float32")
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.maximum(norms, 1e-12)
+        return vectors[0] if single else vectors
+
+    def predict(self, pairs, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        pairs = list(pairs)
+        if not pairs:
+            return np.empty(0, dtype="float32")
+        left = self.encode([q for q, _ in pairs])
+        right = self.encode([t for _, t in pairs])
+        return np.einsum("ij,ij->i", left, right)
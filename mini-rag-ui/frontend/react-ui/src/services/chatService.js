@@ -63,12 +63,20 @@ export async function setThreadMode(threadId, mode) {
   return res.json();
 }
 
-export async function getMessages(threadId) {
-  const res = await fetch(`${API_BASE}/conversations/${threadId}/messages`, {
-    headers: headers(),
-  });
+// Page de messages (du plus ancien au plus récent) ; nextCursor charge la page précédente
+export async function getMessagesPage(threadId, { before, limit } = {}) {
+  const url = new URL(`${API_BASE}/conversations/${threadId}/messages`);
+  if (before) url.searchParams.set("before", before);
+  if (limit) url.searchParams.set("limit", limit);
+
+  const res = await fetch(url, { headers: headers() });
   if (!res.ok) throw new Error(await parseError(res, "Impossible de charger les messages"));
-  return res.json();
+  return { messages: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
+}
+
+export async function getMessages(threadId) {
+  const { messages } = await getMessagesPage(threadId);
+  return messages;
 }
 
 async function postMessage(url, question, fileNames = []) {
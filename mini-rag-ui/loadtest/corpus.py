@@ -0,0 +1,84 @@
+# loadtest/corpus.py
+"""
+Corpus et questions synthétiques (déterministes pour une graine donnée).
+
+Les documents mélangent vocabulaire courant et identifiants rares (noms de
+projets, de clients) : la recherche dense et BM25 ont chacune du travail.
+"""
+import random
+from pathlib import Path
+
+VOCABULARY = (
+    "projet client données modèle recherche équipe développement analyse contrat "
+    "mission livrable budget planning réunion architecture api sécurité qualité "
+    "formation support maintenance déploiement cloud tableau indicateur rapport "
+    "recrutement compétence offre entreprise service conseil audit migration"
+).split()
+
+PROJECTS = [f"Projet{name}" for name in (
+    "Atlas", "Boreal", "Cobalt", "Delta", "Ember", "Fjord", "Granit", "Helios",
+    "Iris", "Jade", "Krypton", "Lumen", "Mistral", "Nova", "Orion", "Pulsar",
+)]
+
+QUESTION_TEMPLATES = [
+    "Quel est le budget du {project} ?",
+    "Qui travaille sur le {project} ?",
+    "Quels sont les livrables du {project} ?",
+    "Quel est le planning de la {word} ?",
+    "Comment fonctionne le service de {word} ?",
+    "Quelles compétences pour la {word} ?",
+]
+
+PUBLIC_QUESTIONS = [
+    "Quels services proposez-vous ?",
+    "Comment vous contacter ?",
+    "Où se trouvent vos bureaux ?",
+    "Proposez-vous des formations ?",
+    "Quels sont vos tarifs ?",
+    "Travaillez-vous avec des PME ?",
+]
+
+
+def _paragraph(rng, n_words, project):
+    words = rng.choices(VOCABULARY, k=n_words)
+    words[rng.randrange(n_words)] = project
+    return " ".join(words).capitalize() + "."
+
+
+def write_corpus(directory, n_files, words_per_file, seed=0, prefix="doc"):
+    """
+    n_files fichiers .txt d'environ words_per_file mots, en paragraphes de 60 mots.
+    """
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(n_files):
+        project = PROJECTS[i % len(PROJECTS)]
+        paragraphs = [_paragraph(rng, 60, project) for _ in range(max(words_per_file // 60, 1))]
+        (directory / f"{prefix}_{i:04d}.txt").write_text("\n".join(paragraphs), encoding="utf-8")
+    return n_files
+
+
+def member_questions(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUESTION_TEMPLATES).format(project=rng.choice(PROJECTS), word=rng.choice(VOCABULARY))
+        for _ in range(n)
+    ]
+
+
+def visitor_questions(n, seed=0):
+    """
+    n questions publiques : formulations de base + variantes (ponctuation,
+    casse) comme celles d'un lien partagé.
+    """
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n):
+        q = rng.choice(PUBLIC_QUESTIONS)
+        if rng.random() < 0.3:
+            q = q.lower()
+        if rng.random() < 0.2:
+            q = q.rstrip(" ?") + " ?"
+        questions.append(q)
+    return questions
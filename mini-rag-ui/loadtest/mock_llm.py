@@ -0,0 +1,186 @@
+# loadtest/mock_llm.py
+"""
+Provider LLM local compatible OpenAI (Responses API) pour les tests de charge.
+
+Remplace OpenRouter via OPENROUTER_BASE_URL=http://127.0.0.1:<port>/v1 :
+POST /v1/responses, avec ou sans stream=True, comme llm_client.
+
+- latence avant le premier token (moyenne + dispersion gaussienne) ;
+- débit de génération en tokens/s (la réponse complète attend la fin) ;
+- taux d'erreurs 500, tirées avec une graine fixe.
+
+    cd mini-rag-ui
+    python -m loadtest.mock_llm --port 8900 --latency-ms 400 --tokens-per-second 80 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "SmartIA accompagne ses clients sur leurs projets de données avec une équipe "
+    "dédiée, un suivi régulier et des livrables documentés pour chaque mission"
+).split()
+
+
+class MockConfig:
+    def __init__(self, latency_ms=400.0, latency_jitter_ms=100.0, tokens_per_second=80.0, answer_tokens=120, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency_ms=float(os.getenv("MOCK_LLM_LATENCY_MS", "400")),
+            latency_jitter_ms=float(os.getenv("MOCK_LLM_LATENCY_JITTER_MS", "100")),
+            tokens_per_second=float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "80")),
+            answer_tokens=int(os.getenv("MOCK_LLM_ANSWER_TOKENS", "120")),
+            error_rate=float(os.getenv("MOCK_LLM_ERROR_RATE", "0")),
+            seed=int(os.getenv("MOCK_LLM_SEED", "0")),
+        )
+
+
+def _input_tokens(payload):
+    # Estimation (~4 caractères par token) : suffit pour l'usage renvoyé
+    return max(1, len(json.dumps(payload.get("input", ""), ensure_ascii=False)) // 4)
+
+
+def _response(response_id, model, text, status, input_tokens, output_tokens):
+    output = []
+    if text is not None:
+        output.append({
+            "type": "message",
+            "id": f"msg_{response_id}",
+            "status": status,
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        })
+    return {
+        "id": f"resp_{response_id}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": status,
+        "output": output,
+        "error": None,
+        "incomplete_details": None,
+        "instructions": None,
+        "metadata": {},
+        "parallel_tool_calls": True,
+        "temperature": None,
+        "tool_choice": "auto",
+        "tools": [],
+        "top_p": None,
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def create_app(config: MockConfig = None):
+    config = config or MockConfig.from_env()
+    rng = random.Random(config.seed)
+    app = FastAPI(title="mock-llm")
+    app.state.config = config
+    app.state.requests = 0
+    app.state.errors = 0
+
+    def first_token_delay():
+        return max(rng.gauss(config.latency_ms, config.latency_jitter_ms), 0.0) / 1000
+
+    def tokens():
+        return [WORDS[i % len(WORDS)] + " " for i in range(config.answer_tokens)]
+
+    @app.get("/health")
+    def health():
+        return {"requests": app.state.requests, "errors": app.state.errors}
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        payload = await request.json()
+        app.state.requests += 1
+        model = payload.get("model", "mock")
+        response_id = uuid.uuid4().hex[:12]
+        input_tokens = _input_tokens(payload)
+
+        await asyncio.sleep(first_token_delay())
+        if rng.random() < config.error_rate:
+            app.state.errors += 1
+            return JSONResponse({"error": {"message": "mock provider error", "type": "server_error"}}, status_code=500)
+
+        parts = tokens()
+        interval = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+        if not payload.get("stream"):
+            await asyncio.sleep(interval * len(parts))
+            return _response(response_id, model, "".join(parts).strip(), "completed", input_tokens, len(parts))
+
+        async def events():
+            sequence = 0
+            yield _sse({"type": "response.created", "sequence_number": sequence,
+                        "response": _response(response_id, model, None, "in_progress", input_tokens, 0)})
+            for part in parts:
+                sequence += 1
+                yield _sse({
+                    "type": "response.output_text.delta",
+                    "sequence_number": sequence,
+                    "item_id": f"msg_{response_id}",
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": part,
+                    "logprobs": [],
+                })
+                await asyncio.sleep(interval)
+            yield _sse({"type": "response.completed", "sequence_number": sequence + 1,
+                        "response": _response(response_id, model, "".join(parts).strip(), "completed", input_tokens, len(parts))})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider LLM local (OpenAI Responses API)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--latency-jitter-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-second", type=float, default=80)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# loadtest/report.py
+"""
+Agrégation des mesures : par endpoint, requêtes/s et latences p50/p95/p99.
+"""
+import json
+import math
+import time
+from collections import defaultdict
+
+
+def percentile(sorted_values, p):
+    """
+    Rang le plus proche sur des valeurs triées (p entre 0 et 100).
+    """
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    """
+    Une mesure par requête : endpoint, statut HTTP (0 = erreur réseau), durée,
+    et pour le streaming le délai du premier fragment. Les requêtes terminées
+    avant measure_from (échauffement) ne sont pas comptées.
+    """
+
+    def __init__(self, measure_from=None):
+        self.measure_from = measure_from
+        self.samples = defaultdict(list)
+        self.first_byte = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, status, elapsed_ms, ttfb_ms=None):
+        if self.measure_from is not None and time.monotonic() < self.measure_from:
+            return
+        if 200 <= status < 300:
+            self.samples[endpoint].append(elapsed_ms)
+            if ttfb_ms is not None:
+                self.first_byte[endpoint].append(ttfb_ms)
+        else:
+            self.errors[endpoint] += 1
+
+    def summary(self, duration_s):
+        rows = {}
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            latencies = sorted(self.samples[endpoint])
+            ok = len(latencies)
+            row = {
+                "requests": ok + self.errors[endpoint],
+                "errors": self.errors[endpoint],
+                "rps": round(ok / duration_s, 2) if duration_s else 0.0,
+                "p50_ms": round(percentile(latencies, 50), 1),
+                "p95_ms": round(percentile(latencies, 95), 1),
+                "p99_ms": round(percentile(latencies, 99), 1),
+                "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+            }
+            if self.first_byte[endpoint]:
+                ttfb = sorted(self.first_byte[endpoint])
+                row["ttfb_p50_ms"] = round(percentile(ttfb, 50), 1)
+                row["ttfb_p95_ms"] = round(percentile(ttfb, 95), 1)
+            rows[endpoint] = row
+        return rows
+
+
+def format_table(summary):
+    header = f"{'endpoint':<34} {'req':>6} {'err':>5} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'ttfb p50':>9}"
+    lines = [header, "-" * len(header)]
+    for endpoint, row in summary.items():
+        ttfb = f"{row['ttfb_p50_ms']:>9.1f}" if "ttfb_p50_ms" in row else f"{'-':>9}"
+        lines.append(
+            f"{endpoint:<34} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7.2f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {ttfb}"
+        )
+    return "\n".join(lines)
+
+
+def write_json(path, summary, config):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"config": config, "endpoints": summary}, f, ensure_ascii=False, indent=2)
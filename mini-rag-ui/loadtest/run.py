@@ -0,0 +1,249 @@
+# loadtest/run.py
+"""
+Test de charge de bout en bout.
+
+1. corpus synthétiques public / privé dans un dossier de travail ;
+2. provider LLM local (loadtest.mock_llm) branché via OPENROUTER_BASE_URL ;
+3. tables Postgres (bootstrap.py), membres inscrits via l'API, historique ;
+4. API lancée avec uvicorn (dossier de travail comme répertoire courant) ;
+5. trafic concurrent visiteurs + membres pendant --duration secondes,
+   après --warmup secondes non comptées ;
+6. rapport par endpoint : requêtes/s, p50 / p95 / p99 (et délai du premier
+   fragment pour les routes /stream).
+
+    cd mini-rag-ui
+    python -m loadtest.run --duration 60 --visitors 20 --members 10
+
+Postgres doit tourner en local (mêmes identifiants que l'API, voir seed.py).
+--members 0 : trafic visiteur seul, sans base. --api-url : cible une API
+déjà lancée (le provider et le corpus sont alors les siens).
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from .corpus import member_questions, visitor_questions, write_corpus
+from .report import Recorder, format_table, write_json
+from .seed import bootstrap_tables, login_members, seed_history
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_MIX = "rag=5,chat=2,search=2,rag-stream=1"
+
+
+def parse_mix(value: str):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("rag", "chat", "search", "rag-stream", "chat-stream"):
+            raise argparse.ArgumentTypeError(f"type de requête inconnu: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# =========================
+# PROCESSUS
+# =========================
+def start_process(cmd, env, cwd, log_path):
+    log = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(cmd, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url} : le processus s'est arrêté (code {process.returncode})")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} ne répond pas après {timeout}s")
+
+
+def stop(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# =========================
+# TRAFIC
+# =========================
+async def timed(client, recorder, label, path, payload, headers=None, stream=False):
+    start = time.perf_counter()
+    try:
+        if not stream:
+            response = await client.post(path, json=payload, headers=headers)
+            recorder.record(label, response.status_code, (time.perf_counter() - start) * 1000)
+            return response
+
+        first = None
+        async with client.stream("POST", path, json=payload, headers=headers) as response:
+            async for line in response.aiter_lines():
+                if first is None and line.startswith("data:"):
+                    first = (time.perf_counter() - start) * 1000
+                if line.startswith("event: error"):
+                    recorder.record(label, 0, 0)
+                    return response
+        recorder.record(label, response.status_code, (time.perf_counter() - start) * 1000, ttfb_ms=first)
+        return response
+    except httpx.HTTPError:
+        recorder.record(label, 0, (time.perf_counter() - start) * 1000)
+        return None
+
+
+async def think(rng, think_ms):
+    if think_ms > 0:
+        await asyncio.sleep(rng.expovariate(1000 / think_ms))
+
+
+async def visitor_loop(client, recorder, questions, stop_at, rng, think_ms, stream_ratio):
+    while time.monotonic() < stop_at:
+        question = {"question": rng.choice(questions)}
+        if rng.random() < stream_ratio:
+            await timed(client, recorder, "POST /rag/visitor/stream", "/rag/visitor/stream", question, stream=True)
+        else:
+            await timed(client, recorder, "POST /rag/visitor", "/rag/visitor", question)
+        await think(rng, think_ms)
+
+
+async def member_loop(client, recorder, token, thread_id, questions, stop_at, rng, think_ms, mix):
+    headers = {"Authorization": f"Bearer {token}"}
+    kinds, weights = list(mix), list(mix.values())
+    while time.monotonic() < stop_at:
+        kind = rng.choices(kinds, weights)[0]
+        question = rng.choice(questions)
+        if kind == "search":
+            await timed(client, recorder, "POST /search", "/search", {"query": question, "top_k": 5}, headers)
+        else:
+            mode, _, stream = kind.partition("-")
+            route = f"/conversations/{{id}}/messages/{mode}" + ("/stream" if stream else "")
+            path = route.replace("{id}", str(thread_id))
+            await timed(client, recorder, f"POST {route}", path, {"question": question}, headers, stream=bool(stream))
+        await think(rng, think_ms)
+
+
+async def drive(args, base_url):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.visitors + args.members + 8)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        members = []
+        questions_member = member_questions(500, seed=args.seed)
+        if args.members:
+            tokens = await login_members(client, args.members)
+            for token in tokens:
+                response = await client.post("/conversations", headers={"Authorization": f"Bearer {token}"})
+                response.raise_for_status()
+                members.append((token, response.json()["id"]))
+            seed_history([thread_id for _, thread_id in members], args.history, questions_member)
+        questions_visitor = visitor_questions(500, seed=args.seed)
+
+        measure_from = time.monotonic() + args.warmup
+        stop_at = measure_from + args.duration
+        recorder = Recorder(measure_from=measure_from)
+        tasks = [
+            visitor_loop(client, recorder, questions_visitor, stop_at, random.Random(rng.random()), args.think_ms, args.stream_ratio)
+            for _ in range(args.visitors)
+        ] + [
+            member_loop(client, recorder, token, thread_id, questions_member, stop_at, random.Random(rng.random()), args.think_ms, args.mix)
+            for token, thread_id in members
+        ]
+        await asyncio.gather(*tasks)
+        return recorder.summary(args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge Mini-RAG (provider LLM simulé)")
+    parser.add_argument("--duration", type=float, default=60, help="secondes mesurées")
+    parser.add_argument("--warmup", type=float, default=10, help="secondes non comptées")
+    parser.add_argument("--visitors", type=int, default=20, help="visiteurs simultanés")
+    parser.add_argument("--members", type=int, default=10, help="membres simultanés (0 = sans base)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"requêtes membres (défaut {DEFAULT_MIX})")
+    parser.add_argument("--stream-ratio", type=float, default=0.0, help="part des visiteurs en /rag/visitor/stream")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause moyenne entre deux requêtes d'un client")
+    parser.add_argument("--history", type=int, default=20, help="messages pré-remplis par fil membre")
+    parser.add_argument("--public-files", type=int, default=20)
+    parser.add_argument("--private-files", type=int, default=200)
+    parser.add_argument("--words-per-file", type=int, default=600)
+    parser.add_argument("--latency-ms", type=float, default=400, help="provider : délai du premier token")
+    parser.add_argument("--tokens-per-second", type=float, default=80, help="provider : débit de génération")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="provider : part d'erreurs 500")
+    parser.add_argument("--workers", type=int, default=1, help="workers uvicorn de l'API")
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--mock-port", type=int, default=8900)
+    parser.add_argument("--api-url", help="API déjà lancée (pas de corpus ni de provider lancés)")
+    parser.add_argument("--workdir", help="dossier de travail (défaut : temporaire)")
+    parser.add_argument("--startup-timeout", type=float, default=900, help="indexation initiale comprise")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        base_url = args.api_url
+        if not base_url:
+            workdir = Path(args.workdir or tempfile.mkdtemp(prefix="minirag-load-"))
+            write_corpus(workdir / "data" / "public", args.public_files, args.words_per_file, seed=args.seed, prefix="public")
+            write_corpus(workdir / "data" / "private", args.private_files, args.words_per_file, seed=args.seed + 1, prefix="private")
+            print(f"📁 Dossier de travail : {workdir}")
+
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.getenv("PYTHONPATH")])))
+            processes.append(start_process(
+                [sys.executable, "-m", "loadtest.mock_llm", "--port", str(args.mock_port),
+                 "--latency-ms", str(args.latency_ms), "--tokens-per-second", str(args.tokens_per_second),
+                 "--answer-tokens", str(args.answer_tokens), "--error-rate", str(args.error_rate),
+                 "--seed", str(args.seed)],
+                env, ROOT, workdir / "mock_llm.log",
+            ))
+            asyncio.run(wait_ready(f"http://127.0.0.1:{args.mock_port}/health", 30, processes[-1]))
+
+            if args.members:
+                bootstrap_tables()
+
+            api_env = dict(
+                env,
+                OPENROUTER_API_KEY="loadtest",
+                OPENROUTER_BASE_URL=f"http://127.0.0.1:{args.mock_port}/v1",
+                RAG_INDEX_DIR=str(workdir / "storage" / "index"),
+            )
+            api_env.setdefault("JWT_SECRET_KEY", "loadtest-secret")
+            processes.append(start_process(
+                [sys.executable, "-m", "uvicorn", "backend.api:app", "--host", "127.0.0.1",
+                 "--port", str(args.api_port), "--workers", str(args.workers), "--log-level", "warning"],
+                api_env, workdir, workdir / "api.log",
+            ))
+            base_url = f"http://127.0.0.1:{args.api_port}"
+            print("⏳ Démarrage de l'API (indexation du corpus)...")
+            asyncio.run(wait_ready(f"{base_url}/public/company-info", args.startup_timeout, processes[-1]))
+
+        print(f"🚀 {args.visitors} visiteur(s), {args.members} membre(s), {args.warmup:g}s d'échauffement + {args.duration:g}s mesurées")
+        summary = asyncio.run(drive(args, base_url))
+        print(format_table(summary))
+        if args.json:
+            config = {k: v for k, v in vars(args).items() if isinstance(v, (int, float, str, dict, type(None)))}
+            write_json(args.json, summary, config)
+    finally:
+        stop(processes)
+
+
+if __name__ == "__main__":
+    main()
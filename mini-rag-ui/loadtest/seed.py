@@ -0,0 +1,85 @@
+# loadtest/seed.py
+"""
+Base Postgres locale pour les tests de charge.
+
+- tables : backend/bootstrap.py (lancé comme script, sans importer l'API) ;
+- membres : créés et connectés via /auth/register + /auth/login de l'API
+  testée (même hachage, mêmes JWT qu'en production) ;
+- historique : messages insérés en SQL dans le fil de chaque membre, pour
+  que le chargement de l'historique pèse comme sur un compte réel.
+
+Connexion : mêmes variables que bootstrap.py (DATABASE_URL ou DB_HOST,
+DB_NAME, DB_USER, DB_PASSWORD), par défaut la base locale rag-db.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parents[1]
+
+MEMBER_PASSWORD = "loadtest-password"
+
+
+def db_config():
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "postgres123"),
+        "database": os.getenv("DB_NAME", "rag-db"),
+    }
+
+
+def bootstrap_tables():
+    subprocess.run(
+        [sys.executable, str(ROOT / "backend" / "bootstrap.py"), "--create-db", "--env", ""],
+        check=True,
+        cwd=ROOT,
+    )
+
+
+def member_email(i: int) -> str:
+    return f"loadtest-{i:04d}@example.com"
+
+
+async def login_members(client, n: int):
+    """
+    Tokens JWT de n membres ; les comptes déjà créés par un run précédent sont réutilisés.
+    """
+    tokens = []
+    for i in range(n):
+        credentials = {"email": member_email(i), "password": MEMBER_PASSWORD}
+        response = await client.post("/auth/register", json=credentials)
+        if response.status_code not in (200, 400):
+            response.raise_for_status()
+        response = await client.post("/auth/login", json=credentials)
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+def seed_history(thread_ids, n_messages: int, questions):
+    """
+    n_messages messages (question / réponse alternées) dans chaque fil.
+    """
+    if n_messages <= 0 or not thread_ids:
+        return
+    rows = []
+    for thread_id in thread_ids:
+        for i in range(n_messages):
+            role = "user" if i % 2 == 0 else "assistant"
+            content = questions[i % len(questions)] if role == "user" else "Réponse archivée du test de charge."
+            rows.append((thread_id, role, content))
+
+    cfg = db_config()
+    with psycopg2.connect(**cfg) as conn:
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO chat_messages (thread_id, role, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+        conn.commit()
+    conn.close()
@@ -0,0 +1,13 @@
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# backend/__init__.py démarre toute l'API à l'import (RAGEngine, DB, LLM) :
+# les tests chargent les sous-modules sans l'exécuter.
+if "backend" not in sys.modules:
+    backend = types.ModuleType("backend")
+    backend.__path__ = [str(ROOT / "backend")]
+    sys.modules["backend"] = backend
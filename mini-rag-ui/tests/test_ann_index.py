@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from backend.rag import vectorstore
+from backend.rag.index_store import load_index, save_index
+from backend.rag.vectorstore import VectorStore, build_index, index_type_of, resolve_index_type
+
+DIM = 16
+
+
+def unit_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def chunks_for(source, n):
+    return [{"text": f"{source} {i}", "type": "txt", "source": source} for i in range(n)]
+
+
+def manifest():
+    return {"pipeline_version": 3, "embedding_model": "m", "files": {}, "db": "", "db_sources": []}
+
+
+def test_resolve_index_type(monkeypatch):
+    monkeypatch.setattr(vectorstore, "RAG_ANN_MIN_VECTORS", 1000)
+    assert resolve_index_type(999, "auto") == "flat"
+    assert resolve_index_type(1000, "auto") == "hnsw"
+    assert resolve_index_type(10, "ivf") == "flat"  # pas assez de points pour entraîner
+    assert resolve_index_type(10_000, "ivfpq") == "ivfpq"
+    with pytest.raises(ValueError):
+        resolve_index_type(10, "lsh")
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf", "ivfpq"])
+def test_build_index_finds_exact_match(index_type):
+    vectors = unit_vectors(2000)
+    index = build_index(vectors, ids=np.arange(100, 2100), index_type=index_type)
+    assert index_type_of(index) == index_type
+
+    # ivfpq compresse les vecteurs : on vérifie seulement le top 10
+    k = 10 if index_type == "ivfpq" else 1
+    _, ids = index.search(vectors[:20], k, params=vectorstore.search_parameters(index_type))
+    hits = np.mean([query_id in row for query_id, row in zip(range(100, 120), ids)])
+    assert hits >= (0.8 if index_type == "ivfpq" else 1.0)
+
+
+def test_hnsw_removal_masks_then_rebuilds(tmp_path):
+    store = VectorStore(index_type="hnsw")
+    vectors_a = unit_vectors(50)
+    store.add(chunks_for("a.txt", 50), vectors_a)
+    store.add(chunks_for("b.txt", 200), unit_vectors(200, seed=1))
+
+    assert store.remove_source("a.txt") == 50
+    assert store.index.ntotal == 250  # HNSW ne supprime pas : ids masqués
+    assert all(r["source"] == "b.txt" for r in store.search(vectors_a[:1], 10))
+
+    # Les ids masqués sont sauvegardés avec l'index
+    save_index(tmp_path, store, manifest())
+    loaded, _ = load_index(tmp_path, manifest())
+    assert loaded.tombstones == store.tombstones
+    assert all(r["source"] == "b.txt" for r in loaded.search(vectors_a[:1], 10))
+
+    # 50 / 250 masqués = 20 % : pas encore de reconstruction
+    assert not store.optimize()
+    store.remove_source("b.txt")
+    store.add(chunks_for("c.txt", 10), unit_vectors(10, seed=2))
+    assert store.optimize()
+    assert store.index.ntotal == 10
+    assert not store.tombstones
+
+
+def test_optimize_switches_type_with_corpus_size(monkeypatch):
+    monkeypatch.setattr(vectorstore, "RAG_ANN_MIN_VECTORS", 300)
+    store = VectorStore(index_type="auto")
+    store.add(chunks_for("a.txt", 200), unit_vectors(200))
+    assert store._kind == "flat"
+    assert not store.optimize()
+
+    vectors_b = unit_vectors(200, seed=1)
+    store.add(chunks_for("b.txt", 200), vectors_b)
+    assert store.optimize()
+    assert store._kind == "hnsw"
+    assert store.search(vectors_b[:1], 1)[0]["source"] == "b.txt"
+
+
+def test_ivf_removal_and_rebuild_keep_ids_consistent():
+    vectors = unit_vectors(2000)
+    store = VectorStore(index_type="ivf")
+    store.add(chunks_for("a.txt", 500), vectors[:500])
+    store.add(chunks_for("b.txt", 1500), vectors[500:])
+    assert index_type_of(store.index) == "ivf"
+
+    store.remove_source("a.txt")
+    hits = store.search(vectors[1000:1001], 1)
+    assert hits[0]["id"] == 1000 and hits[0]["source"] == "b.txt"
+
+    # Reconstruction depuis les listes IVF (table directe)
+    store.index_type = "flat"
+    assert store.optimize()
+    assert index_type_of(store.index) == "flat"
+    assert store.search(vectors[1000:1001], 1)[0]["id"] == 1000
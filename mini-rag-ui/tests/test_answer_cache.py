@@ -0,0 +1,52 @@
+import numpy as np
+
+from backend.rag.answer_cache import SemanticAnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype="float32")
+    return vector / np.linalg.norm(vector)
+
+
+def test_close_question_reuses_answer():
+    cache = SemanticAnswerCache(threshold=0.95, max_size=10, ttl=0)
+    cache.put(unit(1, 0, 0), "Contact : contact@smartia.fr", version=1)
+
+    assert cache.get(unit(1, 0.1, 0), version=1) == "Contact : contact@smartia.fr"
+    assert cache.get(unit(1, 1, 0), version=1) is None  # cosinus 0.71
+
+
+def test_new_index_version_clears_and_stale_put_is_dropped():
+    cache = SemanticAnswerCache(threshold=0.95, max_size=10, ttl=0)
+    cache.put(unit(1, 0), "ancienne", version=1)
+
+    assert cache.get(unit(1, 0), version=2) is None
+    assert len(cache) == 0
+    # Réponse calculée sur l'ancien index, arrivée après le changement
+    cache.put(unit(1, 0), "ancienne", version=1)
+    assert cache.get(unit(1, 0), version=2) is None
+
+
+def test_ttl_and_lru_eviction():
+    clock = FakeClock()
+    cache = SemanticAnswerCache(threshold=0.99, max_size=2, ttl=100, clock=clock)
+    cache.put(unit(1, 0, 0), "a", version=1)
+    clock.now = 1
+    cache.put(unit(0, 1, 0), "b", version=1)
+    clock.now = 2
+    assert cache.get(unit(1, 0, 0), version=1) == "a"
+
+    cache.put(unit(0, 0, 1), "c", version=1)  # remplace "b", le moins récemment utilisé
+    assert cache.get(unit(0, 1, 0), version=1) is None
+    assert cache.get(unit(0, 0, 1), version=1) == "c"
+
+    clock.now = 200
+    assert cache.get(unit(1, 0, 0), version=1) is None
@@ -0,0 +1,29 @@
+import numpy as np
+
+from backend.rag import model_registry
+from backend.rag.chunking import smart_chunk
+from benchmarks.synthetic import HashingEncoder, documents, questions
+
+
+def test_synthetic_corpus_is_deterministic_and_sized_in_chunks():
+    docs = documents(300, seed=3)
+    assert docs == documents(300, seed=3)
+    assert sum(len(smart_chunk(d)) for d in docs) == 300
+    assert questions(5, seed=3) == questions(5, seed=3)
+
+
+def test_stand_in_encoder_is_normalized_and_lexical():
+    encoder = HashingEncoder(dim=64)
+    vectors = encoder.encode(["budget du projet atlas", "le budget du projet atlas", "réunion sécurité cloud"])
+    assert vectors.shape == (3, 64) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+    scores = encoder.predict([("budget atlas", "budget du projet atlas"), ("budget atlas", "réunion cloud")])
+    assert scores[0] > scores[1]
+
+
+def test_registered_model_is_returned_by_get_model():
+    encoder = HashingEncoder(dim=8)
+    model_registry.register_model(encoder, "stand-in-test", device="cpu", precision="fp32")
+    assert model_registry.get_model("stand-in-test", device="cpu", precision="fp32") is encoder
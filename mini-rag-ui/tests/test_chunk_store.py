@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from backend.rag import chunk_store
+from backend.rag.chunk_store import ChunkStore
+
+
+def chunks_for(source, n, type_="txt"):
+    return [{"text": f"{source} chunk {i} é", "type": type_, "source": source} for i in range(n)]
+
+
+def test_add_and_materialize():
+    store = ChunkStore()
+    store.add([0, 1], chunks_for("a.txt", 2))
+    store.add([5], chunks_for("b.csv", 1, type_="csv"))
+
+    assert len(store) == 3
+    assert store.get(5) == {"text": "b.csv chunk 0 é", "type": "csv", "source": "b.csv"}
+    assert store.get(2) is None
+    assert [c["source"] for c in store.iter_chunks()] == ["a.txt", "a.txt", "b.csv"]
+    assert store.source_names() == ["a.txt", "b.csv"]
+    assert store.sources.values == ["a.txt", "b.csv"]  # une seule copie par source
+
+
+def test_remove_source_returns_ids_and_hides_rows():
+    store = ChunkStore()
+    store.add([0, 1], chunks_for("a.txt", 2))
+    store.add([2], chunks_for("b.txt", 1))
+
+    np.testing.assert_array_equal(store.remove_source("a.txt"), [0, 1])
+    assert len(store.remove_source("a.txt")) == 0
+    assert store.get(0) is None
+    assert store.get(2)["source"] == "b.txt"
+    assert len(store) == 1
+
+
+def test_rename_source_in_table_or_merge():
+    store = ChunkStore()
+    store.add([0, 1], chunks_for("a.txt", 2))
+    store.add([2], chunks_for("b.txt", 1))
+
+    assert store.rename_source("a.txt", "c.txt") == 2
+    assert store.sources.values == ["c.txt", "b.txt"]
+    assert store.count("c.txt") == 2
+
+    assert store.rename_source("b.txt", "c.txt") == 1
+    assert store.count("c.txt") == 3
+    assert store.count("b.txt") == 0
+    assert store.get(2)["source"] == "c.txt"
+
+
+def test_compact_keeps_live_rows():
+    store = ChunkStore()
+    for i, source in enumerate(["a.txt", "b.txt", "c.txt", "d.txt"]):
+        store.add([3 * i, 3 * i + 1, 3 * i + 2], chunks_for(source, 3))
+    store.remove_source("b.txt")
+    store.remove_source("d.txt")
+
+    store.compact()
+    assert len(store.ids) == 6
+    assert store.sources.values == ["a.txt", "c.txt"]
+    assert store.get(7) == {"text": "c.txt chunk 1 é", "type": "txt", "source": "c.txt"}
+    assert [c["text"] for c in store.iter_chunks()][-1] == "c.txt chunk 2 é"
+
+
+def write_files(directory, files):
+    for name, data in files.items():
+        (directory / name).write_bytes(data)
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    store = ChunkStore()
+    store.add([0, 1, 2], chunks_for("a.txt", 3))
+    store.add([3], chunks_for("b.txt", 1))
+    store.remove_source("a.txt")
+    write_files(tmp_path, store.to_files(compression="none"))
+
+    loaded = ChunkStore.load(tmp_path)
+    assert len(loaded) == 1
+    assert loaded.get(3)["source"] == "b.txt"
+    if chunk_store.MMAP_TEXT:
+        assert not loaded.text.view().flags.writeable
+
+    # Un ajout après rechargement copie le buffer mappé en mémoire
+    loaded.add([4], chunks_for("c.txt", 1))
+    assert loaded.get(4)["source"] == "c.txt"
+    assert loaded.get(3)["text"] == "b.txt chunk 0 é"
+
+
+def test_empty_round_trip(tmp_path):
+    write_files(tmp_path, ChunkStore().to_files(compression="none"))
+    loaded = ChunkStore.load(tmp_path)
+    assert len(loaded) == 0
+    assert list(loaded.iter_chunks()) == []
+
+
+def test_zstd_round_trip(tmp_path):
+    pytest.importorskip("zstandard")
+    store = ChunkStore()
+    store.add([0, 1], chunks_for("a.txt", 2))
+    files = store.to_files(compression="zstd")
+    assert chunk_store.TEXT_FILE_ZSTD in files
+    write_files(tmp_path, files)
+
+    assert ChunkStore.load(tmp_path).get(1)["text"] == "a.txt chunk 1 é"
@@ -0,0 +1,60 @@
+from backend.rag.chunking import smart_chunk
+from backend.rag.context_packer import count_tokens, pack_context
+from backend.rag.prompt import format_chunk
+
+
+def long_doc(n_paragraphs=12, words_per_paragraph=30):
+    paragraphs = [
+        " ".join(f"mot{p}_{w}" for w in range(words_per_paragraph)) for p in range(n_paragraphs)
+    ]
+    return {"text": "\n".join(paragraphs), "source": "rapport.pdf", "type": "pdf"}
+
+
+def test_smart_chunk_overlap_is_removed_once():
+    doc = long_doc()
+    chunks = smart_chunk(doc)
+    assert len(chunks) >= 2
+
+    packed, stats = pack_context(chunks, budget=0)
+    words = [w for c in packed for w in c["text"].split() if not w.startswith("[SOURCE:")]
+    # Chaque mot du document n'apparaît plus qu'une fois
+    assert sorted(words) == sorted(doc["text"].split())
+    assert stats.tokens_after < stats.tokens_before
+
+    # Ordre de classement inverse : la fin du chunk précédent est retirée aussi
+    first = chunks[0]["text"].split()
+    packed, _ = pack_context([chunks[1], chunks[0]], budget=0)
+    assert packed[0]["text"] == chunks[1]["text"]
+    assert packed[1]["text"].split() == first[:-40]
+
+
+def test_near_duplicate_chunks_are_dropped():
+    text = "SmartIA accompagne les PME dans leurs projets d'intelligence artificielle depuis 2019 à Paris."
+    chunks = [
+        {"text": text, "source": "a.txt"},
+        {"text": text.replace("2019", "2020"), "source": "b.txt"},
+        {"text": "Le support est joignable du lundi au vendredi par email.", "source": "c.txt"},
+    ]
+    packed, stats = pack_context(chunks, budget=0, threshold=0.6)
+    assert [c["source"] for c in packed] == ["a.txt", "c.txt"]
+    assert stats.duplicates == 1 and stats.chunks_in == 3
+
+
+def test_budget_is_filled_in_rank_order():
+    chunks = [
+        {"text": "alpha " * 40, "source": "1"},
+        {"text": "beta " * 200, "source": "2"},  # ne tient pas : sauté
+        {"text": "gamma " * 30, "source": "3"},
+    ]
+    budget = count_tokens(format_chunk(chunks[0])) + count_tokens(format_chunk(chunks[2])) + 5
+    packed, stats = pack_context(chunks, budget=budget, render=format_chunk)
+
+    assert [c["source"] for c in packed] == ["1", "3"]
+    assert stats.tokens_after <= budget
+    assert stats.tokens_before > stats.tokens_after
+
+
+def test_first_chunk_is_truncated_to_budget():
+    packed, stats = pack_context([{"text": "delta " * 500, "source": "x"}], budget=50)
+    assert len(packed) == 1
+    assert 0 < stats.tokens_after <= 50
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from backend import database, metrics
+
+
+class FakeConnection:
+    def __init__(self, fail_ping=False):
+        self.closed = 0
+        self.fail_ping = fail_ping
+        self.rollbacks = 0
+        self.pings = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.pings += 1
+        if self.fail_ping:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    kwargs.setdefault("min_size", 0)
+    kwargs.setdefault("max_size", 2)
+    kwargs.setdefault("timeout", 1)
+    kwargs.setdefault("check_idle_seconds", 30)
+    return database.ConnectionPool(connect=connect, **kwargs), opened
+
+
+def test_connections_are_reused_and_rolled_back(monkeypatch):
+    pool, opened = make_pool()
+    monkeypatch.setattr(database, "_pool", pool)
+
+    for _ in range(3):
+        with database.get_db() as conn:
+            assert conn is opened[0]
+    assert len(opened) == 1
+    assert opened[0].rollbacks == 3
+    assert pool.stats() == {"size": 1, "idle": 1, "max": 2}
+
+
+def test_connection_returns_to_pool_when_block_raises(monkeypatch):
+    pool, opened = make_pool(max_size=1)
+    monkeypatch.setattr(database, "_pool", pool)
+
+    with pytest.raises(ValueError):
+        with database.get_db():
+            raise ValueError("boom")
+    with database.get_db() as conn:
+        assert conn is opened[0]
+
+
+def test_acquire_waits_for_a_release_then_times_out():
+    pool, opened = make_pool(max_size=1, timeout=2)
+    held = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(held,)).start()
+    assert pool.acquire() is held
+
+    pool.timeout = 0.05
+    timeouts = metrics._metrics["db_pool_timeouts"]
+    start = time.perf_counter()
+    with pytest.raises(database.PoolTimeout):
+        pool.acquire()
+    assert time.perf_counter() - start >= 0.05
+    assert metrics._metrics["db_pool_timeouts"] == timeouts + 1
+    assert len(opened) == 1
+
+
+def test_broken_connections_are_replaced():
+    now = [0.0]
+    pool, opened = make_pool(min_size=1, clock=lambda: now[0])
+    pool.warm()
+    pool.warm()
+    assert len(opened) == 1
+
+    # Fermée côté client : remplacée sans requête
+    opened[0].closed = 1
+    conn = pool.acquire()
+    assert conn is opened[1]
+
+    # Inactive trop longtemps et serveur disparu : le ping échoue
+    pool.release(conn)
+    conn.fail_ping = True
+    now[0] += 60
+    assert pool.acquire() is opened[2]
+    assert conn.pings == 1 and conn.closed
+    assert pool.stats()["size"] == 1
+
+
+def test_failed_connect_frees_the_slot():
+    def refuse():
+        raise OSError("connection refused")
+
+    pool = database.ConnectionPool(connect=refuse, min_size=0, max_size=1, timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            pool.acquire()
+    assert pool.stats()["size"] == 0
+
+
+def test_config_comes_from_the_environment(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("DB_HOST", "db.internal")
+    monkeypatch.setenv("DB_NAME", "rag")
+    cfg = database.db_config()
+    assert cfg["host"] == "db.internal" and cfg["database"] == "rag"
+    assert database.db_config(database="jobs")["database"] == "jobs"
+
+    monkeypatch.setenv("DATABASE_URL", "postgresql://u:p@db:5432/rag")
+    cfg = database.db_config()
+    assert cfg["dsn"] == "postgresql://u:p@db:5432/rag" and "host" not in cfg
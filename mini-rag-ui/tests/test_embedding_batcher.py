@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend.rag import embeddings
+from backend.rag.embedding_batcher import EmbeddingBatcher
+from backend.rag.embeddings import QueryVectorCache
+
+
+def fake_encode(calls, gate=None, entered=None):
+    def encode(texts):
+        calls.append(list(texts))
+        if entered is not None:
+            entered.set()
+        if gate is not None:
+            gate.wait(2)
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype="float32")
+    return encode
+
+
+def test_concurrent_queries_share_one_encode():
+    calls = []
+    gate, entered = threading.Event(), threading.Event()
+    batcher = EmbeddingBatcher(fake_encode(calls, gate, entered), max_batch=8, max_wait_ms=0)
+
+    # Premier lot bloqué dans encode : les suivantes s'accumulent en file
+    first = batcher.submit("a")
+    assert entered.wait(2)
+    futures = [batcher.submit(q) for q in ["bb", "ccc", "bb", "dddd"]]
+    gate.set()
+
+    assert first.result(2)[0] == 1
+    assert [f.result(2)[0] for f in futures] == [2, 3, 2, 4]
+    assert calls == [["a"], ["bb", "ccc", "dddd"]]  # doublon encodé une fois
+    assert batcher.batches == 2 and batcher.items == 5
+
+
+def test_batch_size_is_capped():
+    calls = []
+    gate = threading.Event()
+    batcher = EmbeddingBatcher(fake_encode(calls, gate), max_batch=2, max_wait_ms=0)
+
+    futures = [batcher.submit(q) for q in ["a", "b", "c", "d", "e"]]
+    gate.set()
+    for f in futures:
+        f.result(2)
+    assert all(len(batch) <= 2 for batch in calls)
+
+
+def test_encode_error_reaches_every_caller():
+    def fail(texts):
+        raise RuntimeError("modèle indisponible")
+
+    batcher = EmbeddingBatcher(fail, max_wait_ms=0)
+    with pytest.raises(RuntimeError, match="modèle indisponible"):
+        batcher.embed("question")
+
+
+def test_embed_query_goes_through_batcher(monkeypatch):
+    calls = []
+    monkeypatch.setattr(embeddings, "_query_vectors", QueryVectorCache(max_size=10, ttl=0))
+    monkeypatch.setattr(embeddings, "_query_batcher", EmbeddingBatcher(fake_encode(calls), max_wait_ms=0))
+
+    vector = embeddings.embed_query("  bonjour   SmartIA ")
+    assert vector.shape == (1, 2) and vector[0, 0] == len("bonjour SmartIA")
+    embeddings.embed_query("bonjour SmartIA")
+    assert calls == [["bonjour SmartIA"]]
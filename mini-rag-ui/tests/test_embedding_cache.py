@@ -0,0 +1,61 @@
+import numpy as np
+
+from backend.rag import embedding_cache
+from backend.rag.embedding_cache import EmbeddingCache
+
+
+def vectors(n, dim=4):
+    return np.arange(n * dim, dtype="float32").reshape(n, dim)
+
+
+def test_get_many_returns_cached_positions(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+    cache.put_many("m", ["a", "b"], vectors(2))
+
+    found = cache.get_many("m", ["b", "x", "a", "b"])
+    assert sorted(found) == [0, 2, 3]
+    np.testing.assert_array_equal(found[2], vectors(2)[0])
+    assert cache.get_many("other-model", ["a"]) == {}
+
+
+def test_running_count_and_lru_eviction(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_entries=10)
+    cache.put_many("m", [f"t{i}" for i in range(8)], vectors(8))
+    cache.put_many("m", ["t0", "t1"], vectors(2))  # déjà présents : pas comptés
+    assert cache._count == 8
+
+    cache._conn.execute("UPDATE embeddings SET last_used = 0 WHERE key = ?", (embedding_cache.cache_key("m", "t7"),))
+    cache.put_many("m", [f"n{i}" for i in range(3)], vectors(3))
+
+    # 11 > 10 : retour à 90 % en évinçant les moins récemment utilisés
+    assert cache._count == 9
+    assert cache._row_count() == 9
+    assert cache.get_many("m", ["t7"]) == {}
+
+    reopened = EmbeddingCache(tmp_path / "cache.sqlite3", max_entries=10)
+    assert reopened._count == 9
+
+
+def test_recent_hits_are_not_rewritten(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+    cache.put_many("m", ["a"], vectors(1))
+    key = embedding_cache.cache_key("m", "a")
+
+    def last_used():
+        return cache._conn.execute("SELECT last_used FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+    cache._conn.execute("UPDATE embeddings SET last_used = 100 WHERE key = ?", (key,))
+    cache.get_many("m", ["a"])
+    touched = last_used()
+    assert touched > 100
+
+    changes = cache._conn.total_changes
+    cache.get_many("m", ["a"])
+    assert cache._conn.total_changes == changes
+    assert last_used() == touched
+
+
+def test_key_is_the_encoded_text():
+    # Le vecteur est calculé sur le texte brut : pas de normalisation dans la clé
+    assert embedding_cache.cache_key("m", "a\nb") != embedding_cache.cache_key("m", "a b")
+    assert embedding_cache.cache_key("m", "a b") != embedding_cache.cache_key("n", "a b")
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from backend import utils
+
+T0 = datetime(2026, 3, 1, 9, 0, 0)
+
+
+class FakeThreadDB:
+    """
+    Fil de messages en mémoire : rejoue les requêtes de utils (propriétaire,
+    page par clé, questions récentes) et garde les paramètres reçus.
+    """
+
+    def __init__(self, messages, owner=1):
+        self.messages = messages  # (id, role, content, created_at)
+        self.owner = owner
+        self.queries = []
+        self._result = []
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def execute(self, query, params):
+        self.queries.append((" ".join(query.split()), params))
+        if "FROM chat_threads" in query:
+            self._result = [(params[0],)] if params[1] == self.owner else []
+            return
+        rows = sorted(self.messages, key=lambda m: (m[3], m[0]), reverse=True)
+        if "role = 'user'" in query:
+            rows = [(m[2],) for m in rows if m[1] == "user"]
+        elif "(created_at, id) <" in query:
+            rows = [m for m in rows if (m[3], m[0]) < (params[1], params[2])]
+        self._result = rows[: params[-1]]
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+
+def make_thread(n_turns):
+    messages = []
+    for turn in range(n_turns):
+        # Question et réponse insérées dans la même transaction : même NOW()
+        at = T0 + timedelta(minutes=turn)
+        messages.append((2 * turn + 1, "user", f"question {turn}", at))
+        messages.append((2 * turn + 2, "assistant", f"réponse {turn}", at))
+    return messages
+
+
+@pytest.fixture
+def thread_db(monkeypatch):
+    db = FakeThreadDB(make_thread(5))
+
+    @contextmanager
+    def get_db():
+        yield db
+
+    monkeypatch.setattr(utils, "get_db", get_db)
+    return db
+
+
+def test_pages_walk_back_through_the_thread(thread_db):
+    page, cursor = utils.get_thread_messages_page(1, 7, limit=4)
+    assert [m["content"] for m in page] == ["question 3", "réponse 3", "question 4", "réponse 4"]
+    assert cursor
+
+    seen = page
+    while cursor:
+        page, cursor = utils.get_thread_messages_page(1, 7, limit=4, before=cursor)
+        seen = page + seen
+    assert [m["id"] for m in seen] == list(range(1, 11))
+    assert all(params[-1] == 5 for query, params in thread_db.queries if "chat_messages" in query)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    cursor = utils.encode_message_cursor(T0, 42)
+    assert utils.decode_message_cursor(cursor) == (T0, 42)
+    with pytest.raises(HTTPException) as exc:
+        utils.decode_message_cursor("pas-un-curseur")
+    assert exc.value.status_code == 400
+
+
+def test_recent_user_questions_are_bounded_and_chronological(thread_db):
+    assert utils.get_recent_user_questions(1, 7, limit=2) == ["question 3", "question 4"]
+    query, params = thread_db.queries[-1]
+    assert "LIMIT %s" in query and params == (7, 2)
+
+
+def test_other_users_threads_are_not_found(thread_db):
+    with pytest.raises(HTTPException) as exc:
+        utils.get_recent_user_questions(2, 7)
+    assert exc.value.status_code == 404
+    assert len(thread_db.queries) == 1
@@ -0,0 +1,128 @@
+import numpy as np
+
+from backend.rag.index_store import (
+    build_manifest,
+    diff_manifest,
+    file_fingerprint,
+    load_index,
+    read_manifest,
+    save_index,
+)
+from backend.rag.vectorstore import VectorStore
+
+DIM = 8
+
+
+def unit_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def manifest(files=None, db="db", model="model-a", pipeline=2):
+    return {
+        "pipeline_version": pipeline,
+        "embedding_model": model,
+        "files": files or {},
+        "db": db,
+        "db_sources": [],
+    }
+
+
+def test_diff_manifest_detects_removed_changed_and_db():
+    saved = manifest({"a.txt": {"sha256": "1"}, "b.txt": {"sha256": "2"}}, db="old")
+    current = manifest({"b.txt": {"sha256": "3"}, "c.txt": {"sha256": "4"}}, db="new")
+
+    assert diff_manifest(saved, current) == (["a.txt"], ["b.txt", "c.txt"], True)
+
+
+def test_diff_manifest_unchanged():
+    saved = manifest({"a.txt": {"sha256": "1"}})
+    assert diff_manifest(saved, manifest({"a.txt": {"sha256": "1"}})) == ([], [], False)
+
+
+def test_diff_manifest_model_change_forces_full_rebuild():
+    saved = manifest({"a.txt": {"sha256": "1"}, "gone.txt": {"sha256": "2"}})
+    current = manifest({"a.txt": {"sha256": "1"}}, model="model-b")
+
+    assert diff_manifest(saved, current) == ([], ["a.txt"], True)
+    assert diff_manifest(None, current) == ([], ["a.txt"], True)
+
+
+def test_file_fingerprint_reuses_hash_when_size_and_mtime_match(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("contenu")
+    first = file_fingerprint(path)
+
+    reused = file_fingerprint(path, {**first, "sha256": "cached"})
+    assert reused["sha256"] == "cached"
+
+    path.write_text("contenu modifié")
+    assert file_fingerprint(path, first)["sha256"] != first["sha256"]
+
+
+def test_build_manifest_skips_empty_and_unsupported_files(tmp_path):
+    (tmp_path / "a.txt").write_text("texte")
+    (tmp_path / "empty.txt").write_text("")
+    (tmp_path / "notes.md").write_text("markdown")
+    (tmp_path / "upper.TXT").write_text("majuscules")
+
+    built = build_manifest(tmp_path, ["job"], "model-a")
+    assert sorted(built["files"]) == ["a.txt"]
+
+
+def test_save_load_round_trip(tmp_path):
+    store = VectorStore()
+    chunks = [{"text": f"chunk {i}", "type": "txt", "source": "a.txt" if i < 3 else "b.txt"} for i in range(5)]
+    vectors = unit_vectors(5)
+    store.add(chunks, vectors)
+
+    saved = save_index(tmp_path, store, manifest())
+    assert saved["n_chunks"] == 5
+    assert saved["generation"] == 1
+    assert read_manifest(tmp_path)["generation"] == 1
+
+    loaded, loaded_manifest = load_index(tmp_path, manifest())
+    assert len(loaded) == 5
+    assert loaded.next_id == store.next_id
+    assert loaded.count("a.txt") == 3
+    assert loaded_manifest["n_chunks"] == 5
+
+    query = vectors[3:4]
+    assert [r["id"] for r in loaded.search(query, 3)] == [r["id"] for r in store.search(query, 3)]
+
+    assert save_index(tmp_path, loaded, loaded_manifest)["generation"] == 2
+
+
+def test_empty_store_round_trip(tmp_path):
+    save_index(tmp_path, VectorStore(), manifest())
+
+    loaded, _ = load_index(tmp_path, manifest())
+    assert len(loaded) == 0
+    assert loaded.search(unit_vectors(1), 5) == []
+
+
+def test_store_emptied_by_removals_round_trips(tmp_path):
+    store = VectorStore()
+    store.add([{"text": "seul", "type": "txt", "source": "a.txt"}], unit_vectors(1))
+    store.remove_source("a.txt")
+    save_index(tmp_path, store, manifest())
+
+    loaded, _ = load_index(tmp_path, manifest())
+    assert len(loaded) == 0
+    assert loaded.next_id == 1
+
+
+def test_load_index_rejects_other_model(tmp_path):
+    save_index(tmp_path, VectorStore(), manifest())
+    assert load_index(tmp_path, manifest(model="model-b")) is None
+
+
+def test_load_index_rejects_inconsistent_artifact(tmp_path):
+    store = VectorStore()
+    store.add([{"text": "x", "type": "txt", "source": "a.txt"}], unit_vectors(1))
+    save_index(tmp_path, store, manifest())
+
+    (tmp_path / "manifest.json").write_text(
+        (tmp_path / "manifest.json").read_text().replace('"n_chunks": 1', '"n_chunks": 2')
+    )
+    assert load_index(tmp_path, manifest()) is None
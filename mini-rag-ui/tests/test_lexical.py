@@ -0,0 +1,104 @@
+import numpy as np
+
+from backend.rag import lexical, retriever
+from backend.rag.index_store import load_index, save_index
+from backend.rag.lexical import LexicalIndex, tokenize
+from backend.rag.retriever import reciprocal_rank_fusion, retrieve
+from backend.rag.vectorstore import VectorStore
+
+TEXTS = [
+    "Le projet JobMatchAI rapproche candidats et offres d'emploi.",
+    "L'équipe data travaille sur la plateforme de recommandation.",
+    "Présentation de l'entreprise SmartIA et de ses clients.",
+    "Le projet Vision analyse des images médicales pour l'hôpital.",
+]
+
+
+def manifest():
+    return {"pipeline_version": 3, "embedding_model": "m", "files": {}, "db": "", "db_sources": []}
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("L'Équipe travaille sur le Cœur du projet n°2") == [
+        "equipe", "travaille", "coeur", "projet", "2",
+    ]
+    assert tokenize("équipe") == tokenize("EQUIPE")
+
+
+def test_bm25_ranks_exact_identifier_first():
+    index = LexicalIndex()
+    index.add([0, 1, 2, 3], TEXTS)
+
+    hits = index.search("Parle-moi du projet jobmatchai", top_k=4)
+    assert hits[0][0] == 0
+    assert [i for i, _ in index.search("presentation smartia")] == [2]
+    assert index.search("inconnu") == []
+
+
+def test_remove_then_merge_purges_postings():
+    index = LexicalIndex()
+    index.add([0, 1], TEXTS[:2])
+    index.merge()
+    index.add([5, 6], TEXTS[2:])  # ajouts récents hors segment trié
+
+    assert {i for i, _ in index.search("projet")} == {0, 6}
+    index.remove([0, 42])
+    assert [i for i, _ in index.search("projet")] == [6]
+    assert len(index) == 3
+
+    index.merge()
+    assert "jobmatchai" not in index.terms.codes
+    assert len(index.tail_ids) == 0
+    assert [i for i, _ in index.search("projet")] == [6]
+
+
+def test_tail_is_merged_past_threshold(monkeypatch):
+    monkeypatch.setattr(lexical, "_TAIL_MERGE_POSTINGS", 5)
+    index = LexicalIndex()
+    index.add([0, 1, 2], TEXTS[:3])
+    assert len(index.tail_ids) == 0
+    assert len(index.post_ids) > 0
+
+
+def test_vectorstore_keeps_lexical_in_sync_and_persists(tmp_path):
+    vectors = np.eye(4, 8, dtype="float32")
+    store = VectorStore()
+    store.add([{"text": t, "type": "txt", "source": f"doc{i}.txt"} for i, t in enumerate(TEXTS)], vectors)
+
+    assert store.search_lexical("jobmatchai", 3)[0]["source"] == "doc0.txt"
+    store.remove_source("doc0.txt")
+    assert store.search_lexical("jobmatchai", 3) == []
+
+    save_index(tmp_path, store, manifest())
+    loaded, _ = load_index(tmp_path, manifest())
+    assert loaded.search_lexical("vision", 3)[0]["source"] == "doc3.txt"
+
+    # Artefact sans fichiers lexicaux : reconstruit depuis les chunks
+    for name in (lexical.LEXICAL_FILE, lexical.LEXICAL_TERMS_FILE):
+        (tmp_path / name).unlink()
+    rebuilt, _ = load_index(tmp_path, manifest())
+    assert rebuilt.search_lexical("vision", 3)[0]["source"] == "doc3.txt"
+    assert len(rebuilt.lexical) == 3
+
+
+def test_rrf_fusion_keeps_both_scores():
+    dense = [{"id": 1, "text": "a", "score": 0.9}, {"id": 2, "text": "b", "score": 0.8}]
+    lexical_hits = [{"id": 2, "text": "b", "score": 7.0}, {"id": 3, "text": "c", "score": 5.0}]
+
+    fused = reciprocal_rank_fusion({"dense": dense, "lexical": lexical_hits}, top_k=3, k=60)
+    assert [r["id"] for r in fused] == [2, 1, 3]
+    assert fused[0]["dense_score"] == 0.8 and fused[0]["lexical_score"] == 7.0
+    assert fused[0]["score"] == 1 / 62 + 1 / 61
+
+
+def test_hybrid_retrieve_recovers_identifier_missed_by_dense(monkeypatch):
+    vectors = np.eye(4, 8, dtype="float32")
+    store = VectorStore()
+    store.add([{"text": t, "type": "txt", "source": f"doc{i}.txt"} for i, t in enumerate(TEXTS)], vectors)
+
+    # L'embedding de la question pointe vers le mauvais document
+    monkeypatch.setattr(retriever, "embed_query", lambda q: vectors[3:4])
+    assert retrieve("jobmatchai", store, top_k=1, mode="dense")[0]["source"] == "doc3.txt"
+    hybrid = retrieve("jobmatchai", store, top_k=2, mode="hybrid")
+    assert {r["source"] for r in hybrid} == {"doc0.txt", "doc3.txt"}
+    assert "lexical_score" in next(r for r in hybrid if r["source"] == "doc0.txt")
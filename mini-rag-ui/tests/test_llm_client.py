@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import deque
+
+import pytest
+
+
+@pytest.fixture
+def llm_client(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    import backend.llm_client as llm_client
+
+    monkeypatch.setattr(llm_client, "_backoff_seconds", lambda attempt: 0)
+    return llm_client
+
+
+class FakeResponses:
+    def __init__(self, failures=0, delay=0.01):
+        self.failures = failures
+        self.delay = delay
+        self.models = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, model, **kw):
+        self.models.append(model)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if len(self.models) <= self.failures:
+                raise TimeoutError("provider lent")
+            return type("Response", (), {"output_text": f"réponse de {model}"})()
+        finally:
+            self.in_flight -= 1
+
+
+def install(monkeypatch, llm_client, responses):
+    fake_client = type("Client", (), {"responses": responses})()
+    monkeypatch.setattr(llm_client, "async_client", fake_client)
+
+
+def test_concurrent_calls_are_bounded_by_semaphore(monkeypatch, llm_client):
+    responses = FakeResponses()
+    install(monkeypatch, llm_client, responses)
+    monkeypatch.setattr(llm_client, "LLM_MAX_CONCURRENCY", 4)
+
+    async def burst():
+        return await asyncio.gather(*(llm_client.acreate_response(f"q{i}") for i in range(40)))
+
+    results = asyncio.run(burst())
+    assert len(results) == 40
+    assert responses.peak == 4
+
+
+def test_async_retries_then_falls_back(monkeypatch, llm_client):
+    responses = FakeResponses(failures=llm_client.LLM_MAX_RETRIES)
+    install(monkeypatch, llm_client, responses)
+    monkeypatch.setattr(llm_client, "FALLBACK_MODEL", "secours")
+
+    response = asyncio.run(llm_client.acreate_response("q"))
+    assert response.output_text == "réponse de secours"
+    assert len(responses.models) == llm_client.LLM_MAX_RETRIES + 1
+
+    install(monkeypatch, llm_client, FakeResponses(failures=99))
+    with pytest.raises(RuntimeError, match="provider lent"):
+        asyncio.run(llm_client.acreate_response("q"))
+
+
+class ModelResponses:
+    """
+    Latence par modèle ; mémorise les appels annulés.
+    """
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.cancelled = []
+
+    async def create(self, model, **kw):
+        try:
+            await asyncio.sleep(self.delays[model])
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        return type("Response", (), {"output_text": model})()
+
+
+def enable_hedging(monkeypatch, llm_client, delay):
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_DELAY_SECONDS", delay)
+    monkeypatch.setattr(llm_client, "FALLBACK_MODEL", "secours")
+    monkeypatch.setattr(llm_client, "_primary_latencies", deque(maxlen=50))
+
+
+def test_hedge_wins_when_primary_is_slow(monkeypatch, llm_client):
+    import backend.metrics as metrics
+
+    responses = ModelResponses({llm_client.PRIMARY_MODEL: 5.0, "secours": 0.01})
+    install(monkeypatch, llm_client, responses)
+    enable_hedging(monkeypatch, llm_client, delay=0.05)
+    hedges = metrics._metrics["llm_hedges"]
+
+    start = time.monotonic()
+    response = asyncio.run(llm_client.acreate_response("q"))
+    assert response.output_text == "secours"
+    assert time.monotonic() - start < 1.0
+    assert responses.cancelled == [llm_client.PRIMARY_MODEL]
+    assert metrics._metrics["llm_hedges"] == hedges + 1
+    assert metrics._metrics["llm_wins"]["hedge"] >= 1
+    # L'appel annulé compte comme borne basse de latence
+    assert list(llm_client._primary_latencies) == [pytest.approx(0.05, abs=0.04)]
+
+
+def test_fast_primary_does_not_hedge(monkeypatch, llm_client):
+    import backend.metrics as metrics
+
+    responses = ModelResponses({llm_client.PRIMARY_MODEL: 0.01, "secours": 0.01})
+    install(monkeypatch, llm_client, responses)
+    enable_hedging(monkeypatch, llm_client, delay=0.5)
+    hedges = metrics._metrics["llm_hedges"]
+
+    assert asyncio.run(llm_client.acreate_response("q")).output_text == llm_client.PRIMARY_MODEL
+    assert metrics._metrics["llm_hedges"] == hedges
+    assert responses.cancelled == []
+
+
+def test_hedge_delay_follows_latency_percentile(monkeypatch, llm_client):
+    enable_hedging(monkeypatch, llm_client, delay=3.0)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_PERCENTILE", 90)
+
+    assert llm_client.hedge_delay() == 3.0
+    llm_client._primary_latencies.extend([0.1 * i for i in range(1, 11)])
+    assert llm_client.hedge_delay() == pytest.approx(0.9)
+
+
+def test_total_deadline_bounds_a_hung_provider(monkeypatch, llm_client):
+    install(monkeypatch, llm_client, ModelResponses({llm_client.PRIMARY_MODEL: 60, llm_client.FALLBACK_MODEL: 60}))
+    monkeypatch.setattr(llm_client, "LLM_DEADLINE_SECONDS", 0.2)
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="délai total"):
+        asyncio.run(llm_client.acreate_response("q"))
+    assert time.monotonic() - start < 1.0
@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI
+
+from loadtest.mock_llm import MockConfig, create_app
+from loadtest.report import Recorder, percentile
+
+
+def mock_client(**config):
+    app = create_app(MockConfig(latency_jitter_ms=0, tokens_per_second=0, **config))
+    transport = httpx.ASGITransport(app=app)
+    return AsyncOpenAI(api_key="test", base_url="http://mock/v1", max_retries=0, http_client=httpx.AsyncClient(transport=transport))
+
+
+def test_mock_provider_speaks_the_responses_api():
+    client = mock_client(latency_ms=0, answer_tokens=4)
+
+    async def scenario():
+        response = await client.responses.create(model="m", input="bonjour", temperature=0.1)
+        stream = await client.responses.create(model="m", input=[{"role": "user", "content": "x"}], stream=True)
+        deltas = [event.delta async for event in stream if event.type == "response.output_text.delta"]
+        return response, deltas
+
+    response, deltas = asyncio.run(scenario())
+    assert response.output_text == "SmartIA accompagne ses clients"
+    assert "".join(deltas).strip() == response.output_text
+
+
+def test_mock_provider_error_rate():
+    client = mock_client(latency_ms=0, error_rate=1.0)
+
+    async def scenario():
+        try:
+            await client.responses.create(model="m", input="x")
+        except Exception as exc:
+            return exc
+
+    assert getattr(asyncio.run(scenario()), "status_code", None) == 500
+
+
+def test_report_percentiles_and_errors():
+    recorder = Recorder()
+    for ms in range(1, 101):
+        recorder.record("POST /rag/visitor", 200, float(ms))
+    recorder.record("POST /rag/visitor", 500, 3.0)
+
+    row = recorder.summary(duration_s=10)["POST /rag/visitor"]
+    assert (row["p50_ms"], row["p95_ms"], row["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert row["requests"] == 101 and row["errors"] == 1 and row["rps"] == 10.0
+    assert percentile([], 50) == 0.0
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import metrics, tracing
+
+
+def test_counters_are_thread_safe():
+    before = metrics._metrics["coalesced_requests"]
+
+    def work():
+        for _ in range(1000):
+            metrics.inc_coalesced_requests()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert metrics._metrics["coalesced_requests"] == before + 8000
+
+
+def test_histogram_buckets_are_cumulative_in_exposition():
+    histogram = metrics.Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+
+    state = {
+        "buckets": list(metrics.LATENCY_BUCKETS),
+        "counters": {"llm_calls": [[[], 2]]},
+        "histograms": {"stage_duration_seconds": [[["llm"], [1] + [0] * (len(metrics.LATENCY_BUCKETS) - 1) + [1], 30.004, 2]]},
+    }
+    text = metrics.render_prometheus([state, state])
+    assert "minirag_llm_calls_total 4" in text
+    assert 'minirag_stage_duration_seconds_bucket{stage="llm",le="0.005"} 2' in text
+    assert 'minirag_stage_duration_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'minirag_stage_duration_seconds_count{stage="llm"} 4' in text
+
+
+def test_render_sums_live_workers_and_drops_stale_files(tmp_path):
+    other = metrics.export_state()
+    other["counters"] = {"answer_cache_hits": [[[], 5]]}
+    other["histograms"] = {}
+    (tmp_path / "111.json").write_text(json.dumps(other), encoding="utf-8")
+    stale = tmp_path / "222.json"
+    stale.write_text(json.dumps(other), encoding="utf-8")
+    old = time.time() - metrics.METRICS_STALE_SECONDS - 10
+    os.utime(stale, (old, old))
+
+    own = metrics._metrics["answer_cache_hits"]
+    text = metrics.render_metrics(tmp_path)
+    assert f"minirag_answer_cache_hits_total {own + 5}" in text
+    assert not stale.exists()
+
+    metrics.flush(tmp_path)
+    assert json.loads((tmp_path / f"{os.getpid()}.json").read_text())["pid"] == os.getpid()
+
+
+def test_middleware_records_route_templates_and_stages():
+    app = FastAPI()
+    app.middleware("http")(tracing.trace_requests)
+
+    @app.get("/conversations/{thread_id}/messages")
+    def messages(thread_id: int):
+        with tracing.span("db.get_thread_messages"):
+            return []
+
+    client = TestClient(app)
+    client.get("/conversations/7/messages")
+    client.get("/conversations/8/messages")
+    client.get("/nowhere")
+
+    requests = metrics._metrics["http_requests"]
+    assert requests[("GET", "/conversations/{thread_id}/messages", "200")] >= 2
+    assert requests[("GET", "unmatched", "404")] >= 1
+    assert metrics._histograms["stage_duration_seconds"][("db.get_thread_messages",)].count >= 2
+    assert "GET /conversations/{thread_id}/messages" in metrics.snapshot_metrics()["route_avg_latency_ms"]
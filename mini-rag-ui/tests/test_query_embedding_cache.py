@@ -0,0 +1,69 @@
+import numpy as np
+
+from backend import metrics
+from backend.rag import embeddings
+from backend.rag.embeddings import QueryVectorCache, embed_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_embed(calls):
+    def embed(texts, use_cache=True):
+        calls.extend(texts)
+        return np.ones((len(texts), 4), dtype="float32")
+    return embed
+
+
+def test_repeated_question_skips_model(monkeypatch):
+    calls = []
+    monkeypatch.setattr(embeddings, "embed", counting_embed(calls))
+    monkeypatch.setattr(embeddings, "_query_vectors", QueryVectorCache(max_size=10, ttl=0))
+    hits = metrics.snapshot_metrics()["query_embedding_cache_hits"]
+
+    first = embed_query("Qui travaille sur  jobmatchai ?")
+    second = embed_query(" Qui travaille sur jobmatchai ? ")
+    assert calls == ["Qui travaille sur jobmatchai ?"]  # texte encodé = clé normalisée
+    assert second is first and first.shape == (1, 4)
+    assert not first.flags.writeable
+    assert metrics.snapshot_metrics()["query_embedding_cache_hits"] == hits + 1
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = QueryVectorCache(max_size=2, ttl=60, clock=clock)
+    for name in ("a", "b"):
+        cache.put(("m", name), np.zeros(2, dtype="float32"))
+    cache.get(("m", "a"))
+    cache.put(("m", "c"), np.zeros(2, dtype="float32"))
+    assert cache.get(("m", "b")) is None  # le moins récemment utilisé
+    assert cache.get(("m", "a")) is not None
+
+    clock.now = 61
+    assert cache.get(("m", "a")) is None
+
+
+def test_size_zero_disables_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(embeddings, "embed", counting_embed(calls))
+    monkeypatch.setattr(embeddings, "_query_vectors", QueryVectorCache(max_size=0))
+    embed_query("bonjour")
+    embed_query("bonjour")
+    assert len(calls) == 2
+
+
+def test_embed_queries_encodes_missing_questions_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(embeddings, "embed", counting_embed(calls))
+    monkeypatch.setattr(embeddings, "_query_vectors", QueryVectorCache(max_size=10, ttl=0))
+    embed_query("déjà vue")
+    calls.clear()
+
+    vectors = embeddings.embed_queries(["déjà vue", "nouvelle", " nouvelle ", "autre"])
+    assert vectors.shape == (4, 4)
+    assert calls == ["nouvelle", "autre"]  # un seul appel, sans doublon
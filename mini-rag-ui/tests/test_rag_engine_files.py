@@ -0,0 +1,261 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+DIM = 16
+
+
+def fake_embed(texts, use_cache=True):
+    """
+    Sac de mots haché : déterministe, sans modèle à télécharger.
+    """
+    vectors = np.zeros((len(texts), DIM), dtype="float32")
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % DIM] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    import backend.rag_engine as rag_engine
+
+    monkeypatch.setattr(rag_engine, "embed", fake_embed)
+    monkeypatch.setattr(rag_engine, "warmup", lambda keys=None: None)
+    monkeypatch.setattr(rag_engine, "load_db_jobs", lambda: [])
+    monkeypatch.setattr(rag_engine, "load_db_projects", lambda: [])
+
+    public_dir = tmp_path / "public"
+    private_dir = tmp_path / "private"
+    public_dir.mkdir()
+    private_dir.mkdir()
+    (public_dir / "base.txt").write_text("présentation de l'entreprise")
+
+    def make():
+        return rag_engine.RAGEngine(
+            public_dir=str(public_dir),
+            private_dir=str(private_dir),
+            index_dir=str(tmp_path / "index"),
+            rerank_mode="none",
+        )
+
+    make.public_dir = public_dir
+    return make
+
+
+def test_rename_lower_to_upper_suffix_drops_chunks(make_engine):
+    engine = make_engine()
+    (make_engine.public_dir / "a.txt").write_text("document a")
+    assert engine.index_file("public", "a.txt") == 1
+
+    (make_engine.public_dir / "a.txt").rename(make_engine.public_dir / "a.TXT")
+    engine.rename_file("public", "a.txt", "a.TXT")
+
+    # "a.TXT" n'est pas indexable : aucun chunk orphelin ne doit rester
+    assert engine.public_store.count("a.txt") == 0
+    assert engine.public_store.count("a.TXT") == 0
+    assert "a.TXT" not in engine._manifests["public"]["files"]
+
+
+def test_rename_upper_to_lower_suffix_indexes_file(make_engine):
+    engine = make_engine()
+    (make_engine.public_dir / "a.TXT").write_text("document a")
+    assert engine.index_file("public", "a.TXT") == 0
+
+    (make_engine.public_dir / "a.TXT").rename(make_engine.public_dir / "a.txt")
+    engine.rename_file("public", "a.TXT", "a.txt")
+
+    assert engine.public_store.count("a.txt") == 1
+    assert "a.txt" in engine._manifests["public"]["files"]
+
+
+def test_rename_same_suffix_rewrites_metadata_only(make_engine, monkeypatch):
+    engine = make_engine()
+    (make_engine.public_dir / "a.txt").write_text("document a")
+    engine.index_file("public", "a.txt")
+
+    import backend.rag_engine as rag_engine
+    monkeypatch.setattr(rag_engine, "embed", lambda *a, **k: pytest.fail("re-encodage inattendu"))
+
+    (make_engine.public_dir / "a.txt").rename(make_engine.public_dir / "b.txt")
+    assert engine.rename_file("public", "a.txt", "b.txt") == 1
+    assert engine.public_store.count("b.txt") == 1
+    assert sorted(engine._manifests["public"]["files"]) == ["b.txt", "base.txt"]
+
+
+def test_workers_do_not_overwrite_each_other(make_engine):
+    worker_1 = make_engine()
+    worker_2 = make_engine()
+
+    (make_engine.public_dir / "one.txt").write_text("document un")
+    worker_1.index_file("public", "one.txt")
+    (make_engine.public_dir / "two.txt").write_text("document deux")
+    worker_2.index_file("public", "two.txt")
+
+    assert worker_2.public_store.count("one.txt") == 1
+
+    worker_1._ensure_fresh("public")
+    assert worker_1.public_store.count("two.txt") == 1
+
+    restarted = make_engine()
+    assert sorted(restarted.public_store.sources) == ["base.txt", "one.txt", "two.txt"]
+
+
+def test_ask_with_file_names_only_retrieves_those_files(make_engine, monkeypatch):
+    import backend.rag.retriever as retriever
+    import backend.rag_engine as rag_engine
+
+    (make_engine.public_dir / "planning.txt").write_text("planning du projet vision")
+    engine = make_engine()
+    (engine.private_dir / "budget.txt").write_text("budget du projet vision")
+    engine.index_file("private", "budget.txt")
+
+    prompts = []
+
+    class Response:
+        output_text = "ok"
+
+    monkeypatch.setattr(retriever, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "create_response", lambda prompt, **kw: prompts.append(prompt) or Response())
+
+    engine.ask("Que dit le document sur le projet vision ?", file_names=["planning.txt"])
+    assert "planning du projet vision" in prompts[-1]
+    assert "budget du projet vision" not in prompts[-1]
+
+    # Fichier inconnu : recherche sur tout l'index privé
+    engine.ask("Que dit le document sur le projet vision ?", file_names=["absent.txt"])
+    assert "budget du projet vision" in prompts[-1]
+
+
+def test_ask_public_answer_cache_invalidated_by_index_change(make_engine, monkeypatch):
+    import backend.rag.retriever as retriever
+    import backend.rag_engine as rag_engine
+
+    calls = []
+
+    class Response:
+        output_text = "SmartIA propose du conseil."
+
+    monkeypatch.setattr(retriever, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "create_response", lambda prompt, **kw: calls.append(prompt) or Response())
+
+    engine = make_engine()
+    engine.ask_public("Quels services proposez-vous ?")
+    assert engine.ask_public("quels services proposez-vous ?") == "SmartIA propose du conseil."
+    assert len(calls) == 1
+
+    (make_engine.public_dir / "services.txt").write_text("services de conseil et formation")
+    engine.index_file("public", "services.txt")
+    engine.ask_public("Quels services proposez-vous ?")
+    assert len(calls) == 2
+
+
+def test_search_many_returns_ranked_chunks_per_query(make_engine, monkeypatch):
+    import backend.rag.retriever as retriever
+
+    monkeypatch.setattr(retriever, "embed_queries", fake_embed)
+    (make_engine.public_dir / "contact.txt").write_text("contact par email")
+    engine = make_engine()
+
+    results = engine.search_many(["contact email", "entreprise"], visibility="public", top_k=1)
+    assert [r[0]["source"] for r in results] == ["contact.txt", "base.txt"]
+    assert isinstance(results[0][0]["score"], float)
+    assert engine.search_many([], visibility="public") == []
+    with pytest.raises(ValueError):
+        engine.search_many(["x"], visibility="interne")
+
+
+def test_stream_public_yields_deltas_and_fills_answer_cache(make_engine, monkeypatch):
+    import backend.rag.retriever as retriever
+    import backend.rag_engine as rag_engine
+
+    calls = []
+
+    def fake_stream(prompt, **kw):
+        calls.append(prompt)
+        yield from ["SmartIA ", "propose ", "du conseil.  "]
+
+    monkeypatch.setattr(retriever, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "stream_response", fake_stream)
+
+    engine = make_engine()
+    deltas = list(engine.stream_public("Quels services proposez-vous ?"))
+    assert deltas == ["SmartIA ", "propose ", "du conseil.  "]
+
+    # Réponse assemblée en cache : servie d'un bloc, sans nouvel appel LLM
+    assert list(engine.stream_public("quels services proposez-vous ?")) == ["SmartIA propose du conseil."]
+    assert engine.ask_public("Quels services proposez-vous ?") == "SmartIA propose du conseil."
+    assert len(calls) == 1
+
+
+def test_stream_chat_empty_completion_yields_fallback(make_engine, monkeypatch):
+    import backend.rag_engine as rag_engine
+
+    monkeypatch.setattr(rag_engine, "stream_response", lambda messages, **kw: iter([" ", "\n"]))
+    engine = make_engine()
+
+    answer = "".join(engine.stream_chat("Écris un poème sur la mer")).strip()
+    assert answer == "Je n'ai pas pu générer de réponse pour le moment."
+
+
+def test_async_ask_chat_matches_sync_path(make_engine, monkeypatch):
+    import asyncio
+
+    import backend.rag_engine as rag_engine
+
+    class Response:
+        output_text = " Voici un poème. "
+
+    async def fake_acreate(messages, **kw):
+        return Response()
+
+    async def fake_astream(messages, **kw):
+        for delta in ["Voici ", "un poème."]:
+            yield delta
+
+    monkeypatch.setattr(rag_engine, "create_response", lambda messages, **kw: Response())
+    monkeypatch.setattr(rag_engine, "acreate_response", fake_acreate)
+    monkeypatch.setattr(rag_engine, "astream_response", fake_astream)
+    engine = make_engine()
+
+    async def collect(stream):
+        return [delta async for delta in stream]
+
+    question = "Écris un poème sur la mer"
+    assert asyncio.run(engine.aask_chat(question)) == engine.ask_chat(question) == "Voici un poème."
+    assert asyncio.run(collect(engine.astream_chat(question))) == ["Voici ", "un poème."]
+    assert asyncio.run(engine.aask_chat("Bonjour")) == engine.ask_chat("Bonjour")
+
+
+def test_concurrent_identical_public_questions_share_one_llm_call(make_engine, monkeypatch):
+    import asyncio
+
+    import backend.rag.retriever as retriever
+    import backend.rag_engine as rag_engine
+
+    calls = []
+
+    class Response:
+        output_text = "Contactez-nous par email."
+
+    async def fake_acreate(prompt, **kw):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return Response()
+
+    monkeypatch.setattr(retriever, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "embed_query", lambda q: fake_embed([q]))
+    monkeypatch.setattr(rag_engine, "acreate_response", fake_acreate)
+    engine = make_engine()
+
+    async def burst():
+        return await asyncio.gather(*(engine.aask_public("Comment vous  contacter ?") for _ in range(10)))
+
+    assert asyncio.run(burst()) == ["Contactez-nous par email."] * 10
+    assert len(calls) == 1
+    assert engine.inflight.coalesced == 9
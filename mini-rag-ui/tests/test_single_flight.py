@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.rag.single_flight import SingleFlight
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_sync_duplicates_share_one_computation():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return "réponse"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("q", compute))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: flight.coalesced == 4)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == ["réponse"] * 5
+    assert len(calls) == 1
+    assert len(flight) == 0
+
+    # Clé libérée : un nouvel appel recalcule
+    flight.do("q", compute)
+    assert len(calls) == 2
+
+
+def test_sync_error_reaches_waiters_and_is_not_kept():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(2)
+        raise RuntimeError("provider indisponible")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("q", fail)
+        except RuntimeError as exc:
+            errors.append(str(exc))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: flight.coalesced == 2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert errors == ["provider indisponible"] * 3
+    assert flight.do("q", lambda: "ok") == "ok"
+
+
+def test_async_duplicates_coalesce_and_survive_leader_cancellation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.02)
+        return f"réponse {key}"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.ado("a", lambda: compute("a")))
+        await asyncio.sleep(0)
+        others = [flight.ado("a", lambda: compute("a")) for _ in range(9)]
+        other_key = flight.ado("b", lambda: compute("b"))
+
+        leader.cancel()  # client déconnecté : les autres attendent toujours le calcul
+        results = await asyncio.gather(*others, other_key)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return results
+
+    results = asyncio.run(scenario())
+    assert results == ["réponse a"] * 9 + ["réponse b"]
+    assert calls == ["a", "b"]
+    assert flight.coalesced == 9
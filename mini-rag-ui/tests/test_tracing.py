@@ -0,0 +1,80 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from backend import tracing
+from backend.tracing import end_trace, span, start_trace, traced
+
+
+def test_span_is_a_no_op_outside_a_request():
+    with span("embed_query"):
+        pass
+    assert tracing.current_trace() is None
+
+
+def test_stages_are_summed_per_name_across_threads_and_generators():
+    @traced("db.get_thread_messages")
+    def history():
+        return ["q"]
+
+    @traced("llm")
+    async def generate():
+        with span("llm_queue"):
+            await asyncio.sleep(0)
+        return "ok"
+
+    @traced("llm_stream")
+    async def deltas():
+        yield "a"
+        yield "b"
+
+    async def request():
+        await asyncio.to_thread(history)
+        await asyncio.to_thread(history)
+        await generate()
+        return [d async for d in deltas()]
+
+    trace, token = start_trace("POST /conversations/1/messages/rag")
+    try:
+        assert asyncio.run(request()) == ["a", "b"]
+    finally:
+        end_trace(token)
+
+    stages = trace.breakdown()
+    assert list(stages) == ["db.get_thread_messages", "llm_queue", "llm", "llm_stream"]
+    assert stages["db.get_thread_messages"]["count"] == 2
+    assert trace.server_timing().startswith("db.get_thread_messages;dur=")
+    assert "x2" in trace.summary()
+
+
+def test_middleware_sets_server_timing_and_logs_slow_streams(monkeypatch, capsys):
+    monkeypatch.setattr(tracing, "SERVER_TIMING_ENABLED", True)
+    monkeypatch.setattr(tracing, "SLOW_REQUEST_MS", 0.001)
+
+    app = FastAPI()
+    app.middleware("http")(tracing.trace_requests)
+
+    @app.get("/answer")
+    async def answer():
+        with span("retrieve"):
+            await asyncio.sleep(0)
+        return {"answer": "ok"}
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            with span("llm"):
+                yield "data: a\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    client = TestClient(app)
+    response = client.get("/answer")
+    assert response.json() == {"answer": "ok"}
+    assert "retrieve;dur=" in response.headers["server-timing"]
+
+    client.get("/stream")
+    logs = capsys.readouterr().out
+    assert "🐢 Requête lente GET /answer" in logs
+    assert "GET /stream" in logs and "llm" in logs.split("GET /stream")[1]
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from backend.rag import vectorstore
+from backend.rag.vectorstore import VectorStore
+
+DIM = 8
+
+
+def unit_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def chunks_for(source, n):
+    return [{"text": f"{source} {i}", "type": "txt", "source": source} for i in range(n)]
+
+
+def test_add_assigns_increasing_ids():
+    store = VectorStore()
+    assert store.add(chunks_for("a.txt", 2), unit_vectors(2)) == [0, 1]
+    assert store.add(chunks_for("b.txt", 3), unit_vectors(3, seed=1)) == [2, 3, 4]
+    assert store.add([], None) == []
+    assert len(store) == 5
+    assert sorted(store.sources) == ["a.txt", "b.txt"]
+
+
+def test_remove_source_only_drops_its_vectors():
+    store = VectorStore()
+    store.add(chunks_for("a.txt", 2), unit_vectors(2))
+    vectors_b = unit_vectors(3, seed=1)
+    store.add(chunks_for("b.txt", 3), vectors_b)
+
+    assert store.remove_source("a.txt") == 2
+    assert store.remove_source("a.txt") == 0
+    assert store.index.ntotal == 3
+    assert {r["source"] for r in store.search(vectors_b[:1], 5)} == {"b.txt"}
+
+
+def test_rename_source_keeps_vectors():
+    store = VectorStore()
+    vectors = unit_vectors(2)
+    store.add(chunks_for("old.txt", 2), vectors)
+
+    assert store.rename_source("old.txt", "new.txt") == 2
+    assert store.count("old.txt") == 0
+    assert store.count("new.txt") == 2
+    assert store.index.ntotal == 2
+    assert store.search(vectors[:1], 1)[0]["source"] == "new.txt"
+
+
+def test_replace_source_swaps_chunks():
+    store = VectorStore()
+    store.add(chunks_for("a.txt", 3), unit_vectors(3))
+    store.add(chunks_for("b.txt", 1), unit_vectors(1, seed=1))
+
+    ids = store.replace_source("a.txt", chunks_for("a.txt", 1), unit_vectors(1, seed=2))
+    assert ids == [4]
+    assert store.count("a.txt") == 1
+    assert len(store) == 2
+
+    assert store.replace_source("a.txt", [], None) == []
+    assert store.count("a.txt") == 0
+
+
+@pytest.mark.parametrize("exact_max", [10_000, 0])  # vecteurs relus / sélecteur FAISS
+def test_search_filtered_by_source_and_type(monkeypatch, exact_max):
+    monkeypatch.setattr(vectorstore, "RAG_FILTER_EXACT_MAX", exact_max)
+    store = VectorStore()
+    vectors = unit_vectors(6)
+    store.add(chunks_for("a.txt", 3), vectors[:3])
+    store.add([{"text": "offre data", "type": "db_job", "source": "db_job_1"}] * 3, vectors[3:])
+
+    # Le meilleur chunk global (a.txt) est exclu par le filtre
+    hits = store.search(vectors[:1], 2, sources=["db_job_1"])
+    assert [h["source"] for h in hits] == ["db_job_1", "db_job_1"]
+    assert {h["type"] for h in store.search(vectors[:1], 6, types=["db_job"])} == {"db_job"}
+    assert store.search(vectors[:1], 2, sources=["inconnu.txt"]) == []
+
+    assert [h["source"] for h in store.search_lexical("offre", 5, sources=["a.txt"])] == []
+    assert len(store.search_lexical("offre", 5, types=["db_job"])) == 3
+
+    store.remove_source("db_job_1")
+    assert store.search(vectors[3:4], 2, types=["db_job"]) == []
+
+
+@pytest.mark.parametrize("exact_max", [10_000, 0])
+def test_search_many_matches_single_searches(monkeypatch, exact_max):
+    monkeypatch.setattr(vectorstore, "RAG_FILTER_EXACT_MAX", exact_max)
+    store = VectorStore()
+    vectors = unit_vectors(20)
+    store.add(chunks_for("a.txt", 10), vectors[:10])
+    store.add(chunks_for("b.txt", 10), vectors[10:])
+
+    for filters in ({}, {"sources": ["b.txt"]}):
+        batch = store.search_many(vectors[:4], 3, **filters)
+        single = [store.search(vectors[i:i + 1], 3, **filters) for i in range(4)]
+        assert [[h["id"] for h in hits] for hits in batch] == [[h["id"] for h in hits] for hits in single]
+        assert [h["score"] for h in batch[3]] == pytest.approx([h["score"] for h in single[3]], abs=1e-5)
+    assert store.search_many(vectors[:2], 3, sources=["c.txt"]) == [[], []]